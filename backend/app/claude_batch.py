@@ -0,0 +1,259 @@
+"""Modalita' Message Batches per la generazione articoli delle pipeline schedulate.
+
+`generate_articles_for_pending` di interpelli e selezione personale chiamava
+Claude in modo sincrono un item alla volta. Sono job schedulati, non
+sensibili alla latenza: con la Message Batches API tutte le richieste
+partono in un'unica sottomissione, vengono elaborate in parallelo lato
+provider e costano meta' del prezzo standard.
+
+- `enabled(n)`: la modalita' batch e' attiva (`CLAUDE_BATCH_ENABLED`) e ci
+  sono almeno `CLAUDE_BATCH_MIN_ITEMS` item (per pochi item la chiamata
+  diretta finisce prima);
+- `run(requests)`: `custom_id -> parametri di messages.create`; sottomette
+  a blocchi di `CLAUDE_BATCH_MAX_REQUESTS`, attende la fine con polling ogni
+  `CLAUDE_BATCH_POLL_SECONDS` e ritorna un `BatchResult` per custom_id.
+  Oltre `CLAUDE_BATCH_MAX_WAIT` (default 1 ora, ben sotto le 6 ore tra due
+  run schedulate, che nel frattempo restano bloccate) il batch viene
+  annullato: le richieste non completate risultano `retryable` e il
+  chiamante le lascia per la run successiva. Lo stesso vale per le
+  richieste in errore lato provider (overloaded, api_error, ...): solo un
+  `invalid_request_error` e' definitivo.
+
+Durante l'attesa `retrieve`/`results`/`cancel` ritentano gli errori
+transitori (5xx, 429, rete; stesse regole di `llm_gateway`) fino a
+`CLAUDE_BATCH_API_RETRIES` volte: gli SDK sono creati senza retry interni.
+Se l'API resta irraggiungibile il batch viene annullato (best effort) e
+tutte le sue richieste risultano `retryable`, invece di lasciare un batch
+orfano che la run successiva pagherebbe una seconda volta.
+
+Backend (`CLAUDE_BATCH_BACKEND`):
+
+- ``anthropic``: Message Batches API (l'SDK rispetta `ANTHROPIC_BASE_URL`,
+  utile per puntare a un servizio di prova);
+- ``local``: stand-in per gli ambienti di test. `_LocalBatches` implementa
+  la stessa interfaccia di `messages.batches` (create/retrieve/cancel/
+  results), quindi polling, retry, annullamento e lettura dei risultati
+  sono gli stessi del backend reale; ogni richiesta passa da
+  `llm_gateway.messages_create` con `CLAUDE_BATCH_LOCAL_CONCURRENCY` thread
+  e un errore diventa un risultato `errored` con il tipo che userebbe
+  l'API (solo le 400/422 sono `invalid_request_error`).
+
+I token delle risposte finiscono nel contatore `llm_gateway` della pipeline
+(con lo sconto batch sul costo stimato; il backend locale li conta gia'
+in `messages_create`, a prezzo pieno).
+"""
+from __future__ import annotations
+
+import contextvars
+import os
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, Optional
+
+import anthropic
+
+from . import llm_gateway
+from .logger import logger
+
+CLAUDE_BATCH_ENABLED = os.getenv("CLAUDE_BATCH_ENABLED", "0").lower() in ("1", "true", "yes")
+CLAUDE_BATCH_BACKEND = os.getenv("CLAUDE_BATCH_BACKEND", "anthropic").strip().lower()
+CLAUDE_BATCH_MIN_ITEMS = int(os.getenv("CLAUDE_BATCH_MIN_ITEMS", "5"))
+CLAUDE_BATCH_POLL_SECONDS = float(os.getenv("CLAUDE_BATCH_POLL_SECONDS", "30"))
+CLAUDE_BATCH_MAX_WAIT = float(os.getenv("CLAUDE_BATCH_MAX_WAIT", "3600"))
+# Limite API: 100.000 richieste o 256 MB per batch
+CLAUDE_BATCH_MAX_REQUESTS = int(os.getenv("CLAUDE_BATCH_MAX_REQUESTS", "10000"))
+CLAUDE_BATCH_LOCAL_CONCURRENCY = int(os.getenv("CLAUDE_BATCH_LOCAL_CONCURRENCY", "4"))
+CLAUDE_BATCH_API_RETRIES = int(os.getenv("CLAUDE_BATCH_API_RETRIES", "8"))
+
+# Le richieste batch costano il 50% del prezzo standard
+BATCH_COST_FACTOR = 0.5
+
+
+@dataclass
+class BatchResult:
+    custom_id: str
+    message: Any = None
+    error: Optional[str] = None
+    # Annullata/scaduta o errore transitorio del provider: da ritentare, non e' un errore dell'item
+    retryable: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.message is not None
+
+    @property
+    def text(self) -> str:
+        return self.message.content[0].text.strip()
+
+
+def enabled(item_count: int) -> bool:
+    return CLAUDE_BATCH_ENABLED and item_count >= CLAUDE_BATCH_MIN_ITEMS
+
+
+def run(requests: Dict[str, dict]) -> Dict[str, BatchResult]:
+    """Esegue le richieste (custom_id -> parametri messages.create) in modalita' batch."""
+    results: Dict[str, BatchResult] = {}
+    ids = list(requests)
+    for start in range(0, len(ids), CLAUDE_BATCH_MAX_REQUESTS):
+        chunk = {cid: requests[cid] for cid in ids[start:start + CLAUDE_BATCH_MAX_REQUESTS]}
+        if CLAUDE_BATCH_BACKEND == "local":
+            with _LocalBatches() as batches:
+                results.update(_run_batch(chunk, batches, record_usage=False))
+        else:
+            results.update(_run_batch(chunk, llm_gateway.anthropic_client().messages.batches))
+    ok = sum(1 for r in results.values() if r.ok)
+    logger.info("[BATCH] {} richieste: {} riuscite, {} fallite, {} da ritentare",
+                len(requests), ok, sum(1 for r in results.values() if not r.ok and not r.retryable),
+                sum(1 for r in results.values() if r.retryable))
+    return results
+
+
+def _api_call(what: str, batch_id: str, fn, *args) -> Any:
+    """Chiamata all'API batches con retry sugli errori transitori."""
+    for attempt in range(CLAUDE_BATCH_API_RETRIES + 1):
+        try:
+            return fn(*args)
+        except Exception as e:
+            delay, _ = llm_gateway._retry_delay(e, attempt)
+            if delay is None or attempt == CLAUDE_BATCH_API_RETRIES:
+                raise
+            logger.warning("[BATCH] {} {}: tentativo {} fallito ({}), riprovo tra {:.1f}s",
+                           what, batch_id, attempt + 1, e, delay)
+            time.sleep(delay)
+
+
+def _abandon(batches, batch_id: str, chunk: Dict[str, dict], error: Exception) -> Dict[str, BatchResult]:
+    """API irraggiungibile: annulla il batch e lascia tutte le richieste alla run successiva."""
+    logger.error("[BATCH] {} abbandonato ({}), annullo e rimando {} richieste", batch_id, error, len(chunk))
+    try:
+        _api_call("cancel", batch_id, batches.cancel, batch_id)
+    except Exception as e:
+        logger.error("[BATCH] {}: annullamento fallito, il batch resta sul provider: {}", batch_id, e)
+    return {cid: BatchResult(cid, error=str(error), retryable=True) for cid in chunk}
+
+
+def _run_batch(chunk: Dict[str, dict], batches, record_usage: bool = True) -> Dict[str, BatchResult]:
+    """Sottomette `chunk` su `batches` (API o stand-in locale), attende la fine e legge i risultati."""
+    poll_seconds = getattr(batches, "poll_seconds", CLAUDE_BATCH_POLL_SECONDS)
+    # Nessun retry sulla create: dopo un errore di rete il batch potrebbe esistere gia'
+    batch = batches.create(requests=[{"custom_id": cid, "params": params} for cid, params in chunk.items()])
+    logger.info("[BATCH] {} creato con {} richieste", batch.id, len(chunk))
+    started = time.monotonic()
+    canceled = False
+    try:
+        while batch.processing_status != "ended":
+            if not canceled and time.monotonic() - started > CLAUDE_BATCH_MAX_WAIT:
+                logger.error("[BATCH] {} oltre {}s, annullo", batch.id, CLAUDE_BATCH_MAX_WAIT)
+                _api_call("cancel", batch.id, batches.cancel, batch.id)
+                canceled = True
+            time.sleep(poll_seconds)
+            batch = _api_call("retrieve", batch.id, batches.retrieve, batch.id)
+            counts = batch.request_counts
+            logger.debug("[BATCH] {} {}: {} in corso, {} riuscite, {} errori", batch.id,
+                         batch.processing_status, counts.processing, counts.succeeded, counts.errored)
+        logger.info("[BATCH] {} terminato in {:.0f}s", batch.id, time.monotonic() - started)
+        # I risultati arrivano in streaming (JSONL): letti per intero, cosi' un retry riparte da capo
+        entries = _api_call("results", batch.id, lambda: list(batches.results(batch.id)))
+    except Exception as e:
+        return _abandon(batches, batch.id, chunk, e)
+
+    results: Dict[str, BatchResult] = {}
+    for entry in entries:
+        cid = entry.custom_id
+        kind = entry.result.type
+        if kind == "succeeded":
+            params = chunk.get(cid, {})
+            if record_usage:
+                llm_gateway.record_usage(params.get("model", ""), entry.result.message,
+                                         cache_requested=llm_gateway.cache_requested(params),
+                                         cache_eligible=llm_gateway.cache_eligible(params.get("model", ""), params),
+                                         cost_factor=BATCH_COST_FACTOR)
+            results[cid] = BatchResult(cid, message=entry.result.message)
+        elif kind == "errored":
+            # Solo una richiesta malformata fallisce di nuovo identica; il resto si ritenta
+            error_type = getattr(getattr(entry.result.error, "error", None), "type", None)
+            results[cid] = BatchResult(cid, error=str(entry.result.error),
+                                       retryable=error_type != "invalid_request_error")
+        else:
+            results[cid] = BatchResult(cid, error=kind, retryable=True)
+    return results
+
+
+# Tipi di errore dell'API per status HTTP (https://docs.anthropic.com/en/api/errors)
+_ERROR_TYPES = {
+    400: "invalid_request_error",
+    401: "authentication_error",
+    403: "permission_error",
+    404: "not_found_error",
+    413: "request_too_large",
+    422: "invalid_request_error",
+    429: "rate_limit_error",
+    529: "overloaded_error",
+}
+
+
+def _error_type(error: Exception) -> str:
+    if isinstance(error, anthropic.APIStatusError):
+        return _ERROR_TYPES.get(error.status_code, "api_error")
+    return "api_error"
+
+
+class _LocalBatches:
+    """Stand-in di `messages.batches`: richieste eseguite in locale da `llm_gateway`."""
+
+    poll_seconds = 0.5
+
+    def __init__(self) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=max(1, CLAUDE_BATCH_LOCAL_CONCURRENCY),
+                                            thread_name_prefix="claude-batch")
+        self._batches: Dict[str, Dict[str, Future]] = {}
+
+    def __enter__(self) -> "_LocalBatches":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _one(params: dict) -> SimpleNamespace:
+        try:
+            return SimpleNamespace(type="succeeded", message=llm_gateway.messages_create(**params))
+        except Exception as e:
+            error = SimpleNamespace(type=_error_type(e), message=str(e))
+            return SimpleNamespace(type="errored", error=SimpleNamespace(type="error", error=error))
+
+    def create(self, requests) -> SimpleNamespace:
+        batch_id = f"local_{uuid.uuid4().hex[:12]}"
+        # copy_context: i token restano nel contatore della pipeline chiamante
+        self._batches[batch_id] = {
+            request["custom_id"]: self._executor.submit(contextvars.copy_context().run, self._one, request["params"])
+            for request in requests
+        }
+        logger.info("[BATCH] backend locale: {} richieste", len(self._batches[batch_id]))
+        return self.retrieve(batch_id)
+
+    def retrieve(self, batch_id: str) -> SimpleNamespace:
+        futures = self._batches[batch_id].values()
+        processing = sum(1 for f in futures if not f.done())
+        finished = [f.result() for f in futures if f.done() and not f.cancelled()]
+        counts = SimpleNamespace(
+            processing=processing,
+            succeeded=sum(1 for r in finished if r.type == "succeeded"),
+            errored=sum(1 for r in finished if r.type == "errored"),
+            canceled=sum(1 for f in futures if f.cancelled()),
+        )
+        return SimpleNamespace(id=batch_id, processing_status="in_progress" if processing else "ended",
+                               request_counts=counts)
+
+    def cancel(self, batch_id: str) -> SimpleNamespace:
+        for future in self._batches[batch_id].values():
+            future.cancel()
+        return self.retrieve(batch_id)
+
+    def results(self, batch_id: str) -> Iterator[SimpleNamespace]:
+        for cid, future in self._batches[batch_id].items():
+            result = SimpleNamespace(type="canceled") if future.cancelled() else future.result()
+            yield SimpleNamespace(custom_id=cid, result=result)
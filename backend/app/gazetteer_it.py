@@ -0,0 +1,279 @@
+"""Gazetteer locale di regioni, province e uffici scolastici italiani.
+
+L'enrichment degli interpelli chiedeva a Claude regione e provincia per
+ogni item, anche quando erano deducibili dai dati gia' presenti:
+
+- l'intestazione h3 della pagina giornaliera (provincia/citta');
+- l'hostname degli uffici scolastici: ATP/UST/USP/CSA provinciali
+  (``csalaquila.it``, ``atpmilano``, ``ustpavia``) e USR regionali
+  (``usrsicilia``, ``istruzionepiemonte``, ``istruzione.lombardia.gov.it``);
+- il codice meccanografico della scuola nel link o nel testo
+  (``AQIC82300X``: le prime due lettere sono la sigla della provincia).
+
+`resolve` prova queste fonti in quest'ordine e ritorna un `Place` solo se
+la provincia e' univoca e coerente con la regione gia' nota (h2 della
+pagina); altrimenti None e l'item passa all'LLM.
+"""
+from __future__ import annotations
+
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+from urllib.parse import urlsplit
+
+# sigla -> (nome, regione)
+PROVINCES: Dict[str, Tuple[str, str]] = {
+    # Abruzzo
+    "AQ": ("L'Aquila", "Abruzzo"), "CH": ("Chieti", "Abruzzo"),
+    "PE": ("Pescara", "Abruzzo"), "TE": ("Teramo", "Abruzzo"),
+    # Basilicata
+    "MT": ("Matera", "Basilicata"), "PZ": ("Potenza", "Basilicata"),
+    # Calabria
+    "CZ": ("Catanzaro", "Calabria"), "CS": ("Cosenza", "Calabria"), "KR": ("Crotone", "Calabria"),
+    "RC": ("Reggio Calabria", "Calabria"), "VV": ("Vibo Valentia", "Calabria"),
+    # Campania
+    "AV": ("Avellino", "Campania"), "BN": ("Benevento", "Campania"), "CE": ("Caserta", "Campania"),
+    "NA": ("Napoli", "Campania"), "SA": ("Salerno", "Campania"),
+    # Emilia-Romagna
+    "BO": ("Bologna", "Emilia-Romagna"), "FE": ("Ferrara", "Emilia-Romagna"),
+    "FC": ("Forlì-Cesena", "Emilia-Romagna"), "MO": ("Modena", "Emilia-Romagna"),
+    "PR": ("Parma", "Emilia-Romagna"), "PC": ("Piacenza", "Emilia-Romagna"),
+    "RA": ("Ravenna", "Emilia-Romagna"), "RE": ("Reggio Emilia", "Emilia-Romagna"),
+    "RN": ("Rimini", "Emilia-Romagna"),
+    # Friuli-Venezia Giulia
+    "GO": ("Gorizia", "Friuli-Venezia Giulia"), "PN": ("Pordenone", "Friuli-Venezia Giulia"),
+    "TS": ("Trieste", "Friuli-Venezia Giulia"), "UD": ("Udine", "Friuli-Venezia Giulia"),
+    # Lazio
+    "FR": ("Frosinone", "Lazio"), "LT": ("Latina", "Lazio"), "RI": ("Rieti", "Lazio"),
+    "RM": ("Roma", "Lazio"), "VT": ("Viterbo", "Lazio"),
+    # Liguria
+    "GE": ("Genova", "Liguria"), "IM": ("Imperia", "Liguria"),
+    "SP": ("La Spezia", "Liguria"), "SV": ("Savona", "Liguria"),
+    # Lombardia
+    "BG": ("Bergamo", "Lombardia"), "BS": ("Brescia", "Lombardia"), "CO": ("Como", "Lombardia"),
+    "CR": ("Cremona", "Lombardia"), "LC": ("Lecco", "Lombardia"), "LO": ("Lodi", "Lombardia"),
+    "MN": ("Mantova", "Lombardia"), "MI": ("Milano", "Lombardia"),
+    "MB": ("Monza e della Brianza", "Lombardia"), "PV": ("Pavia", "Lombardia"),
+    "SO": ("Sondrio", "Lombardia"), "VA": ("Varese", "Lombardia"),
+    # Marche
+    "AN": ("Ancona", "Marche"), "AP": ("Ascoli Piceno", "Marche"), "FM": ("Fermo", "Marche"),
+    "MC": ("Macerata", "Marche"), "PU": ("Pesaro e Urbino", "Marche"),
+    # Molise
+    "CB": ("Campobasso", "Molise"), "IS": ("Isernia", "Molise"),
+    # Piemonte
+    "AL": ("Alessandria", "Piemonte"), "AT": ("Asti", "Piemonte"), "BI": ("Biella", "Piemonte"),
+    "CN": ("Cuneo", "Piemonte"), "NO": ("Novara", "Piemonte"), "TO": ("Torino", "Piemonte"),
+    "VB": ("Verbano-Cusio-Ossola", "Piemonte"), "VC": ("Vercelli", "Piemonte"),
+    # Puglia
+    "BA": ("Bari", "Puglia"), "BT": ("Barletta-Andria-Trani", "Puglia"), "BR": ("Brindisi", "Puglia"),
+    "FG": ("Foggia", "Puglia"), "LE": ("Lecce", "Puglia"), "TA": ("Taranto", "Puglia"),
+    # Sardegna
+    "CA": ("Cagliari", "Sardegna"), "NU": ("Nuoro", "Sardegna"), "OR": ("Oristano", "Sardegna"),
+    "SS": ("Sassari", "Sardegna"), "SU": ("Sud Sardegna", "Sardegna"),
+    # Sicilia
+    "AG": ("Agrigento", "Sicilia"), "CL": ("Caltanissetta", "Sicilia"), "CT": ("Catania", "Sicilia"),
+    "EN": ("Enna", "Sicilia"), "ME": ("Messina", "Sicilia"), "PA": ("Palermo", "Sicilia"),
+    "RG": ("Ragusa", "Sicilia"), "SR": ("Siracusa", "Sicilia"), "TP": ("Trapani", "Sicilia"),
+    # Toscana
+    "AR": ("Arezzo", "Toscana"), "FI": ("Firenze", "Toscana"), "GR": ("Grosseto", "Toscana"),
+    "LI": ("Livorno", "Toscana"), "LU": ("Lucca", "Toscana"), "MS": ("Massa-Carrara", "Toscana"),
+    "PI": ("Pisa", "Toscana"), "PT": ("Pistoia", "Toscana"), "PO": ("Prato", "Toscana"),
+    "SI": ("Siena", "Toscana"),
+    # Trentino-Alto Adige
+    "BZ": ("Bolzano", "Trentino-Alto Adige"), "TN": ("Trento", "Trentino-Alto Adige"),
+    # Umbria
+    "PG": ("Perugia", "Umbria"), "TR": ("Terni", "Umbria"),
+    # Valle d'Aosta
+    "AO": ("Aosta", "Valle d'Aosta"),
+    # Veneto
+    "BL": ("Belluno", "Veneto"), "PD": ("Padova", "Veneto"), "RO": ("Rovigo", "Veneto"),
+    "TV": ("Treviso", "Veneto"), "VE": ("Venezia", "Veneto"), "VR": ("Verona", "Veneto"),
+    "VI": ("Vicenza", "Veneto"),
+}
+
+# Forme alternative (gia' normalizzate) -> sigla
+_PROVINCE_ALIASES = {
+    "aquila": "AQ", "forli": "FC", "cesena": "FC", "monza": "MB", "monzabrianza": "MB",
+    "monzaebrianza": "MB", "brianza": "MB", "pesaro": "PU", "pesarourbino": "PU", "urbino": "PU",
+    "barletta": "BT", "bat": "BT", "massa": "MS", "massacarrara": "MS", "carrara": "MS",
+    "verbania": "VB", "vco": "VB", "bozen": "BZ", "altoadige": "BZ", "spezia": "SP",
+    "reggiocalabria": "RC", "reggiodicalabria": "RC", "reggioemilia": "RE", "reggionellemilia": "RE",
+    "ascoli": "AP", "vibo": "VV", "sudsardegna": "SU", "carboniaiglesias": "SU",
+    "mediocampidano": "SU",
+}
+
+REGIONS = sorted({region for _, region in PROVINCES.values()})
+
+# Forme alternative (gia' normalizzate) -> regione
+_REGION_ALIASES = {
+    "emilia": "Emilia-Romagna", "romagna": "Emilia-Romagna", "er": "Emilia-Romagna",
+    "friuli": "Friuli-Venezia Giulia", "fvg": "Friuli-Venezia Giulia", "friulivg": "Friuli-Venezia Giulia",
+    "trentino": "Trentino-Alto Adige", "trentinoaltoadige": "Trentino-Alto Adige",
+    "vda": "Valle d'Aosta", "valdaosta": "Valle d'Aosta",
+}
+
+# Prefissi degli hostname degli uffici scolastici provinciali / regionali
+_PROVINCIAL_OFFICE_PREFIXES = ("ambitoterritoriale", "ufficioscolastico", "atp", "csa", "uat", "usp", "ust")
+_REGIONAL_OFFICE_PREFIXES = ("istruzione", "usr")
+
+# Codice meccanografico: sigla provincia + tipologia + progressivo (es. AQIC82300X, RMIC8GT00X)
+_SCHOOL_CODE_RE = re.compile(
+    r"(?<![a-z0-9])([a-z]{2})(?:aa|ee|mm|ic|is|ps|pc|pm|pq|pl|rc|rf|rh|ri|sd|td|te|tf|tl|tn|vc|ct)"
+    r"\d[0-9a-z]{4}[0-9a-z](?![a-z0-9])",
+    re.IGNORECASE,
+)
+
+
+@dataclass(frozen=True)
+class Place:
+    regione: str
+    provincia: str
+    sigla: str
+    # heading | hostname | school_code
+    source: str
+
+
+def normalize(text: str) -> str:
+    """Minuscolo, senza accenti, apostrofi, spazi e trattini ("L'Aquila" -> "laquila")."""
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9]", "", text.lower())
+
+
+def _build_province_index() -> Dict[str, str]:
+    index = {normalize(name): sigla for sigla, (name, _) in PROVINCES.items()}
+    index.update(_PROVINCE_ALIASES)
+    return index
+
+
+def _build_region_index() -> Dict[str, str]:
+    index = {normalize(region): region for region in REGIONS}
+    index.update(_REGION_ALIASES)
+    return index
+
+
+_PROVINCE_INDEX = _build_province_index()
+_REGION_INDEX = _build_region_index()
+
+
+def _words(text: str) -> list:
+    return [w for w in (normalize(part) for part in re.split(r"[\s\-/,()]+", text or "")) if w]
+
+
+def _ngram_values(text: str, index: Dict[str, str]) -> set:
+    """Valori distinti dell'indice nominati in `text`.
+
+    I gruppi di parole consecutive piu' lunghi hanno la precedenza e le loro
+    parole non vengono riusate ("Monza e Brianza" non conta anche "Monza").
+    """
+    words = _words(text)
+    used = [False] * len(words)
+    found = set()
+    for size in sorted({len(words), 4, 3, 2, 1}, reverse=True):
+        if size <= 0 or size > len(words):
+            continue
+        for start in range(len(words) - size + 1):
+            if any(used[start:start + size]):
+                continue
+            value = index.get("".join(words[start:start + size]))
+            if value:
+                found.add(value)
+                used[start:start + size] = [True] * size
+    return found
+
+
+def _match_ngrams(text: str, index: Dict[str, str]) -> Optional[str]:
+    """Valore dell'indice nominato in `text`, se e' uno solo.
+
+    Intestazioni con piu' valori distinti ("Milano, Monza e Brianza",
+    "Provincia di Pavia e Lodi") sono ambigue: None.
+    """
+    found = _ngram_values(text, index)
+    return found.pop() if len(found) == 1 else None
+
+
+def province_from_text(text: str) -> Optional[str]:
+    """Sigla dell'unica provincia nominata in un'intestazione ("Milano", "Reggio Emilia")."""
+    return _match_ngrams(text, _PROVINCE_INDEX)
+
+
+def region_from_text(text: str) -> Optional[str]:
+    """Nome canonico della regione ("EMILIA ROMAGNA" -> "Emilia-Romagna")."""
+    return _match_ngrams(text, _REGION_INDEX)
+
+
+def _strip_prefix(label: str, prefixes: Iterable[str]) -> Optional[str]:
+    for prefix in prefixes:
+        if label.startswith(prefix) and len(label) > len(prefix):
+            return label[len(prefix):]
+    return None
+
+
+def place_from_url(url: str) -> Tuple[Optional[str], Optional[str]]:
+    """(sigla provincia, regione) deducibili dall'URL di un ufficio scolastico."""
+    parts = urlsplit(url or "")
+    labels = [normalize(label) for label in re.split(r"[.\-]", (parts.hostname or "").lower())]
+    sigla = None
+    region = None
+    for label in labels:
+        rest = _strip_prefix(label, _PROVINCIAL_OFFICE_PREFIXES)
+        if rest and rest in _PROVINCE_INDEX:
+            sigla = sigla or _PROVINCE_INDEX[rest]
+            continue
+        rest = _strip_prefix(label, _REGIONAL_OFFICE_PREFIXES)
+        if rest and rest in _REGION_INDEX:
+            region = region or _REGION_INDEX[rest]
+            continue
+        # istruzione.lombardia.gov.it, usr.sicilia.it
+        if label in _REGION_INDEX and len(label) > 3 and any(l in _REGIONAL_OFFICE_PREFIXES for l in labels):
+            region = region or _REGION_INDEX[label]
+    if region and not sigla:
+        # Ambiti provinciali sul sito USR: istruzione.lombardia.gov.it/milano/...
+        first_segment = normalize(next((s for s in parts.path.split("/") if s), ""))
+        candidate = _PROVINCE_INDEX.get(first_segment)
+        if candidate and PROVINCES[candidate][1] == region:
+            sigla = candidate
+    return sigla, region
+
+
+def province_from_school_code(*texts: str) -> Optional[str]:
+    """Sigla della provincia dal primo codice meccanografico trovato nei testi."""
+    for text in texts:
+        for match in _SCHOOL_CODE_RE.finditer(text or ""):
+            sigla = match.group(1).upper()
+            if sigla in PROVINCES:
+                return sigla
+    return None
+
+
+def resolve(
+    name: str,
+    description: str,
+    link: str,
+    regione: str = "",
+    provincia: str = "",
+) -> Optional[Place]:
+    """Regione e provincia senza LLM, se univocamente deducibili."""
+    known_region = region_from_text(regione) if regione else None
+    url_sigla, url_region = place_from_url(link)
+    if known_region and url_region and known_region != url_region:
+        return None
+    known_region = known_region or url_region
+    if provincia and len(_ngram_values(provincia, _PROVINCE_INDEX)) > 1:
+        # Intestazione con piu' province: hostname e codici non bastano, decide l'LLM
+        return None
+
+    candidates = (
+        (province_from_text(provincia) if provincia else None, "heading"),
+        (url_sigla, "hostname"),
+        (province_from_school_code(link, name, description), "school_code"),
+    )
+    for sigla, source in candidates:
+        if not sigla:
+            continue
+        province_name, province_region = PROVINCES[sigla]
+        if known_region and province_region != known_region:
+            # Fonti in disaccordo: decide l'LLM
+            return None
+        return Place(regione=province_region, provincia=province_name, sigla=sigla, source=source)
+    return None
@@ -1,9 +1,10 @@
 """Google Indexing API – notifica Google per pagine con JobPosting structured data."""
 
 import os
-import requests
 from loguru import logger
 
+from . import http_client
+
 try:
     from google.oauth2 import service_account
     _HAS_GOOGLE_AUTH = True
@@ -46,7 +47,7 @@ def notify_google_indexing(urls: list[str], action: str = "URL_UPDATED") -> None
 
     for url in urls:
         try:
-            resp = requests.post(ENDPOINT, json={"url": url, "type": action}, headers=headers)
+            resp = http_client.post(ENDPOINT, json={"url": url, "type": action}, headers=headers)
             logger.info("[GoogleIndexing] {} → {} {}", url, resp.status_code, resp.text[:200])
         except Exception as e:
             logger.warning("[GoogleIndexing] Errore per {}: {}", url, e)
@@ -55,4 +56,4 @@ def notify_google_indexing(urls: list[str], action: str = "URL_UPDATED") -> None
 def _google_auth_request():
     """Crea un google.auth.transport.requests.Request per il refresh del token."""
     from google.auth.transport.requests import Request
-    return Request()
+    return Request(session=http_client.session())
@@ -0,0 +1,109 @@
+"""Client HTTP condivisi del backend.
+
+Le chiamate in uscita usavano `requests.get/post` senza sessione (nuova
+connessione TCP + TLS ad ogni richiesta verso CMS, IndexNow, Google
+Indexing, INPA, backend stesso dal sender) e `cloudscraper.create_scraper`
+veniva ricreato ad ogni `find_best_image` / `_scrape_via_cloudscraper`.
+
+Qui:
+
+- `session()` e' una `requests.Session` unica per processo con pool
+  keep-alive per host (`HTTP_POOL_CONNECTIONS` host, `HTTP_POOL_MAXSIZE`
+  connessioni ciascuno) e retry sugli errori di connessione;
+- `scraper()` restituisce una sessione cloudscraper per thread: lo stato
+  della challenge Cloudflare (cookie, user agent) non e' pensato per l'uso
+  concorrente, ma cosi' ogni thread riusa le proprie connessioni;
+- se il chiamante non passa `timeout` si applica
+  (`HTTP_CONNECT_TIMEOUT`, `HTTP_READ_TIMEOUT`): nessuna richiesta resta
+  appesa all'infinito. Le chiamate del sender al backend stesso
+  (/summarize_news, /api/news/analyze, publish) durano minuti e passano
+  `BACKEND_TIMEOUT`, senza limite di lettura;
+- `get`/`post`/`put` sono scorciatoie sulla sessione condivisa, con la
+  stessa firma di `requests.get/post/put`.
+"""
+from __future__ import annotations
+
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import cloudscraper
+    _HAS_CLOUDSCRAPER = True
+except ImportError:
+    _HAS_CLOUDSCRAPER = False
+
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "32"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "16"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+# Solo errori di connessione: una POST gia' inviata non viene mai ripetuta
+HTTP_CONNECT_RETRIES = int(os.getenv("HTTP_CONNECT_RETRIES", "2"))
+
+DEFAULT_TIMEOUT = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+# Endpoint interni di lunga durata: solo timeout di connessione
+BACKEND_TIMEOUT = (HTTP_CONNECT_TIMEOUT, None)
+
+SCRAPER_BROWSER = {'browser': 'chrome', 'platform': 'windows', 'mobile': False}
+
+
+def _adapter() -> HTTPAdapter:
+    # other=0: con total=None gli errori SSL/protocollo non contati verrebbero ritentati all'infinito
+    retry = Retry(total=None, connect=HTTP_CONNECT_RETRIES, read=0, status=0, other=0,
+                  redirect=10, backoff_factor=0.3, raise_on_status=False)
+    return HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE,
+                       max_retries=retry)
+
+
+def _configure(sess: requests.Session) -> requests.Session:
+    adapter = _adapter()
+    sess.mount("https://", adapter)
+    sess.mount("http://", adapter)
+    original_request = sess.request
+
+    def request(method, url, **kwargs):
+        kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+        return original_request(method, url, **kwargs)
+
+    sess.request = request
+    return sess
+
+
+_session = None
+_session_lock = threading.Lock()
+_local = threading.local()
+
+
+def session() -> requests.Session:
+    """Sessione requests condivisa del processo (thread-safe per le richieste)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _configure(requests.Session())
+    return _session
+
+
+def scraper():
+    """Sessione cloudscraper del thread corrente, creata alla prima richiesta."""
+    if not _HAS_CLOUDSCRAPER:
+        return session()
+    sess = getattr(_local, "scraper", None)
+    if sess is None:
+        sess = _local.scraper = _configure(cloudscraper.create_scraper(browser=SCRAPER_BROWSER))
+    return sess
+
+
+def get(url, **kwargs) -> requests.Response:
+    return session().get(url, **kwargs)
+
+
+def post(url, **kwargs) -> requests.Response:
+    return session().post(url, **kwargs)
+
+
+def put(url, **kwargs) -> requests.Response:
+    return session().put(url, **kwargs)
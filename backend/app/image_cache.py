@@ -0,0 +1,215 @@
+"""Cache persistente per la ricerca immagini di `find_best_image`.
+
+Molte fonti riusano le stesse immagini hero, varianti CDN e og:image, ma
+ogni ricerca le riprovava da capo. Tre tabelle SQLite (WAL, condivise tra
+worker) nella cartella della cache pagine:
+
+- ``image_dims``: URL normalizzato -> (width, height, content-type). Le
+  dimensioni valide restano per `IMAGE_CACHE_TTL` secondi; gli URL che non
+  hanno dato un'immagine leggibile (errore, 404, non immagine) vengono
+  ricordati per `IMAGE_CACHE_NEGATIVE_TTL` e saltati senza scaricarli;
+- ``image_domains`` / ``image_domain_phases``: per ogni dominio sorgente
+  quante ricerche sono state fatte, quante di fila senza risultato e quali
+  fasi di estrazione hanno vinto. `phase_order` mette per prime le fasi
+  storicamente vincenti; `skip_domain` indica i domini che dopo
+  `IMAGE_DOMAIN_SKIP_AFTER` ricerche consecutive non hanno mai dato
+  un'immagine (ritentati comunque ogni `IMAGE_DOMAIN_RETRY_SECONDS`).
+
+Gli errori SQLite vengono loggati e trattati come cache miss: la ricerca
+immagini non deve mai fallire per colpa della cache.
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from .logger import logger
+from .page_cache import PAGE_CACHE_DIR, normalize_url
+
+IMAGE_CACHE_ENABLED = os.getenv("IMAGE_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+IMAGE_CACHE_PATH = os.getenv("IMAGE_CACHE_PATH", os.path.join(PAGE_CACHE_DIR, "images.sqlite3"))
+IMAGE_CACHE_TTL = int(os.getenv("IMAGE_CACHE_TTL", str(30 * 86400)))
+IMAGE_CACHE_NEGATIVE_TTL = int(os.getenv("IMAGE_CACHE_NEGATIVE_TTL", str(6 * 3600)))
+IMAGE_DOMAIN_SKIP_AFTER = int(os.getenv("IMAGE_DOMAIN_SKIP_AFTER", "5"))
+IMAGE_DOMAIN_RETRY_SECONDS = int(os.getenv("IMAGE_DOMAIN_RETRY_SECONDS", str(7 * 86400)))
+
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(IMAGE_CACHE_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _ensure_initialized() -> bool:
+    global _initialized
+    if not IMAGE_CACHE_ENABLED:
+        return False
+    if _initialized:
+        return True
+    with _init_lock:
+        if _initialized:
+            return True
+        try:
+            os.makedirs(os.path.dirname(IMAGE_CACHE_PATH), exist_ok=True)
+            with closing(_connect()) as conn, conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS image_dims (
+                        url TEXT PRIMARY KEY,
+                        width INTEGER NOT NULL,
+                        height INTEGER NOT NULL,
+                        content_type TEXT NOT NULL,
+                        probed_at REAL NOT NULL,
+                        expires_at REAL NOT NULL
+                    )
+                    """
+                )
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS image_domains (
+                        domain TEXT PRIMARY KEY,
+                        searches INTEGER NOT NULL DEFAULT 0,
+                        consecutive_misses INTEGER NOT NULL DEFAULT 0,
+                        last_search_at REAL NOT NULL
+                    )
+                    """
+                )
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS image_domain_phases (
+                        domain TEXT NOT NULL,
+                        phase TEXT NOT NULL,
+                        wins INTEGER NOT NULL DEFAULT 0,
+                        last_win_at REAL NOT NULL,
+                        PRIMARY KEY (domain, phase)
+                    )
+                    """
+                )
+            _initialized = True
+        except (OSError, sqlite3.Error) as e:
+            logger.error("[image_cache] Inizializzazione fallita in {}: {}", IMAGE_CACHE_PATH, e)
+            return False
+    return True
+
+
+def source_domain(url: str) -> str:
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+# ── dimensioni per URL ───────────────────────────────────────────────────
+
+def get_dimensions(url: str) -> Optional[Tuple[int, int, str]]:
+    """Dimensioni memorizzate e non scadute, (0, 0) per URL noti come inutilizzabili."""
+    if not _ensure_initialized():
+        return None
+    try:
+        with closing(_connect()) as conn:
+            row = conn.execute(
+                "SELECT width, height, content_type FROM image_dims WHERE url = ? AND expires_at > ?",
+                (normalize_url(url), time.time()),
+            ).fetchone()
+    except sqlite3.Error as e:
+        logger.warning("[image_cache] Lettura dimensioni fallita: {}", e)
+        return None
+    return (row["width"], row["height"], row["content_type"]) if row else None
+
+
+def put_dimensions(url: str, width: int, height: int, content_type: str = "") -> None:
+    if not _ensure_initialized():
+        return
+    now = time.time()
+    ttl = IMAGE_CACHE_TTL if width > 0 else IMAGE_CACHE_NEGATIVE_TTL
+    try:
+        with closing(_connect()) as conn, conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO image_dims (url, width, height, content_type, probed_at, expires_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (normalize_url(url), width, height, content_type or "", now, now + ttl),
+            )
+    except sqlite3.Error as e:
+        logger.warning("[image_cache] Scrittura dimensioni fallita per {}: {}", url, e)
+
+
+# ── statistiche per dominio sorgente ─────────────────────────────────────
+
+def phase_order(domain: str, phases: Sequence[str]) -> List[str]:
+    """`phases` riordinate per vittorie storiche sul dominio (a parita', ordine di default)."""
+    if not domain or not _ensure_initialized():
+        return list(phases)
+    try:
+        with closing(_connect()) as conn:
+            wins = {
+                row["phase"]: row["wins"]
+                for row in conn.execute(
+                    "SELECT phase, wins FROM image_domain_phases WHERE domain = ?", (domain,)
+                )
+            }
+    except sqlite3.Error as e:
+        logger.warning("[image_cache] Lettura statistiche dominio fallita: {}", e)
+        return list(phases)
+    default_rank = {phase: i for i, phase in enumerate(phases)}
+    return sorted(phases, key=lambda p: (-wins.get(p, 0), default_rank[p]))
+
+
+def skip_domain(domain: str) -> bool:
+    """True se il dominio non ha mai dato immagini nelle ultime ricerche e non e' ora di ritentare."""
+    if not domain or IMAGE_DOMAIN_SKIP_AFTER <= 0 or not _ensure_initialized():
+        return False
+    try:
+        with closing(_connect()) as conn:
+            row = conn.execute(
+                "SELECT consecutive_misses, last_search_at FROM image_domains WHERE domain = ?", (domain,)
+            ).fetchone()
+            if row is None or row["consecutive_misses"] < IMAGE_DOMAIN_SKIP_AFTER:
+                return False
+            has_wins = conn.execute(
+                "SELECT 1 FROM image_domain_phases WHERE domain = ? LIMIT 1", (domain,)
+            ).fetchone()
+    except sqlite3.Error as e:
+        logger.warning("[image_cache] Lettura statistiche dominio fallita: {}", e)
+        return False
+    return has_wins is None and time.time() - row["last_search_at"] < IMAGE_DOMAIN_RETRY_SECONDS
+
+
+def record_search(domain: str, winning_phase: Optional[str]) -> None:
+    """Registra l'esito di una ricerca: fase vincente o None se nessuna immagine."""
+    if not domain or not _ensure_initialized():
+        return
+    now = time.time()
+    try:
+        with closing(_connect()) as conn, conn:
+            conn.execute(
+                """
+                INSERT INTO image_domains (domain, searches, consecutive_misses, last_search_at)
+                VALUES (?, 1, ?, ?)
+                ON CONFLICT(domain) DO UPDATE SET
+                    searches = searches + 1,
+                    consecutive_misses = CASE WHEN ? THEN 0 ELSE consecutive_misses + 1 END,
+                    last_search_at = excluded.last_search_at
+                """,
+                (domain, 0 if winning_phase else 1, now, winning_phase is not None),
+            )
+            if winning_phase:
+                conn.execute(
+                    """
+                    INSERT INTO image_domain_phases (domain, phase, wins, last_win_at)
+                    VALUES (?, ?, 1, ?)
+                    ON CONFLICT(domain, phase) DO UPDATE SET
+                        wins = wins + 1, last_win_at = excluded.last_win_at
+                    """,
+                    (domain, winning_phase, now),
+                )
+    except sqlite3.Error as e:
+        logger.warning("[image_cache] Scrittura statistiche dominio fallita: {}", e)
@@ -0,0 +1,261 @@
+"""Estrazione in un solo passaggio dei candidati immagine per `find_best_image`.
+
+La versione originale costruiva un albero BeautifulSoup con `html.parser`
+(puro Python) e poi lo scorreva quattro volte con `soup.find_all('img')`
+(srcset, attributo width, classi prioritarie, scansione completa); nella
+fase delle classi prioritarie serializzava ogni tag con `str(img)` per
+confrontarlo con 13 pattern.
+
+Qui il documento viene letto una volta sola raccogliendo solo i tag
+`<meta>` e `<img>` con i loro attributi, e ogni `<img>` viene classificato
+per tutte le fasi nello stesso giro. Il parser e' scelto tra quelli
+disponibili (`IMAGE_HTML_PARSER`, default ``auto``):
+
+- ``selectolax`` (Lexbor, C): il piu' veloce;
+- ``lxml``: parser C di libxml2;
+- ``html.parser``: tokenizer della libreria standard senza costruire
+  l'albero, sempre disponibile.
+
+L'output (`extract`) e' lo stesso dizionario fase -> URL in ordine di
+priorita' della versione precedente, comprese le regole di blacklist, il
+limite di 5 candidati srcset e 10 per la scansione finale.
+"""
+from __future__ import annotations
+
+import os
+from functools import lru_cache
+from html.parser import HTMLParser
+from typing import Dict, List, Tuple
+from urllib.parse import urljoin
+
+from .logger import logger
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+    _HAS_SELECTOLAX = True
+except ImportError:
+    _HAS_SELECTOLAX = False
+
+try:
+    import lxml.html
+    _HAS_LXML = True
+except ImportError:
+    _HAS_LXML = False
+
+IMAGE_HTML_PARSER = os.getenv("IMAGE_HTML_PARSER", "auto").strip().lower()
+
+# Parole chiave da escludere nelle URL/alt delle immagini (loghi, icone, banner, tracking pixel)
+_IMAGE_BLACKLIST = {'logo', 'icon', 'favicon', 'sprite', 'avatar', 'badge', 'banner-ad',
+                    'tracking', 'pixel', 'spacer', 'arrow', 'button', 'spinner', 'loader',
+                    'emoji', 'share', 'social', 'facebook', 'twitter', 'whatsapp', 'linkedin',
+                    'pinterest', 'telegram', 'youtube', 'instagram', 'tiktok', 'cookie'}
+
+# Classi/attributi che suggeriscono l'immagine principale dell'articolo
+_PRIORITY_PATTERNS = ('featured', 'hero', 'main-image', 'article-image', 'post-image',
+                      'cover', 'thumb-big', 'image-full', 'wp-post-image', 'detail',
+                      'foto_large', 'img_articolo', 'image-principale')
+
+_SCAN_ATTRS = ('src', 'data-src', 'data-lazy-src', 'data-original', 'data-full-url')
+_META_KEYS = (('property', 'og:image'), ('name', 'twitter:image'))
+
+PHASES = ('meta', 'srcset', 'width_attr', 'priority_class', 'scan')
+
+Attrs = Dict[str, str]
+
+
+def is_blacklisted(url: str, alt: str = "") -> bool:
+    """Controlla se un URL o alt text contiene parole da escludere."""
+    url_lower = url.lower()
+    alt_lower = alt.lower() if alt else ""
+    for word in _IMAGE_BLACKLIST:
+        if word in url_lower or word in alt_lower:
+            return True
+    # Escludi formati non fotografici
+    if url_lower.endswith('.svg') or url_lower.endswith('.gif') or url_lower.endswith('.ico'):
+        return True
+    # Escludi immagini encode base64
+    if url_lower.startswith('data:'):
+        return True
+    return False
+
+
+@lru_cache(maxsize=4096)
+def make_absolute_url(src: str, base_url: str) -> str:
+    """Converte URL relativo in assoluto (memoizzato: lo stesso src compare in piu' fasi)."""
+    if not src:
+        return ""
+    if src.startswith('//'):
+        return 'https:' + src
+    if src.startswith('/') or not src.startswith('http'):
+        return urljoin(base_url, src)
+    return src
+
+
+def srcset_candidates(attrs: Attrs, base_url: str) -> List[Tuple[str, int]]:
+    """Estrae candidati dal srcset, ordinati per larghezza decrescente."""
+    candidates = []
+    srcset = attrs.get('srcset', '')
+    if not srcset:
+        return candidates
+    for entry in srcset.split(','):
+        parts = entry.strip().split()
+        if len(parts) >= 2:
+            url = make_absolute_url(parts[0], base_url)
+            descriptor = parts[1]
+            if descriptor.endswith('w'):
+                try:
+                    w = int(descriptor[:-1])
+                    candidates.append((url, w))
+                except ValueError:
+                    pass
+    # Ordina per larghezza decrescente (le piu grandi prima)
+    candidates.sort(key=lambda x: x[1], reverse=True)
+    return candidates
+
+
+# ── lettura tag <meta>/<img> ─────────────────────────────────────────────
+
+class _TagCollector(HTMLParser):
+    """Tokenizer stdlib: raccoglie gli attributi di <meta> e <img>, senza albero."""
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.tags: List[Tuple[str, Attrs]] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'img' or tag == 'meta':
+            collected: Attrs = {}
+            for name, value in attrs:
+                # Come BeautifulSoup: per attributi duplicati vale l'ultimo
+                collected[name] = value if value is not None else ''
+            self.tags.append((tag, collected))
+
+    handle_startendtag = handle_starttag
+
+
+def _tags_stdlib(html: str) -> List[Tuple[str, Attrs]]:
+    collector = _TagCollector()
+    collector.feed(html)
+    collector.close()
+    return collector.tags
+
+
+def _tags_selectolax(html: str) -> List[Tuple[str, Attrs]]:
+    tree = LexborHTMLParser(html)
+    return [
+        (node.tag, {k: v if v is not None else '' for k, v in node.attributes.items()})
+        for node in tree.css('meta, img')
+    ]
+
+
+def _tags_lxml(html: str) -> List[Tuple[str, Attrs]]:
+    root = lxml.html.document_fromstring(html)
+    return [(el.tag, dict(el.attrib)) for el in root.iter('meta', 'img')]
+
+
+def _parser_name() -> str:
+    if IMAGE_HTML_PARSER == 'selectolax' and _HAS_SELECTOLAX:
+        return 'selectolax'
+    if IMAGE_HTML_PARSER == 'lxml' and _HAS_LXML:
+        return 'lxml'
+    if IMAGE_HTML_PARSER in ('html.parser', 'stdlib'):
+        return 'html.parser'
+    if _HAS_SELECTOLAX:
+        return 'selectolax'
+    if _HAS_LXML:
+        return 'lxml'
+    return 'html.parser'
+
+
+_PARSERS = {'selectolax': _tags_selectolax, 'lxml': _tags_lxml, 'html.parser': _tags_stdlib}
+
+
+def collect_tags(html: str) -> List[Tuple[str, Attrs]]:
+    """Tag <meta> e <img> del documento, in ordine, con i loro attributi."""
+    name = _parser_name()
+    try:
+        return _PARSERS[name](html)
+    except Exception as e:
+        if name == 'html.parser':
+            raise
+        logger.warning("[IMAGE FINDER] Parser {} fallito ({}), uso html.parser", name, e)
+        return _tags_stdlib(html)
+
+
+# ── classificazione ──────────────────────────────────────────────────────
+
+def _tag_text(attrs: Attrs) -> str:
+    """Equivalente di `str(img).lower()` per il match dei pattern prioritari."""
+    return ' '.join(f'{k}="{v}"' for k, v in attrs.items()).lower()
+
+
+def extract(html: str, source_url: str, min_width: int) -> Dict[str, List[str]]:
+    """URL candidati per ciascuna fase di find_best_image, in ordine di priorita'."""
+    tags = collect_tags(html)
+
+    # ── FASE 1: Meta tag og:image e twitter:image (primo tag per chiave) ─
+    meta_candidates: List[str] = []
+    for attr_name, attr_key in _META_KEYS:
+        for tag, attrs in tags:
+            if tag == 'meta' and attrs.get(attr_name) == attr_key:
+                content = attrs.get('content', '').strip()
+                if content:
+                    url = make_absolute_url(content, source_url)
+                    if not is_blacklisted(url):
+                        meta_candidates.append(url)
+                break
+
+    srcset_urls: List[str] = []
+    width_attr_urls: List[str] = []
+    priority_urls: List[str] = []
+    scan_sources: List[Tuple[str, str]] = []
+
+    for tag, attrs in tags:
+        if tag != 'img':
+            continue
+        alt = attrs.get('alt', '')
+        main_src = attrs.get('src') or attrs.get('data-src') or attrs.get('data-lazy-src')
+        main_url = make_absolute_url(main_src, source_url) if main_src else ''
+        main_ok = bool(main_url) and not is_blacklisted(main_url, alt)
+
+        # ── FASE 2: srcset con larghezza dichiarata >= min_width ───────
+        for url, declared_w in srcset_candidates(attrs, source_url):
+            if declared_w >= min_width and not is_blacklisted(url, alt):
+                srcset_urls.append(url)
+
+        # ── FASE 3: attributo width >= min_width ───────────────────────
+        try:
+            if main_ok and int(str(attrs.get('width', '')).replace('px', '')) >= min_width:
+                width_attr_urls.append(main_url)
+        except (ValueError, TypeError):
+            pass
+
+        # ── FASE 4: classi/attributi da immagine principale ────────────
+        if main_ok:
+            text = _tag_text(attrs)
+            if any(pattern in text for pattern in _PRIORITY_PATTERNS):
+                priority_urls.append(main_url)
+
+        # ── FASE 5: tutti gli attributi sorgente (filtrati dopo) ───────
+        for attr in _SCAN_ATTRS:
+            src = attrs.get(attr)
+            if src:
+                scan_sources.append((make_absolute_url(src, source_url), alt))
+
+    # Immagini non ancora testate nelle fasi meta e srcset
+    all_img_urls: List[str] = []
+    tested_urls = set(meta_candidates + srcset_urls)
+    for url, alt in scan_sources:
+        if url not in tested_urls and not is_blacklisted(url, alt):
+            all_img_urls.append(url)
+            tested_urls.add(url)
+
+    return {
+        'meta': meta_candidates,
+        # Verifica dimensioni reali delle migliori candidate srcset
+        'srcset': srcset_urls[:5],
+        'width_attr': width_attr_urls,
+        'priority_class': priority_urls,
+        # Testa al massimo 10 immagini rimanenti
+        'scan': all_img_urls[:10],
+    }
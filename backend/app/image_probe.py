@@ -0,0 +1,237 @@
+"""Lettura delle dimensioni delle immagini dai soli header, in parallelo.
+
+`find_best_image` scaricava per intero (fino a 10 MB) ogni immagine
+candidata solo per leggerne larghezza e altezza con PIL, una alla volta, e
+nella fase 6 riscaricava gli stessi URL gia' provati.
+
+Qui:
+
+- `sniff_dimensions` legge le dimensioni dagli header di PNG, GIF, WebP
+  (VP8/VP8L/VP8X) e JPEG (marker SOF), che stanno nei primi KB del file;
+- `probe` scarica in streaming solo quanto serve: blocchi da
+  `IMAGE_PROBE_CHUNK` byte finche' l'header non e' leggibile, al massimo
+  `IMAGE_PROBE_MAX_BYTES` (un JPEG con EXIF grandi puo' avere il SOF oltre i
+  primi 64 KB). Per formati non riconosciuti si ricade su PIL con il limite
+  storico di 10 MB;
+- `ImageProber` prova piu' URL in parallelo (`IMAGE_PROBE_CONCURRENCY`) e
+  memorizza il risultato di ogni URL per tutta la ricerca, quindi un URL
+  viene scaricato al massimo una volta per articolo. Tra una ricerca e
+  l'altra i risultati restano in `image_cache`. Senza sessione esplicita
+  ogni worker usa il proprio `http_client.scraper()`, riusato tra ricerche.
+"""
+from __future__ import annotations
+
+import os
+import struct
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from PIL import Image, UnidentifiedImageError
+
+from . import http_client, image_cache
+from .logger import logger
+
+IMAGE_PROBE_CONCURRENCY = int(os.getenv("IMAGE_PROBE_CONCURRENCY", "6"))
+IMAGE_PROBE_TIMEOUT = int(os.getenv("IMAGE_PROBE_TIMEOUT", "12"))
+IMAGE_PROBE_CHUNK = int(os.getenv("IMAGE_PROBE_CHUNK", "8192"))
+IMAGE_PROBE_MAX_BYTES = int(os.getenv("IMAGE_PROBE_MAX_BYTES", str(256 * 1024)))
+# Limite del fallback PIL (download completo), come la versione originale
+_FULL_DOWNLOAD_MAX_BYTES = 10_000_000
+
+
+class ImageInfo(NamedTuple):
+    width: int
+    height: int
+    content_type: str = ""
+
+
+NO_IMAGE = ImageInfo(0, 0, "")
+
+# Marker JPEG Start Of Frame (esclusi DHT 0xC4, JPG 0xC8, DAC 0xCC)
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _sniff_jpeg(data: bytes) -> Optional[Tuple[int, int]]:
+    pos, n = 2, len(data)
+    while pos + 4 <= n:
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # Byte di riempimento tra segmenti
+            pos += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            pos += 2
+            continue
+        length = struct.unpack('>H', data[pos + 2:pos + 4])[0]
+        if marker in _JPEG_SOF:
+            if pos + 9 > n:
+                return None
+            height, width = struct.unpack('>HH', data[pos + 5:pos + 9])
+            return width, height
+        pos += 2 + length
+    return None
+
+
+def sniff_dimensions(data: bytes) -> Optional[Tuple[int, int, str]]:
+    """(width, height, formato) dagli header dell'immagine, None se non ancora leggibili."""
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        if len(data) >= 24 and data[12:16] == b'IHDR':
+            width, height = struct.unpack('>II', data[16:24])
+            return width, height, 'png'
+        return None
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        if len(data) >= 10:
+            width, height = struct.unpack('<HH', data[6:10])
+            return width, height, 'gif'
+        return None
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        chunk = data[12:16]
+        if chunk == b'VP8 ' and len(data) >= 30:
+            width, height = struct.unpack('<HH', data[26:30])
+            return width & 0x3FFF, height & 0x3FFF, 'webp'
+        if chunk == b'VP8L' and len(data) >= 25:
+            bits = int.from_bytes(data[21:25], 'little')
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1, 'webp'
+        if chunk == b'VP8X' and len(data) >= 30:
+            width = int.from_bytes(data[24:27], 'little') + 1
+            height = int.from_bytes(data[27:30], 'little') + 1
+            return width, height, 'webp'
+        return None
+    if data[:2] == b'\xff\xd8':
+        size = _sniff_jpeg(data)
+        return (size[0], size[1], 'jpeg') if size else None
+    return None
+
+
+def _is_known_format(data: bytes) -> bool:
+    return (data[:8] == b'\x89PNG\r\n\x1a\n' or data[:6] in (b'GIF87a', b'GIF89a')
+            or (data[:4] == b'RIFF' and data[8:12] == b'WEBP') or data[:2] == b'\xff\xd8')
+
+
+# Status che non dicono nulla sull'URL in se' (limiti di frequenza, timeout lato server)
+_TRANSIENT_STATUSES = {408, 425, 429}
+
+
+def _probe(url: str, session) -> Tuple[ImageInfo, bool]:
+    """(risultato, definitivo). Non definitivi: timeout, errori di rete, 5xx, 429."""
+    try:
+        resp = session.get(url, timeout=IMAGE_PROBE_TIMEOUT, stream=True)
+        try:
+            if resp.status_code != 200:
+                definitive = 400 <= resp.status_code < 500 and resp.status_code not in _TRANSIENT_STATUSES
+                return NO_IMAGE, definitive
+            content_type = resp.headers.get('content-type', '')
+            if 'image' not in content_type and 'octet-stream' not in content_type:
+                return NO_IMAGE, True
+            content_length = resp.headers.get('content-length')
+            if content_length and int(content_length) > _FULL_DOWNLOAD_MAX_BYTES:
+                return NO_IMAGE, True
+
+            buffer = bytearray()
+            chunks = resp.iter_content(chunk_size=IMAGE_PROBE_CHUNK)
+            for chunk in chunks:
+                buffer += chunk
+                size = sniff_dimensions(bytes(buffer))
+                if size:
+                    return ImageInfo(size[0], size[1], content_type), True
+                if len(buffer) >= 16 and not _is_known_format(bytes(buffer[:16])):
+                    break
+                if len(buffer) >= IMAGE_PROBE_MAX_BYTES:
+                    break
+
+            # Formato non riconosciuto (AVIF, BMP, ...) o header oltre il limite: PIL
+            for chunk in chunks:
+                buffer += chunk
+                if len(buffer) > _FULL_DOWNLOAD_MAX_BYTES:
+                    return NO_IMAGE, True
+            try:
+                width, height = Image.open(BytesIO(bytes(buffer))).size
+            except UnidentifiedImageError:
+                # Scaricata per intero ma non e' un'immagine leggibile
+                return NO_IMAGE, True
+            return ImageInfo(width, height, content_type), True
+        finally:
+            resp.close()
+    except Exception as e:
+        logger.debug("[IMG] Errore dimensioni per {}...: {}", url[:80], e)
+        return NO_IMAGE, False
+
+
+def probe(url: str, session=None) -> ImageInfo:
+    """Dimensioni di un'immagine remota leggendo solo l'inizio del file.
+
+    Ritorna NO_IMAGE (0, 0) in caso di errore o se la risposta non e' un'immagine.
+    """
+    if session is None:
+        session = http_client.scraper()
+    return _probe(url, session)[0]
+
+
+def probe_cached(url: str, session=None) -> ImageInfo:
+    """`probe` passando dalla cache persistente.
+
+    Vengono memorizzati solo gli esiti definitivi (dimensioni lette, 4xx,
+    risposta che non e' un'immagine): un timeout o un 5xx non rendono l'URL
+    inutilizzabile per le ore di validita' della cache.
+    """
+    cached = image_cache.get_dimensions(url)
+    if cached is not None:
+        return ImageInfo(*cached)
+    if session is None:
+        session = http_client.scraper()
+    info, definitive = _probe(url, session)
+    if definitive:
+        image_cache.put_dimensions(url, info.width, info.height, info.content_type)
+    return info
+
+
+class ImageProber:
+    """Probe concorrenti con memo per URL, valido per una singola ricerca."""
+
+    def __init__(self, session=None, max_workers: int = IMAGE_PROBE_CONCURRENCY) -> None:
+        self.session = session
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="img-probe")
+        self._results: Dict[str, Future] = {}
+
+    def __enter__(self) -> "ImageProber":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        # I probe non ancora partiti non servono piu'
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, url: str) -> Future:
+        future = self._results.get(url)
+        if future is None:
+            future = self._executor.submit(probe_cached, url, self.session)
+            self._results[url] = future
+        return future
+
+    def dimensions(self, url: str) -> ImageInfo:
+        return self.submit(url).result()
+
+    def probe_many(self, urls: Iterable[str]) -> List[Tuple[str, ImageInfo]]:
+        """Prova tutti gli URL in parallelo; risultati nell'ordine di input."""
+        futures = [(url, self.submit(url)) for url in dict.fromkeys(urls)]
+        return [(url, future.result()) for url, future in futures]
+
+    def first_at_least(self, urls: Iterable[str], min_width: int, label: str) -> Optional[Tuple[str, ImageInfo]]:
+        """Primo URL (in ordine di priorita') con larghezza >= min_width.
+
+        Tutti gli URL partono insieme; si attende ciascun risultato
+        nell'ordine dato, cosi' a parita' di idoneita' vince sempre il
+        candidato con priorita' piu' alta, come nella scansione sequenziale.
+        """
+        futures = [(url, self.submit(url)) for url in dict.fromkeys(urls)]
+        for url, future in futures:
+            info = future.result()
+            logger.debug("[{}] {}... -> {}x{}", label, url[:80], info.width, info.height)
+            if info.width >= min_width:
+                return url, info
+        return None
@@ -4,9 +4,9 @@ Usato dai pipeline interpelli e selezione personale.
 """
 
 import os
-import requests
 from typing import List
 
+from . import http_client
 from .logger import logger
 
 INDEXNOW_ENDPOINT = "https://api.indexnow.org/indexnow"
@@ -39,7 +39,7 @@ def submit_to_indexnow(urls: List[str]) -> None:
             "keyLocation": f"https://{SITE_HOST}/{api_key}.txt",
             "urlList": valid_urls,
         }
-        resp = requests.post(
+        resp = http_client.post(
             INDEXNOW_ENDPOINT,
             json=body,
             timeout=10,
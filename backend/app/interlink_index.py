@@ -0,0 +1,262 @@
+"""Indice invertito in memoria per l'interlinking degli articoli.
+
+`find_related_articles` scaricava ad ogni chiamata l'intera tabella
+`articles` da Supabase e tokenizzava tutti i titoli in Python. Qui teniamo
+in memoria gli articoli pubblicati con tre posting list:
+
+    tag normalizzato      -> id articoli
+    parola del titolo     -> id articoli  (stesse regole: >2 caratteri, no stop word)
+    category_slug         -> id articoli
+
+Una query visita solo gli articoli che condividono almeno un termine con
+l'articolo nuovo e calcola lo stesso score di prima (0.6 tag, 0.25
+categoria, 0.15 titolo, soglia > 0.1, top 3): gli articoli senza termini in
+comune avrebbero comunque score 0.
+
+L'indice si aggiorna in modo incrementale leggendo solo le righe con
+`created_at`/`updated_at` successivi all'ultimo refresh (al massimo ogni
+`INTERLINK_REFRESH_SECONDS`). Le cancellazioni fisiche non sono visibili
+in incrementale, per questo ogni `INTERLINK_FULL_REBUILD_SECONDS` l'indice
+viene ricostruito da zero.
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from .database import get_supabase_client
+from .logger import logger
+
+INTERLINK_REFRESH_SECONDS = int(os.getenv("INTERLINK_REFRESH_SECONDS", "60"))
+INTERLINK_FULL_REBUILD_SECONDS = int(os.getenv("INTERLINK_FULL_REBUILD_SECONDS", "3600"))
+# PostgREST limita le righe per risposta: carichiamo a pagine
+_PAGE_SIZE = 1000
+_COLUMNS = "id, title, slug, category_slug, tags, isdraft, created_at, updated_at"
+
+STOP_WORDS_IT = {
+    "di", "a", "da", "in", "con", "su", "per", "tra", "fra", "il", "lo", "la",
+    "i", "gli", "le", "un", "uno", "una", "e", "o", "ma", "che", "non", "si",
+    "del", "dello", "della", "dei", "degli", "delle", "al", "allo", "alla",
+    "ai", "agli", "alle", "dal", "dallo", "dalla", "dai", "dagli", "dalle",
+    "nel", "nello", "nella", "nei", "negli", "nelle", "sul", "sullo", "sulla",
+    "sui", "sugli", "sulle", "come", "se", "anche", "piu", "sono", "stato",
+    "essere", "ha", "hanno", "questo", "questa", "questi", "queste", "quello",
+}
+
+
+def title_words(title: str) -> Set[str]:
+    """Parole significative del titolo (no stop word, lunghezza > 2)."""
+    return set(
+        w.lower() for w in re.split(r'\W+', title or '')
+        if len(w) > 2 and w.lower() not in STOP_WORDS_IT
+    )
+
+
+def normalize_tags(raw) -> Set[str]:
+    """Tag normalizzati da una lista o da una stringa JSON (come salvati su Supabase)."""
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except (json.JSONDecodeError, TypeError):
+            raw = []
+    if not isinstance(raw, list):
+        return set()
+    return set(t.lower().strip() for t in raw if isinstance(t, str) and t)
+
+
+@dataclass(frozen=True)
+class IndexedArticle:
+    id: int
+    title: str
+    slug: str
+    category_slug: Optional[str]
+    tags: FrozenSet[str]
+    words: FrozenSet[str]
+
+
+class InterlinkIndex:
+    """Posting list tag/parole/categoria degli articoli pubblicati."""
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._articles: Dict[int, IndexedArticle] = {}
+        self._by_tag: Dict[str, Set[int]] = {}
+        self._by_word: Dict[str, Set[int]] = {}
+        self._by_category: Dict[str, Set[int]] = {}
+        self._watermark: Optional[str] = None
+        # Incrementata ad ogni modifica reale: permette cache derivate (es. matrici sparse)
+        self._version = 0
+        self._last_refresh = 0.0
+        self._last_full_build = 0.0
+
+    # ── manutenzione indice ──────────────────────────────────────────────
+
+    def _postings(self, article: IndexedArticle):
+        yield self._by_tag, article.tags
+        yield self._by_word, article.words
+        if isinstance(article.category_slug, str):
+            yield self._by_category, (article.category_slug,)
+
+    def _remove(self, article_id: int) -> None:
+        old = self._articles.pop(article_id, None)
+        if old is None:
+            return
+        for postings, terms in self._postings(old):
+            for term in terms:
+                ids = postings.get(term)
+                if ids is not None:
+                    ids.discard(article_id)
+                    if not ids:
+                        del postings[term]
+
+    def _upsert(self, row: dict) -> None:
+        article_id = row.get('id')
+        if article_id is None:
+            return
+        article = None
+        if row.get('isdraft') is False:
+            article = IndexedArticle(
+                id=article_id,
+                title=row.get('title') or '',
+                slug=row.get('slug'),
+                category_slug=row.get('category_slug', ''),
+                tags=frozenset(normalize_tags(row.get('tags', []))),
+                words=frozenset(title_words(row.get('title') or '')),
+            )
+        if self._articles.get(article_id) == article:
+            return
+        self._version += 1
+        self._remove(article_id)
+        if article is None:
+            return
+        self._articles[article_id] = article
+        for postings, terms in self._postings(article):
+            for term in terms:
+                postings.setdefault(term, set()).add(article_id)
+
+    def _advance_watermark(self, row: dict) -> None:
+        for field in ('updated_at', 'created_at'):
+            ts = row.get(field)
+            if ts and (self._watermark is None or ts > self._watermark):
+                self._watermark = ts
+
+    def _fetch_rows(self, since: Optional[str]) -> Iterable[dict]:
+        supabase = get_supabase_client()
+        offset = 0
+        while True:
+            query = supabase.table('articles').select(_COLUMNS)
+            if since is None:
+                query = query.eq('isdraft', False)
+            else:
+                # Le righe tornate in bozza servono per toglierle dall'indice
+                query = query.or_(f'updated_at.gte."{since}",created_at.gte."{since}"')
+            rows = query.order('id').range(offset, offset + _PAGE_SIZE - 1).execute().data or []
+            yield from rows
+            if len(rows) < _PAGE_SIZE:
+                return
+            offset += _PAGE_SIZE
+
+    def rebuild(self) -> None:
+        """Ricarica tutti gli articoli pubblicati e ricostruisce le posting list."""
+        fresh = InterlinkIndex()
+        for row in fresh._fetch_rows(None):
+            fresh._upsert(row)
+            fresh._advance_watermark(row)
+        now = time.monotonic()
+        with self._lock:
+            self._articles = fresh._articles
+            self._by_tag = fresh._by_tag
+            self._by_word = fresh._by_word
+            self._by_category = fresh._by_category
+            self._watermark = fresh._watermark
+            self._version += 1
+            self._last_refresh = self._last_full_build = now
+        logger.info("[interlink] Indice ricostruito: {} articoli, {} tag, {} parole",
+                    len(fresh._articles), len(fresh._by_tag), len(fresh._by_word))
+
+    def refresh(self, force: bool = False) -> None:
+        """Aggiorna l'indice se sono passati gli intervalli configurati.
+
+        Le letture da Supabase avvengono fuori da `_lock`: le query
+        concorrenti continuano a usare l'indice corrente durante il refresh.
+        """
+        with self._refresh_lock:
+            now = time.monotonic()
+            if not self._last_full_build or now - self._last_full_build >= INTERLINK_FULL_REBUILD_SECONDS:
+                self.rebuild()
+                return
+            if not force and now - self._last_refresh < INTERLINK_REFRESH_SECONDS:
+                return
+            # gte sul watermark: le righe di confine vengono rilette, l'upsert e' idempotente
+            rows = list(self._fetch_rows(self._watermark))
+            with self._lock:
+                for row in rows:
+                    self._upsert(row)
+                    self._advance_watermark(row)
+                self._last_refresh = now
+        if rows:
+            logger.debug("[interlink] Refresh incrementale: {} righe aggiornate", len(rows))
+
+    # ── query ────────────────────────────────────────────────────────────
+
+    def snapshot(self) -> Tuple[int, List[IndexedArticle]]:
+        """Versione corrente e copia della lista articoli indicizzati."""
+        with self._lock:
+            return self._version, list(self._articles.values())
+
+    def related(self, title: str, tags: List[str], category: str, limit: int = 3) -> List[dict]:
+        """Top `limit` articoli correlati con lo score storico di find_related_articles."""
+        new_tags_set = set(t.lower().strip() for t in tags if t)
+        new_words = title_words(title)
+        category_slug_new = category.lower().replace(' ', '-') if category else ''
+        max_tags = max(len(new_tags_set), 1)
+        max_title_words = max(len(new_words), 1)
+
+        with self._lock:
+            tag_hits: Dict[int, int] = {}
+            for tag in new_tags_set:
+                for article_id in self._by_tag.get(tag, ()):
+                    tag_hits[article_id] = tag_hits.get(article_id, 0) + 1
+            word_hits: Dict[int, int] = {}
+            for word in new_words:
+                for article_id in self._by_word.get(word, ()):
+                    word_hits[article_id] = word_hits.get(article_id, 0) + 1
+            same_category = self._by_category.get(category_slug_new, set())
+
+            scored = []
+            for article_id in set(tag_hits) | set(word_hits) | same_category:
+                total_score = (
+                    (tag_hits.get(article_id, 0) / max_tags) * 0.6
+                    + (0.25 if article_id in same_category else 0)
+                    + (word_hits.get(article_id, 0) / max_title_words) * 0.15
+                )
+                if total_score > 0.1:
+                    article = self._articles[article_id]
+                    scored.append((total_score, article_id, article))
+
+        # A parita' di score vince l'id piu' basso, come nella scansione ordinata per id
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [
+            {
+                'title': article.title,
+                'slug': article.slug,
+                'category_slug': article.category_slug,
+                'score': score,
+            }
+            for score, _, article in scored[:limit]
+        ]
+
+
+_index = InterlinkIndex()
+
+
+def get_index() -> InterlinkIndex:
+    """Indice condiviso del processo, aggiornato se necessario."""
+    _index.refresh()
+    return _index
@@ -0,0 +1,191 @@
+"""Scoring vettoriale (matrici sparse NumPy/SciPy) per l'interlinking.
+
+Costruisce dalla snapshot di `interlink_index` una matrice sparsa
+articoli x termini e valuta una query su tutto l'archivio con un solo
+prodotto matrice-vettore. Due modalita' (`INTERLINK_SCORING`):
+
+- ``weighted``: lo score storico di find_related_articles
+  (0.6 overlap tag + 0.25 stessa categoria + 0.15 overlap parole titolo,
+  soglia > 0.1), identico alla versione a posting list;
+- ``bm25``: Okapi BM25 sul documento tag + parole del titolo + categoria
+  (k1=`INTERLINK_BM25_K1`, b=`INTERLINK_BM25_B`), soglia
+  `INTERLINK_BM25_MIN_SCORE`.
+
+Le matrici vengono ricostruite solo quando cambia la versione dell'indice.
+Senza numpy/scipy installati si ricade sullo scoring a posting list di
+`InterlinkIndex.related` (solo modalita' weighted).
+"""
+from __future__ import annotations
+
+import os
+import threading
+from typing import Dict, List, Optional, Sequence
+
+from .interlink_index import IndexedArticle, InterlinkIndex, title_words
+from .logger import logger
+
+try:
+    import numpy as np
+    from scipy import sparse
+    _HAS_SCIPY = True
+except ImportError:
+    _HAS_SCIPY = False
+
+SCORING_WEIGHTED = "weighted"
+SCORING_BM25 = "bm25"
+
+INTERLINK_SCORING = os.getenv("INTERLINK_SCORING", SCORING_WEIGHTED).strip().lower()
+INTERLINK_TOP_K = int(os.getenv("INTERLINK_TOP_K", "3"))
+INTERLINK_BM25_K1 = float(os.getenv("INTERLINK_BM25_K1", "1.5"))
+INTERLINK_BM25_B = float(os.getenv("INTERLINK_BM25_B", "0.75"))
+INTERLINK_BM25_MIN_SCORE = float(os.getenv("INTERLINK_BM25_MIN_SCORE", "0"))
+
+# Soglia storica della modalita' weighted
+_WEIGHTED_MIN_SCORE = 0.1
+
+
+class SparseScorer:
+    """Matrici sparse costruite da una snapshot immutabile dell'indice."""
+
+    def __init__(self, articles: Sequence[IndexedArticle]) -> None:
+        # Ordine per id: a parita' di score vince l'id piu' basso
+        self.articles: List[IndexedArticle] = sorted(articles, key=lambda a: a.id)
+        self.tag_vocab: Dict[str, int] = {}
+        self.word_vocab: Dict[str, int] = {}
+        self.category_vocab: Dict[str, int] = {}
+
+        tag_rows, tag_cols = [], []
+        word_rows, word_cols = [], []
+        categories = np.full(len(self.articles), -1, dtype=np.int64)
+        for row, article in enumerate(self.articles):
+            for tag in article.tags:
+                tag_rows.append(row)
+                tag_cols.append(self.tag_vocab.setdefault(tag, len(self.tag_vocab)))
+            for word in article.words:
+                word_rows.append(row)
+                word_cols.append(self.word_vocab.setdefault(word, len(self.word_vocab)))
+            if isinstance(article.category_slug, str):
+                categories[row] = self.category_vocab.setdefault(article.category_slug, len(self.category_vocab))
+
+        n = len(self.articles)
+        self.tags = self._binary(tag_rows, tag_cols, (n, len(self.tag_vocab)))
+        self.words = self._binary(word_rows, word_cols, (n, len(self.word_vocab)))
+        self.categories = categories
+        self._bm25: Optional["sparse.csr_matrix"] = None
+
+    @staticmethod
+    def _binary(rows: List[int], cols: List[int], shape) -> "sparse.csr_matrix":
+        data = np.ones(len(rows), dtype=np.float64)
+        return sparse.csr_matrix((data, (rows, cols)), shape=shape)
+
+    def _bm25_matrix(self) -> "sparse.csr_matrix":
+        """Pesi BM25 documento-termine su [tag | parole | categoria], calcolati una volta."""
+        if self._bm25 is None:
+            n = len(self.articles)
+            cat_rows = np.flatnonzero(self.categories >= 0)
+            cats = self._binary(
+                cat_rows.tolist(), self.categories[cat_rows].tolist(), (n, len(self.category_vocab))
+            )
+            tf = sparse.hstack([self.tags, self.words, cats], format="csr")
+            doc_len = np.asarray(tf.sum(axis=1)).ravel()
+            avg_len = doc_len.mean() if n else 0.0
+            df = np.bincount(tf.indices, minlength=tf.shape[1])
+            idf = np.log1p((n - df + 0.5) / (df + 0.5))
+
+            k1, b = INTERLINK_BM25_K1, INTERLINK_BM25_B
+            norm = k1 * (1 - b + b * doc_len / avg_len) if avg_len else np.full(n, k1)
+            weights = tf.copy()
+            row_of_entry = np.repeat(np.arange(n), np.diff(tf.indptr))
+            weights.data = idf[tf.indices] * tf.data * (k1 + 1) / (tf.data + norm[row_of_entry])
+            self._bm25 = weights
+        return self._bm25
+
+    def _query_vector(self, vocab: Dict[str, int], terms) -> "np.ndarray":
+        q = np.zeros(len(vocab), dtype=np.float64)
+        for term in terms:
+            col = vocab.get(term)
+            if col is not None:
+                q[col] = 1.0
+        return q
+
+    def score(self, title: str, tags: List[str], category: str, mode: str) -> "np.ndarray":
+        new_tags = set(t.lower().strip() for t in tags if t)
+        new_words = title_words(title)
+        category_slug = category.lower().replace(' ', '-') if category else ''
+        category_id = self.category_vocab.get(category_slug, -2)
+
+        if mode == SCORING_BM25:
+            n_tags, n_words = len(self.tag_vocab), len(self.word_vocab)
+            q = np.concatenate([
+                self._query_vector(self.tag_vocab, new_tags),
+                self._query_vector(self.word_vocab, new_words),
+                np.zeros(len(self.category_vocab)),
+            ])
+            if category_id >= 0:
+                q[n_tags + n_words + category_id] = 1.0
+            return self._bm25_matrix() @ q
+
+        tag_overlap = self.tags @ self._query_vector(self.tag_vocab, new_tags)
+        word_overlap = self.words @ self._query_vector(self.word_vocab, new_words)
+        return (
+            tag_overlap / max(len(new_tags), 1) * 0.6
+            + (self.categories == category_id) * 0.25
+            + word_overlap / max(len(new_words), 1) * 0.15
+        )
+
+    def top_k(self, title: str, tags: List[str], category: str, k: int, mode: str) -> List[dict]:
+        if not self.articles or k <= 0:
+            return []
+        scores = self.score(title, tags, category, mode)
+        min_score = INTERLINK_BM25_MIN_SCORE if mode == SCORING_BM25 else _WEIGHTED_MIN_SCORE
+        candidates = np.flatnonzero(scores > min_score)
+        if candidates.size > k:
+            # np.partition trova la soglia del k-esimo in O(n); al bordo possono esserci pari merito
+            kth = np.partition(scores[candidates], candidates.size - k)[candidates.size - k]
+            candidates = candidates[scores[candidates] >= kth]
+        # Score decrescente, poi id crescente (righe gia' ordinate per id)
+        order = candidates[np.lexsort((candidates, -scores[candidates]))][:k]
+        return [
+            {
+                'title': self.articles[i].title,
+                'slug': self.articles[i].slug,
+                'category_slug': self.articles[i].category_slug,
+                'score': float(scores[i]),
+            }
+            for i in order
+        ]
+
+
+_scorer_lock = threading.Lock()
+_scorer: Optional[SparseScorer] = None
+_scorer_version = -1
+
+
+def _get_scorer(index: InterlinkIndex) -> SparseScorer:
+    global _scorer, _scorer_version
+    version, articles = index.snapshot()
+    with _scorer_lock:
+        if _scorer is None or version != _scorer_version:
+            _scorer = SparseScorer(articles)
+            _scorer_version = version
+            logger.debug("[interlink] Matrici sparse ricostruite: {} articoli, {} tag, {} parole",
+                         len(_scorer.articles), len(_scorer.tag_vocab), len(_scorer.word_vocab))
+        return _scorer
+
+
+def related(
+    index: InterlinkIndex,
+    title: str,
+    tags: List[str],
+    category: str,
+    k: Optional[int] = None,
+    mode: Optional[str] = None,
+) -> List[dict]:
+    """Top-k articoli correlati secondo la modalita' di scoring configurata."""
+    k = INTERLINK_TOP_K if k is None else k
+    mode = (mode or INTERLINK_SCORING).lower()
+    if not _HAS_SCIPY:
+        if mode == SCORING_BM25:
+            logger.warning("[interlink] numpy/scipy non installati, BM25 non disponibile: uso weighted")
+        return index.related(title, tags, category, limit=k)
+    return _get_scorer(index).top_k(title, tags, category, k, mode)
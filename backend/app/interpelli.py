@@ -14,14 +14,17 @@ Eseguibile con: python -m app.interpelli
 
 import re
 import json
-import requests
+import contextvars
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from contextlib import contextmanager
 from datetime import datetime, date, timedelta
 from dataclasses import dataclass, field
 from typing import List, Dict, Optional, Any
+from urllib.parse import urlsplit
 
 from bs4 import BeautifulSoup
 from firecrawl import Firecrawl
-import anthropic
 from dotenv import load_dotenv
 import os
 
@@ -31,17 +34,27 @@ from .database import get_supabase_client
 from .indexnow import submit_to_indexnow
 from .google_indexing import notify_google_indexing
 from .logger import logger
+from . import claude_batch, gazetteer_it, http_client, llm_gateway, page_cache
+from .supabase_bulk import BulkWriter
 
 # ---------------------------------------------------------------------------
 # Configurazione
 # ---------------------------------------------------------------------------
 
 BASE_URL = "https://www.scuolainterpelli.it/interpelli-scuola-aggiornati/"
-ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
 FIRECRAWL_API_KEY = os.getenv("FIRECRAWL_API_KEY")
 
 CLAUDE_MODEL = "claude-opus-4-7"
 
+# Classificazione/espansione: task (scrape + LLM) in parallelo e scrape
+# contemporanei verso lo stesso host di destinazione
+INTERPELLI_WORKERS = int(os.getenv("INTERPELLI_WORKERS", "8"))
+INTERPELLI_PER_HOST = int(os.getenv("INTERPELLI_PER_HOST", "2"))
+# Scrape Firecrawl contemporanei in totale (limite di concorrenza del piano Firecrawl)
+FIRECRAWL_CONCURRENCY = int(os.getenv("FIRECRAWL_CONCURRENCY", "4"))
+# Run con classificazione fallita prima di trattare l'interpello come singolo
+INTERPELLI_CLASSIFY_MAX_ATTEMPTS = int(os.getenv("INTERPELLI_CLASSIFY_MAX_ATTEMPTS", "3"))
+
 
 def _generate_interpello_slug(item: dict) -> str:
     """Genera slug URL-friendly per un interpello (replica della logica frontend)."""
@@ -59,34 +72,41 @@ def _generate_interpello_slug(item: dict) -> str:
     return raw.strip("-")
 
 
-def _llm_json_request(
+def _json_request_params(
     system_prompt: str,
     user_content: str,
     temperature: float = 0,
     max_tokens: int = 4096,
 ) -> dict:
-    """Chiama Claude Opus 4.6 per ottenere una risposta JSON."""
-    claude = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-
+    """Parametri di messages.create per una risposta JSON (chiamata diretta o batch)."""
     # Forza output JSON nel system prompt
     json_system = system_prompt + "\n\nIMPORTANTE: Rispondi SOLO con JSON valido. Esegui l'escape di tutte le virgolette nei valori stringa con backslash (\\\")"
-
-    response = claude.messages.create(
+    return dict(
         model=CLAUDE_MODEL,
         max_tokens=max_tokens,
-        system=json_system,
+        # Prompt statico per tutti gli item della run: in cache dopo la prima chiamata
+        system=llm_gateway.cached_system(json_system),
         messages=[
             {"role": "user", "content": user_content},
         ],
         temperature=temperature,
     )
-    raw = response.content[0].text.strip()
-    # Gestisci eventuale blocco markdown ```json ... ```
+
+
+def _strip_json_fence(raw: str) -> str:
+    """Gestisci eventuale blocco markdown ```json ... ```"""
+    raw = raw.strip()
     if "```" in raw:
         raw = raw.split("```")[1]
         if raw.startswith("json"):
             raw = raw[4:]
         raw = raw.strip()
+    return raw
+
+
+def _parse_json_response(raw: str, max_tokens: int = 4096) -> dict:
+    """JSON dalla risposta di Claude; se malformato chiede a Claude di correggerlo."""
+    raw = _strip_json_fence(raw)
 
     # Primo tentativo di parsing
     try:
@@ -96,7 +116,7 @@ def _llm_json_request(
 
     # Fallback: chiedi a Claude di fixare il JSON malformato
     try:
-        fix_response = claude.messages.create(
+        fix_response = llm_gateway.messages_create(
             model=CLAUDE_MODEL,
             max_tokens=max_tokens,
             system="Correggi il seguente JSON malformato. Rispondi SOLO con il JSON corretto, senza markdown, senza spiegazioni. Assicurati che tutte le virgolette dentro i valori stringa siano escapate con backslash.",
@@ -105,17 +125,24 @@ def _llm_json_request(
             ],
             temperature=0,
         )
-        fixed = fix_response.content[0].text.strip()
-        if "```" in fixed:
-            fixed = fixed.split("```")[1]
-            if fixed.startswith("json"):
-                fixed = fixed[4:]
-            fixed = fixed.strip()
-        return json.loads(fixed)
+        return json.loads(_strip_json_fence(fix_response.content[0].text))
     except Exception as fix_err:
         logger.error("Impossibile fixare JSON: {}", fix_err)
         raise
 
+
+def _llm_json_request(
+    system_prompt: str,
+    user_content: str,
+    temperature: float = 0,
+    max_tokens: int = 4096,
+) -> dict:
+    """Chiama Claude Opus 4.6 per ottenere una risposta JSON."""
+    response = llm_gateway.messages_create(
+        **_json_request_params(system_prompt, user_content, temperature, max_tokens)
+    )
+    return _parse_json_response(response.content[0].text, max_tokens)
+
 MESI_ITALIANI = {
     "gennaio": "01", "febbraio": "02", "marzo": "03", "aprile": "04",
     "maggio": "05", "giugno": "06", "luglio": "07", "agosto": "08",
@@ -220,7 +247,9 @@ def scrape_daily_links_from_main_page(max_pages: int = 5) -> List[DailyLink]:
         url = BASE_URL if page_num == 1 else f"{BASE_URL}{page_num}/"
         logger.info("Scraping pagina principale: {}", url)
         try:
-            resp = requests.get(url, headers=HEADERS, timeout=30)
+            resp = page_cache.fetch_http(
+                http_client.session(), url, ttl=page_cache.PAGE_CACHE_LINKS_TTL, headers=HEADERS, timeout=30
+            )
             if resp.status_code != 200:
                 logger.info("Pagina {} non trovata (status {}), fermo paginazione.", page_num, resp.status_code)
                 break
@@ -302,6 +331,16 @@ def _extract_class_code(text: str) -> Optional[str]:
     return match.group(1) if match else None
 
 
+# Codici esistenti: A001-A066, B001-B032, lingue (AA24, BA02...), sostegno, infanzia/primaria
+_KNOWN_CLASS_CODE_RE = re.compile(r"\b([AB]\d{3}|[AB][A-Z]\d{2}|AD(?:AA|EE|MM|SS)|AAAA|EEEE)\b")
+
+
+def _known_class_code(text: str) -> Optional[str]:
+    """Classe di concorso solo se e' un codice esistente (`_extract_class_code` accetta anche "IC", "USR"...)."""
+    match = _KNOWN_CLASS_CODE_RE.search(text or "")
+    return match.group(1) if match else None
+
+
 def _extract_interpelli_from_html(html: str, date: Optional[str] = None) -> List[InterpelloEntry]:
     """Parsa l'HTML di una pagina giornaliera ed estrae gli interpelli.
 
@@ -368,7 +407,7 @@ def scrape_interpelli_from_daily_page(url: str) -> List[InterpelloEntry]:
     logger.info("Scraping interpelli da: {}", url)
     date = _parse_date_from_url(url)
     try:
-        resp = requests.get(url, headers=HEADERS, timeout=30)
+        resp = page_cache.fetch_http(http_client.session(), url, headers=HEADERS, timeout=30)
         if resp.status_code != 200:
             logger.error("Errore HTTP {} per {}", resp.status_code, url)
             return []
@@ -384,45 +423,32 @@ def save_interpelli_to_supabase(entries: List[InterpelloEntry], source_url: str)
     """Salva gli interpelli su Supabase con dedup su interpello_link."""
     if not entries:
         return 0
-    supabase = get_supabase_client()
-
-    # Controlla link gia esistenti
-    links_to_check = [e.interpello_link for e in entries]
-    existing = (
-        supabase.table("interpelli")
-        .select("interpello_link")
-        .in_("interpello_link", links_to_check)
-        .execute()
-    )
-    existing_links = {row["interpello_link"] for row in (existing.data or [])}
-
-    new_entries = [e for e in entries if e.interpello_link not in existing_links]
-    if not new_entries:
+    # Dedup con `in_` a blocchi e insert a blocchi
+    with BulkWriter(get_supabase_client(), "interpelli", dedup_on="interpello_link") as writer:
+        count = writer.insert_missing([_entry_row(e, source_url, "pending") for e in entries])
+    if not count:
         logger.info("Nessun nuovo interpello da salvare")
         return 0
-
-    rows = [
-        {
-            "interpello_name": e.interpello_name,
-            "interpello_link": e.interpello_link,
-            "interpello_date": e.interpello_date,
-            "interpello_description": e.interpello_description,
-            "interpello_regione": e.interpello_regione,
-            "interpello_provincia": e.interpello_provincia,
-            "interpello_citta": e.interpello_citta,
-            "classe_concorso": e.classe_concorso,
-            "source_daily_link": source_url,
-            "link_type": "single",
-            "status": "pending",
-        }
-        for e in new_entries
-    ]
-    resp = supabase.table("interpelli").insert(rows).execute()
-    count = len(resp.data) if resp.data else 0
     logger.info("Salvati {} nuovi interpelli da {}", count, source_url)
     return count
 
 
+def _entry_row(entry: InterpelloEntry, source_daily_link: str, status: str) -> dict:
+    return {
+        "interpello_name": entry.interpello_name,
+        "interpello_link": entry.interpello_link,
+        "interpello_date": entry.interpello_date,
+        "interpello_description": entry.interpello_description,
+        "interpello_regione": entry.interpello_regione,
+        "interpello_provincia": entry.interpello_provincia,
+        "interpello_citta": entry.interpello_citta,
+        "classe_concorso": entry.classe_concorso,
+        "source_daily_link": source_daily_link,
+        "link_type": "single",
+        "status": status,
+    }
+
+
 # ===========================================================================
 # STEP 4 – Classificazione link interpello (Firecrawl + OpenAI)
 # ===========================================================================
@@ -437,13 +463,44 @@ Rispondi ESCLUSIVAMENTE con un JSON valido:
 {"link_type": "single" oppure "list", "sub_links": ["url1", "url2"] oppure []}"""
 
 
-def classify_interpello_link(link: str, name: str) -> LinkClassification:
-    """Classifica un link interpello come singolo o lista usando Firecrawl + OpenAI."""
+_host_slots: Dict[str, threading.BoundedSemaphore] = {}
+_host_slots_lock = threading.Lock()
+_firecrawl_slots = threading.BoundedSemaphore(max(1, FIRECRAWL_CONCURRENCY))
+
+
+@contextmanager
+def _host_slot(url: str):
+    """Limita a INTERPELLI_PER_HOST gli scrape contemporanei verso lo stesso sito."""
+    host = (urlsplit(url).hostname or "").lower()
+    with _host_slots_lock:
+        slot = _host_slots.get(host)
+        if slot is None:
+            slot = _host_slots[host] = threading.BoundedSemaphore(max(1, INTERPELLI_PER_HOST))
+    with slot:
+        yield
+
+
+def _firecrawl_markdown(url: str) -> str:
+    """Markdown della pagina via Firecrawl, passando dalla cache pagine condivisa."""
+    def _fetch() -> Optional[str]:
+        # Prima lo slot del sito, poi quello globale: chi aspetta un sito affollato non blocca gli altri
+        with _host_slot(url), _firecrawl_slots:
+            firecrawl = Firecrawl(api_key=FIRECRAWL_API_KEY)
+            result = firecrawl.scrape(url, formats=["markdown"])
+        return result.markdown if hasattr(result, "markdown") else ""
+
+    return page_cache.get_or_fetch(url, page_cache.VARIANT_FIRECRAWL_MARKDOWN, _fetch) or ""
+
+
+def classify_interpello_link(link: str, name: str) -> Optional[LinkClassification]:
+    """Classifica un link interpello come singolo o lista usando Firecrawl + Claude.
+
+    Ritorna None se scrape o classificazione falliscono: il chiamante
+    ritenta alla run successiva (vedi `classify_and_expand_all`).
+    """
     try:
         # Scrape con Firecrawl
-        firecrawl = Firecrawl(api_key=FIRECRAWL_API_KEY)
-        result = firecrawl.scrape(link, formats=["markdown"])
-        content = result.markdown if hasattr(result, "markdown") else ""
+        content = _firecrawl_markdown(link)
         if not content:
             logger.info("Nessun contenuto Firecrawl per {}", link)
             return LinkClassification(link_type="single")
@@ -462,7 +519,7 @@ def classify_interpello_link(link: str, name: str) -> LinkClassification:
         )
     except Exception as e:
         logger.error("Errore classificazione {}: {}", link, e)
-        return LinkClassification(link_type="single")
+        return None
 
 
 SUB_LINK_EXTRACTION_PROMPT = """Analizza il contenuto di questa pagina di un interpello scolastico ed estrai le informazioni principali.
@@ -494,9 +551,7 @@ def _scrape_sub_link_details(url: str, parent: dict) -> InterpelloEntry:
     )
 
     try:
-        firecrawl = Firecrawl(api_key=FIRECRAWL_API_KEY)
-        result = firecrawl.scrape(url, formats=["markdown"])
-        content = result.markdown if hasattr(result, "markdown") else ""
+        content = _firecrawl_markdown(url)
         if not content:
             logger.info("Nessun contenuto per sub-link {}, uso dati parent", url)
             return fallback
@@ -524,19 +579,26 @@ def _scrape_sub_link_details(url: str, parent: dict) -> InterpelloEntry:
         return fallback
 
 
-def process_list_interpello(parent: dict, sub_links: List[str]) -> List[InterpelloEntry]:
-    """Per un interpello di tipo lista, scrape ogni sub-link per estrarre i dettagli."""
-    entries: List[InterpelloEntry] = []
-    logger.info("Scraping {} sub-link dalla lista...", len(sub_links))
-    for i, sub_url in enumerate(sub_links, 1):
-        logger.info("[{}/{}] {}...", i, len(sub_links), sub_url[:80])
-        entry = _scrape_sub_link_details(sub_url, parent)
-        entries.append(entry)
-    return entries
+def _submit(executor: ThreadPoolExecutor, fn, *args) -> Future:
+    # copy_context: le chiamate LLM restano nel contatore della pipeline
+    return executor.submit(contextvars.copy_context().run, fn, *args)
 
 
 def classify_and_expand_all() -> int:
-    """Classifica tutti gli interpelli pending e espande quelli di tipo lista."""
+    """Classifica tutti gli interpelli pending e espande quelli di tipo lista.
+
+    Grafo di task a concorrenza limitata (INTERPELLI_WORKERS thread, al massimo
+    INTERPELLI_PER_HOST scrape per sito e FIRECRAWL_CONCURRENCY in totale):
+    tutte le classificazioni partono insieme e, appena un interpello risulta
+    una lista, i suoi sub-link vengono accodati allo stesso pool. Le scritture su Supabase restano nel thread
+    chiamante e passano da `BulkWriter`: transizioni di stato raggruppate in
+    ``update ... in_(id)``, sub-link con dedup ``in_`` e insert a blocchi
+    (prima i parent -> list/completed, poi i sub-link classified). Un
+    interpello la cui classificazione fallisce resta `pending` con
+    `classify_attempts` incrementato; al tentativo
+    INTERPELLI_CLASSIFY_MAX_ATTEMPTS (o subito, se la colonna non esiste)
+    prende la transizione storica single/classified.
+    """
     supabase = get_supabase_client()
     pending = (
         supabase.table("interpelli")
@@ -551,57 +613,53 @@ def classify_and_expand_all() -> int:
         return 0
 
     logger.info("Classificazione di {} interpelli...", len(items))
-    expanded_count = 0
 
-    for item in items:
-        link = item.get("interpello_link", "")
-        name = item.get("interpello_name", "")
-        item_id = item.get("id")
-
-        classification = classify_interpello_link(link, name)
-        logger.info("{}... -> {}", name[:60], classification.link_type)
-
-        if classification.link_type == "list" and classification.sub_links:
-            # Aggiorna parent come lista (completed = no articolo da generare)
-            supabase.table("interpelli").update(
-                {"link_type": "list", "status": "completed"}
-            ).eq("id", item_id).execute()
-
-            # Scrape e crea entry per ogni sub-link
-            sub_entries = process_list_interpello(item, classification.sub_links)
-            for entry in sub_entries:
-                # Dedup
-                existing = (
-                    supabase.table("interpelli")
-                    .select("id")
-                    .eq("interpello_link", entry.interpello_link)
-                    .execute()
-                )
-                if not (existing.data):
-                    supabase.table("interpelli").insert(
-                        {
-                            "interpello_name": entry.interpello_name,
-                            "interpello_link": entry.interpello_link,
-                            "interpello_date": entry.interpello_date,
-                            "interpello_description": entry.interpello_description,
-                            "interpello_regione": entry.interpello_regione,
-                            "interpello_provincia": entry.interpello_provincia,
-                            "interpello_citta": entry.interpello_citta,
-                            "classe_concorso": entry.classe_concorso,
-                            "source_daily_link": item.get("source_daily_link", ""),
-                            "link_type": "single",
-                            "status": "classified",
-                        }
-                    ).execute()
-                    expanded_count += 1
-        else:
-            # Singolo: segna come classificato
-            supabase.table("interpelli").update(
-                {"link_type": "single", "status": "classified"}
-            ).eq("id", item_id).execute()
+    writer = BulkWriter(supabase, "interpelli", dedup_on="interpello_link")
+    with writer, ThreadPoolExecutor(max_workers=max(1, INTERPELLI_WORKERS), thread_name_prefix="interpelli") as executor:
+        # future -> ("classify", item) oppure ("sub_link", parent)
+        tasks: Dict[Future, tuple] = {
+            _submit(executor, classify_interpello_link, item.get("interpello_link", ""),
+                    item.get("interpello_name", "")): ("classify", item)
+            for item in items
+        }
+        while tasks:
+            done, _ = wait(tasks, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, item = tasks.pop(future)
 
-    logger.info("Classificazione completata. Espansi {} sub-link.", expanded_count)
-    return expanded_count
+                if kind == "sub_link":
+                    writer.stage_insert(_entry_row(future.result(), item.get("source_daily_link", ""), "classified"))
+                    continue
+
+                classification: Optional[LinkClassification] = future.result()
+                name = item.get("interpello_name", "")
+                item_id = item.get("id")
+                if classification is None:
+                    attempts = (item.get("classify_attempts") or 0) + 1
+                    if "classify_attempts" in item and attempts < INTERPELLI_CLASSIFY_MAX_ATTEMPTS:
+                        logger.warning("{}... resta pending (classificazione fallita, tentativo {}/{})",
+                                       name[:60], attempts, INTERPELLI_CLASSIFY_MAX_ATTEMPTS)
+                        writer.stage_update(item_id, {"classify_attempts": attempts})
+                        continue
+                    logger.warning("{}... classificazione fallita {} volte, trattato come singolo",
+                                   name[:60], attempts)
+                    classification = LinkClassification(link_type="single")
+                logger.info("{}... -> {}", name[:60], classification.link_type)
+
+                if classification.link_type == "list" and classification.sub_links:
+                    # Aggiorna parent come lista (completed = no articolo da generare)
+                    writer.stage_update(item_id, {"link_type": "list", "status": "completed"})
+
+                    # Scrape e crea entry per ogni sub-link
+                    logger.info("Scraping {} sub-link dalla lista...", len(classification.sub_links))
+                    for sub_url in classification.sub_links:
+                        tasks[_submit(executor, _scrape_sub_link_details, sub_url, item)] = ("sub_link", item)
+                else:
+                    # Singolo: segna come classificato
+                    writer.stage_update(item_id, {"link_type": "single", "status": "classified"})
+
+    logger.info("Classificazione completata. Espansi {} sub-link.", writer.inserted)
+    return writer.inserted
 
 
 # ===========================================================================
@@ -656,8 +714,56 @@ def enrich_interpello_metadata(item: dict) -> dict:
         return {}
 
 
+def enrich_interpello_locally(item: dict) -> Optional[dict]:
+    """Regione/provincia dal gazetteer e classe di concorso dal testo, senza LLM.
+
+    None se manca uno dei due: l'item passa a `enrich_interpello_metadata`.
+    La citta' resta quella gia' estratta (l'LLM la deduce solo se esplicita).
+    """
+    name = item.get("interpello_name", "") or ""
+    description = item.get("interpello_description", "") or ""
+    classe = _known_class_code(item.get("classe_concorso") or "") or _known_class_code(f"{name} {description}")
+    if not classe:
+        return None
+    place = gazetteer_it.resolve(
+        name,
+        description,
+        item.get("interpello_link", "") or "",
+        regione=item.get("interpello_regione", "") or "",
+        provincia=item.get("interpello_provincia", "") or "",
+    )
+    if place is None:
+        return None
+    return {
+        "interpello_regione": place.regione,
+        "interpello_provincia": place.provincia,
+        "interpello_citta": item.get("interpello_citta", "") or "",
+        "classe_concorso": classe,
+    }
+
+
+def _stage_enrichment(writer: BulkWriter, item: dict, enriched: dict) -> None:
+    if enriched:
+        writer.stage_fields(item["id"], {
+            "interpello_regione": enriched["interpello_regione"],
+            "interpello_provincia": enriched["interpello_provincia"],
+            "interpello_citta": enriched["interpello_citta"],
+            "classe_concorso": enriched["classe_concorso"],
+            "status": "enriched",
+        })
+        logger.info("Arricchito: {}... -> {}/{}/{}", item.get('interpello_name', '')[:50], enriched.get('interpello_regione'), enriched.get('interpello_provincia'), enriched.get('classe_concorso'))
+    else:
+        # Segna comunque come enriched per non bloccare la pipeline
+        writer.stage_update(item["id"], {"status": "enriched"})
+
+
 def enrich_all_classified() -> int:
-    """Arricchisce i metadati di tutti gli interpelli classificati."""
+    """Arricchisce i metadati di tutti gli interpelli classificati.
+
+    Gli item risolvibili con `enrich_interpello_locally` non chiamano l'LLM;
+    gli altri vanno a `enrich_interpello_metadata` in parallelo
+    (INTERPELLI_WORKERS thread). Le scritture restano nel thread chiamante.
+    """
     supabase = get_supabase_client()
     pending = (
         supabase.table("interpelli")
@@ -672,31 +778,32 @@ def enrich_all_classified() -> int:
         return 0
 
     logger.info("Enrichment metadati per {} interpelli...", len(items))
-    enriched_count = 0
 
+    local = []
+    remote = []
     for item in items:
-        enriched = enrich_interpello_metadata(item)
+        enriched = enrich_interpello_locally(item)
         if enriched:
-            supabase.table("interpelli").update(
-                {
-                    "interpello_regione": enriched["interpello_regione"],
-                    "interpello_provincia": enriched["interpello_provincia"],
-                    "interpello_citta": enriched["interpello_citta"],
-                    "classe_concorso": enriched["classe_concorso"],
-                    "status": "enriched",
-                }
-            ).eq("id", item["id"]).execute()
-            enriched_count += 1
-            logger.info("Arricchito: {}... -> {}/{}/{}", item.get('interpello_name', '')[:50], enriched.get('interpello_regione'), enriched.get('interpello_provincia'), enriched.get('classe_concorso'))
+            local.append((item, enriched))
         else:
-            # Segna comunque come enriched per non bloccare la pipeline
-            supabase.table("interpelli").update(
-                {"status": "enriched"}
-            ).eq("id", item["id"]).execute()
-            enriched_count += 1
+            remote.append(item)
+    logger.info(
+        "Enrichment: {}/{} risolti localmente ({:.0%}), {} via LLM",
+        len(local), len(items), len(local) / len(items), len(remote),
+    )
 
-    logger.info("Enrichment completato: {}/{}", enriched_count, len(items))
-    return enriched_count
+    # Solo i metadati nuovi, sulle righe rilette al flush e ancora `classified`: upsert a blocchi
+    with BulkWriter(supabase, "interpelli", expect={"status": "classified"}) as writer:
+        for item, enriched in local:
+            _stage_enrichment(writer, item, enriched)
+        if remote:
+            with ThreadPoolExecutor(max_workers=max(1, INTERPELLI_WORKERS), thread_name_prefix="interpelli") as executor:
+                futures = {_submit(executor, enrich_interpello_metadata, item): item for item in remote}
+                for future in as_completed(futures):
+                    _stage_enrichment(writer, futures[future], future.result())
+
+    logger.info("Enrichment completato: {}/{} ({} senza LLM)", len(items), len(items), len(local))
+    return len(items)
 
 
 # ===========================================================================
@@ -734,6 +841,74 @@ Rispondi ESCLUSIVAMENTE con un JSON valido:
 {"article_title": "...", "article_subtitle": "...", "article_content": "...contenuto markdown completo..."}"""
 
 
+ARTICLE_MAX_TOKENS = 8000
+# Generazione sequenziale: articoli generati tra una scrittura su Supabase e la successiva
+ARTICLE_FLUSH_EVERY = int(os.getenv("INTERPELLI_ARTICLE_FLUSH_EVERY", "10"))
+
+
+def _article_user_content(
+    name: str,
+    description: str,
+    link: str,
+    regione: str,
+    provincia: str,
+    citta: str,
+    classe: Optional[str],
+    date: Optional[str],
+) -> str:
+    user_content = (
+        f"Interpello: {name}\n"
+        f"Descrizione: {description}\n"
+        f"Link ufficiale: {link}\n"
+        f"Regione: {regione}\n"
+        f"Provincia: {provincia}\n"
+    )
+    if citta:
+        user_content += f"Citta: {citta}\n"
+    if classe:
+        user_content += f"Classe di concorso: {classe}\n"
+    if date:
+        user_content += f"Data: {date}\n"
+    return user_content
+
+
+def _article_from_data(data: dict, name: str) -> InterpelloArticle:
+    return InterpelloArticle(
+        article_title=data.get("article_title", name),
+        article_subtitle=data.get("article_subtitle", ""),
+        article_content=data.get("article_content", ""),
+    )
+
+
+def _completed_fields(article: InterpelloArticle) -> dict:
+    return {
+        "article_title": article.article_title,
+        "article_subtitle": article.article_subtitle,
+        "article_content": article.article_content,
+        "status": "completed",
+    }
+
+
+def _notify_published(page_urls: List[str]) -> None:
+    """IndexNow + Google Indexing API (JobPosting) per gli articoli appena scritti."""
+    if page_urls:
+        submit_to_indexnow(page_urls + ["https://edunews24.it/interpelli"])
+        notify_google_indexing(page_urls)
+
+
+def _item_article_args(item: dict) -> dict:
+    return dict(
+        name=item.get("interpello_name", ""),
+        description=item.get("interpello_description", ""),
+        link=item.get("interpello_link", ""),
+        regione=item.get("interpello_regione", ""),
+        provincia=item.get("interpello_provincia", ""),
+        citta=item.get("interpello_citta", ""),
+        classe=item.get("classe_concorso"),
+        date=item.get("interpello_date"),
+    )
+
+
 def generate_interpello_article(
     name: str,
     description: str,
@@ -746,38 +921,24 @@ def generate_interpello_article(
 ) -> Optional[InterpelloArticle]:
     """Genera un articolo giornalistico per un singolo interpello."""
     try:
-        user_content = (
-            f"Interpello: {name}\n"
-            f"Descrizione: {description}\n"
-            f"Link ufficiale: {link}\n"
-            f"Regione: {regione}\n"
-            f"Provincia: {provincia}\n"
-        )
-        if citta:
-            user_content += f"Citta: {citta}\n"
-        if classe:
-            user_content += f"Classe di concorso: {classe}\n"
-        if date:
-            user_content += f"Data: {date}\n"
-
         data = _llm_json_request(
             system_prompt=ARTICLE_PROMPT,
-            user_content=user_content,
+            user_content=_article_user_content(name, description, link, regione, provincia, citta, classe, date),
             temperature=0.7,
-            max_tokens=8000,
-        )
-        return InterpelloArticle(
-            article_title=data.get("article_title", name),
-            article_subtitle=data.get("article_subtitle", ""),
-            article_content=data.get("article_content", ""),
+            max_tokens=ARTICLE_MAX_TOKENS,
         )
+        return _article_from_data(data, name)
     except Exception as e:
         logger.error("Errore generazione articolo per '{}': {}", name, e)
         return None
 
 
-def generate_articles_for_pending() -> int:
-    """Genera articoli per tutti gli interpelli arricchiti senza articolo."""
+def generate_articles_for_pending(batch: Optional[bool] = None) -> int:
+    """Genera articoli per tutti gli interpelli arricchiti senza articolo.
+
+    Con `batch` (default: `claude_batch.enabled`) tutte le richieste passano
+    dalla Message Batches API e i risultati vengono scritti in blocco.
+    """
     supabase = get_supabase_client()
     pending = (
         supabase.table("interpelli")
@@ -791,48 +952,79 @@ def generate_articles_for_pending() -> int:
         logger.info("Nessun interpello in attesa di articolo")
         return 0
 
+    use_batch = claude_batch.enabled(len(items)) if batch is None else batch
+    if use_batch:
+        return _generate_articles_batch(items)
+
     logger.info("Generazione articoli per {} interpelli...", len(items))
-    success_count = 0
+    page_urls: List[str] = []
 
-    for item in items:
-        article = generate_interpello_article(
-            name=item.get("interpello_name", ""),
-            description=item.get("interpello_description", ""),
-            link=item.get("interpello_link", ""),
-            regione=item.get("interpello_regione", ""),
-            provincia=item.get("interpello_provincia", ""),
-            citta=item.get("interpello_citta", ""),
-            classe=item.get("classe_concorso"),
-            date=item.get("interpello_date"),
+    # Ogni riga costa una generazione LLM: si scrive ogni ARTICLE_FLUSH_EVERY articoli
+    with BulkWriter(supabase, "interpelli", chunk_size=ARTICLE_FLUSH_EVERY, expect={"status": "enriched"}) as writer:
+        for item in items:
+            article = generate_interpello_article(**_item_article_args(item))
+            if article:
+                writer.stage_fields(item["id"], _completed_fields(article))
+                page_urls.append(f"https://edunews24.it/interpelli/{_generate_interpello_slug(item)}")
+                logger.info("Articolo generato: {}...", article.article_title[:60])
+            else:
+                writer.stage_update(item["id"], {"status": "error"})
+
+    _notify_published(page_urls)
+    logger.info("Generati {}/{} articoli", len(page_urls), len(items))
+    return len(page_urls)
+
+
+def _generate_articles_batch(items: List[dict]) -> int:
+    """Generazione via Message Batches con scrittura dei risultati in blocco.
+
+    Gli item annullati/scaduti nel batch restano `enriched` e vengono
+    ripresi alla run successiva; quelli in errore passano a `error`.
+    """
+    logger.info("Generazione articoli in batch per {} interpelli...", len(items))
+    requests = {
+        f"interpello-{item['id']}": _json_request_params(
+            ARTICLE_PROMPT,
+            _article_user_content(**_item_article_args(item)),
+            temperature=0.7,
+            max_tokens=ARTICLE_MAX_TOKENS,
         )
-        if article:
-            supabase.table("interpelli").update(
-                {
-                    "article_title": article.article_title,
-                    "article_subtitle": article.article_subtitle,
-                    "article_content": article.article_content,
-                    "status": "completed",
-                }
-            ).eq("id", item["id"]).execute()
-            success_count += 1
-            logger.info("Articolo generato: {}...", article.article_title[:60])
-
-            # Notify IndexNow
-            slug = _generate_interpello_slug(item)
-            submit_to_indexnow([
-                f"https://edunews24.it/interpelli/{slug}",
-                "https://edunews24.it/interpelli",
-            ])
-
-            # Notify Google Indexing API (JobPosting)
-            notify_google_indexing([f"https://edunews24.it/interpelli/{slug}"])
+        for item in items
+    }
+    results = claude_batch.run(requests)
+
+    completed: Dict[Any, dict] = {}
+    failed_ids: List[Any] = []
+    page_urls: Dict[Any, str] = {}
+    for item in items:
+        result = results.get(f"interpello-{item['id']}")
+        if result is None or result.retryable:
+            continue
+        article = None
+        if result.ok:
+            try:
+                data = _parse_json_response(result.text, ARTICLE_MAX_TOKENS)
+                article = _article_from_data(data, item.get("interpello_name", ""))
+            except Exception as e:
+                logger.error("Errore generazione articolo per '{}': {}", item.get("interpello_name", ""), e)
         else:
-            supabase.table("interpelli").update(
-                {"status": "error"}
-            ).eq("id", item["id"]).execute()
+            logger.error("Errore generazione articolo per '{}': {}", item.get("interpello_name", ""), result.error)
+        if article is None:
+            failed_ids.append(item["id"])
+            continue
+        completed[item["id"]] = _completed_fields(article)
+        page_urls[item["id"]] = f"https://edunews24.it/interpelli/{_generate_interpello_slug(item)}"
+
+    # Il batch puo' durare ore: righe rilette ora (ancora `enriched`) con i campi nuovi,
+    # un upsert per blocco invece di un update per riga
+    with BulkWriter(get_supabase_client(), "interpelli") as writer:
+        written = writer.upsert_current(completed, expect={"status": "enriched"})
+        writer.update_in({"status": "error"}, failed_ids)
 
-    logger.info("Generati {}/{} articoli", success_count, len(items))
-    return success_count
+    _notify_published([page_urls[item_id] for item_id in written])
+
+    logger.info("Generati {}/{} articoli (batch)", len(written), len(items))
+    return len(written)
 
 
 # ===========================================================================
@@ -850,56 +1042,58 @@ def run_interpelli_pipeline() -> Dict[str, Any]:
         "status": "started",
     }
 
-    try:
-        # Step 1: Scrape link giornalieri
-        logger.info("--- STEP 1: Scraping link giornalieri ---")
-        daily_links = scrape_daily_links_from_main_page()
-        result["daily_links_found"] = len(daily_links)
-
-        # Step 2: Filtra e salva nuovi
-        logger.info("--- STEP 2: Filtraggio e salvataggio ---")
-        new_links = filter_new_daily_links(daily_links)
-        saved = save_daily_links_to_supabase(new_links)
-        result["daily_links_saved"] = saved
-
-        if not new_links:
-            logger.info("Nessun nuovo link giornaliero, verifico interpelli pending...")
-
-        # Step 3: Per ogni link giornaliero nuovo, scrape interpelli
-        logger.info("--- STEP 3: Scraping interpelli ---")
-        total_interpelli = 0
-        for link in new_links:
-            entries = scrape_interpelli_from_daily_page(link.link_url)
-            count = save_interpelli_to_supabase(entries, link.link_url)
-            total_interpelli += count
-            # Aggiorna status del link giornaliero
-            supabase = get_supabase_client()
-            supabase.table("interpelli_link_giornalieri").update(
-                {"status": "scraped", "updated_at": datetime.now().isoformat()}
-            ).eq("link_url", link.link_url).execute()
-        result["interpelli_saved"] = total_interpelli
-
-        # Step 4: Classifica e espandi
-        logger.info("--- STEP 4: Classificazione ---")
-        expanded = classify_and_expand_all()
-        result["expanded_sub_links"] = expanded
-
-        # Step 5: Enrichment metadati
-        logger.info("--- STEP 5: Enrichment metadati ---")
-        enriched = enrich_all_classified()
-        result["enriched"] = enriched
-
-        # Step 6: Genera articoli
-        logger.info("--- STEP 6: Generazione articoli ---")
-        articles = generate_articles_for_pending()
-        result["articles_generated"] = articles
-
-        result["status"] = "completed"
+    with llm_gateway.track("interpelli") as llm_usage:
+        try:
+            # Step 1: Scrape link giornalieri
+            logger.info("--- STEP 1: Scraping link giornalieri ---")
+            daily_links = scrape_daily_links_from_main_page()
+            result["daily_links_found"] = len(daily_links)
+
+            # Step 2: Filtra e salva nuovi
+            logger.info("--- STEP 2: Filtraggio e salvataggio ---")
+            new_links = filter_new_daily_links(daily_links)
+            saved = save_daily_links_to_supabase(new_links)
+            result["daily_links_saved"] = saved
+
+            if not new_links:
+                logger.info("Nessun nuovo link giornaliero, verifico interpelli pending...")
+
+            # Step 3: Per ogni link giornaliero nuovo, scrape interpelli
+            logger.info("--- STEP 3: Scraping interpelli ---")
+            total_interpelli = 0
+            for link in new_links:
+                entries = scrape_interpelli_from_daily_page(link.link_url)
+                count = save_interpelli_to_supabase(entries, link.link_url)
+                total_interpelli += count
+                # Aggiorna status del link giornaliero
+                supabase = get_supabase_client()
+                supabase.table("interpelli_link_giornalieri").update(
+                    {"status": "scraped", "updated_at": datetime.now().isoformat()}
+                ).eq("link_url", link.link_url).execute()
+            result["interpelli_saved"] = total_interpelli
+
+            # Step 4: Classifica e espandi
+            logger.info("--- STEP 4: Classificazione ---")
+            expanded = classify_and_expand_all()
+            result["expanded_sub_links"] = expanded
+
+            # Step 5: Enrichment metadati
+            logger.info("--- STEP 5: Enrichment metadati ---")
+            enriched = enrich_all_classified()
+            result["enriched"] = enriched
+
+            # Step 6: Genera articoli
+            logger.info("--- STEP 6: Generazione articoli ---")
+            articles = generate_articles_for_pending()
+            result["articles_generated"] = articles
+
+            result["status"] = "completed"
 
-    except Exception as e:
-        logger.error("ERRORE PIPELINE: {}", e)
-        result["status"] = "error"
-        result["error"] = str(e)
+        except Exception as e:
+            logger.error("ERRORE PIPELINE: {}", e)
+            result["status"] = "error"
+            result["error"] = str(e)
+    result["llm_usage"] = llm_usage.as_dict()
 
     logger.info("=" * 60)
     logger.info("PIPELINE COMPLETATA: {}", result)
@@ -25,6 +25,8 @@ ALTER TABLE interpelli ADD COLUMN IF NOT EXISTS link_type TEXT DEFAULT 'single';
 ALTER TABLE interpelli ADD COLUMN IF NOT EXISTS interpello_citta TEXT;
 ALTER TABLE interpelli ADD COLUMN IF NOT EXISTS interpello_provincia TEXT;
 ALTER TABLE interpelli ADD COLUMN IF NOT EXISTS interpello_regione TEXT;
+-- Classificazioni fallite (scrape/LLM): oltre INTERPELLI_CLASSIFY_MAX_ATTEMPTS si passa a single/classified
+ALTER TABLE interpelli ADD COLUMN IF NOT EXISTS classify_attempts INTEGER DEFAULT 0;
 
 -- Rimuovi colonna deprecata
 ALTER TABLE interpelli DROP COLUMN IF EXISTS article_generated;
@@ -0,0 +1,619 @@
+"""Coda persistente (SQLite) per i job di generazione skill e persona.
+
+Sostituisce `_generating_news_ids` e `_persona_jobs` di main.py, che
+vivevano solo nel processo: i job si perdevano al riavvio, il dict cresceva
+senza limiti e nulla impediva di avviare decine di sessioni Agent SDK.
+
+Ogni job e' una riga `generation_jobs` (vedi models.GenerationJob):
+
+    pending -> running -> done | failed | blocked
+
+- i worker (`JOB_WORKERS` task asyncio per processo, avviati allo startup)
+  si contendono i job pending con un UPDATE condizionale: il claim e' atomico
+  anche tra piu' worker uvicorn che condividono lo stesso DB;
+- il numero di job running e' limitato globalmente da `JOB_MAX_RUNNING`
+  (conteggio fatto nello stesso UPDATE del claim);
+- il claim e' equo tra i creator: parte il job pending piu' vecchio del
+  creator servito meno di recente (round-robin), cosi' un redattore che
+  accoda venti generazioni non blocca quelle degli altri. Ad ogni
+  cambiamento della coda i job pending ricevono la nuova posizione
+  (`queue_position` nel risultato ed evento `queue`, 1 = prossimo a partire);
+- il worker rinnova un lease mentre il job gira: se il processo muore il
+  lease scade e il job torna pending (o failed se ha esaurito i tentativi);
+- le eccezioni dell'handler causano un nuovo tentativo con backoff
+  esponenziale fino a `max_attempts` (default 1: una sessione skill/persona
+  ripetuta costa quanto la prima e puo' duplicare l'insert su Supabase);
+  `PermanentJobError` chiude subito il job con lo stato indicato
+  (failed/blocked). Un lease scaduto (processo morto o riavviato) viene
+  ripreso fino a `JOB_LEASE_RETRIES` volte in piu';
+- i job conclusi restano consultabili per `JOB_TTL_SECONDS`, poi vengono
+  eliminati; i pending mai partiti scadono dopo `JOB_PENDING_TTL_SECONDS`.
+
+Ogni job ha anche un log di eventi (`generation_job_events`): cambi di stato,
+posizione in coda, stage e tool call della skill. `iter_events` li segue in
+tempo reale per lo stream SSE: gli eventi del processo corrente arrivano
+subito tramite notifica in memoria, quelli scritti da altri worker uvicorn
+entro `JOB_EVENTS_POLL_SECONDS` (poll lento di ripiego, il database non
+viene riletto a ogni secondo).
+
+L'I/O SQLite non gira mai sul loop asyncio: le scritture (eventi, claim,
+esiti) passano da un unico thread dedicato, che ne preserva l'ordine, e le
+letture da `asyncio.to_thread`. Dal codice async si usano le varianti
+`aenqueue`, `aget_job`, `aemit_event`, `aupdate_result`; le callback sync
+chiamate dal loop usano `emit_event_nowait`.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, delete, exists, func, insert, literal, or_, select, update
+from sqlalchemy.orm import aliased
+
+from . import models
+from .database import SessionLocal
+from .logger import logger
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_RUNNING = int(os.getenv("JOB_MAX_RUNNING", "3"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "1"))
+# Riprese dopo lease scaduto, in aggiunta a max_attempts
+JOB_LEASE_RETRIES = int(os.getenv("JOB_LEASE_RETRIES", "1"))
+JOB_RETRY_BASE_SECONDS = int(os.getenv("JOB_RETRY_BASE_SECONDS", "30"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", str(24 * 3600)))
+JOB_PENDING_TTL_SECONDS = int(os.getenv("JOB_PENDING_TTL_SECONDS", str(6 * 3600)))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+# Ripiego per gli eventi scritti da altri processi: quelli locali arrivano via notifica
+JOB_EVENTS_POLL_SECONDS = float(os.getenv("JOB_EVENTS_POLL_SECONDS", "15"))
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+STATUS_BLOCKED = "blocked"
+ACTIVE_STATUSES = (STATUS_PENDING, STATUS_RUNNING)
+TERMINAL_STATUSES = (STATUS_DONE, STATUS_FAILED, STATUS_BLOCKED)
+
+Handler = Callable[[str, Dict[str, Any]], Awaitable[Optional[Dict[str, Any]]]]
+
+
+class PermanentJobError(Exception):
+    """Errore non ritentabile: il job termina con `status` e i campi `fields`."""
+
+    def __init__(self, status: str = STATUS_FAILED, **fields: Any) -> None:
+        super().__init__(fields.get("error") or fields.get("detail") or status)
+        self.status = status
+        self.fields = fields
+
+
+_handlers: Dict[str, Handler] = {}
+_worker_tasks: List[asyncio.Task] = []
+_wakeup: Optional[asyncio.Event] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+# job_id -> eventi asyncio dei client SSE in ascolto in questo processo
+_subscribers: Dict[str, Set[asyncio.Event]] = {}
+_worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+# Thread unico per le scritture SQLite: fuori dal loop e nello stesso ordine di chiamata
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-queue-db")
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _call_in_loop(callback: Callable[[], Any]) -> None:
+    """Esegue `callback` nel loop dei worker, anche se chiamato da un altro thread."""
+    try:
+        if asyncio.get_running_loop() is _loop:
+            callback()
+            return
+    except RuntimeError:
+        pass
+    if _loop is not None:
+        _loop.call_soon_threadsafe(callback)
+
+
+async def _write(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    return await asyncio.wrap_future(_writer.submit(fn, *args, **kwargs))
+
+
+def register_handler(kind: str, handler: Handler) -> None:
+    """Associa una coroutine `handler(job_id, params) -> result` a un tipo di job."""
+    _handlers[kind] = handler
+
+
+# ── API per gli endpoint ──────────────────────────────────────────────────
+
+def enqueue(
+    kind: str,
+    params: Dict[str, Any],
+    *,
+    dedup_key: Optional[str] = None,
+    creator: Optional[str] = None,
+    initial: Optional[Dict[str, Any]] = None,
+    max_attempts: Optional[int] = None,
+) -> Tuple[str, bool]:
+    """Accoda un job. Ritorna (job_id, created).
+
+    Con `dedup_key`, se esiste gia' un job attivo con la stessa chiave viene
+    ritornato quello (created=False) invece di crearne un secondo. Controllo
+    e inserimento sono un solo ``INSERT ... SELECT ... WHERE NOT EXISTS``:
+    due richieste concorrenti non possono creare due job attivi.
+    """
+    GJ = models.GenerationJob
+    db = SessionLocal()
+    try:
+        for _ in range(3):
+            now = _now()
+            job_id = str(uuid.uuid4())
+            values = {
+                "id": job_id,
+                "kind": kind,
+                "status": STATUS_PENDING,
+                "dedup_key": dedup_key,
+                "creator": creator,
+                "params": params,
+                "result": dict(initial or {}),
+                "attempts": 0,
+                "max_attempts": max_attempts or JOB_MAX_ATTEMPTS,
+                "next_run_at": now,
+                "created_at": now,
+            }
+            source = select(*[literal(value, type_=GJ.__table__.c[name].type) for name, value in values.items()])
+            active = None
+            if dedup_key:
+                active = and_(GJ.dedup_key == dedup_key, GJ.status.in_(ACTIVE_STATUSES))
+                source = source.where(~exists().where(active))
+            created = db.execute(insert(GJ).from_select(list(values), source)).rowcount
+            db.commit()
+            if created:
+                break
+            existing = db.execute(select(GJ.id).where(active)).scalar()
+            if existing:
+                return existing, False
+            # Il job attivo e' terminato tra INSERT e SELECT: si riprova
+        else:
+            raise RuntimeError(f"enqueue {kind}: impossibile accodare il job {dedup_key}")
+    finally:
+        db.close()
+    emit_event(job_id, "status", status=STATUS_PENDING)
+    _publish_positions()
+    if _wakeup is not None:
+        _call_in_loop(_wakeup.set)
+    return job_id, True
+
+
+async def aenqueue(kind: str, params: Dict[str, Any], **kwargs: Any) -> Tuple[str, bool]:
+    """`enqueue` fuori dal loop asyncio."""
+    return await _write(enqueue, kind, params, **kwargs)
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Stato del job nel formato di generation-status, None se inesistente/scaduto."""
+    db = SessionLocal()
+    try:
+        job = db.get(models.GenerationJob, job_id)
+        if job is None:
+            return None
+        return {**(job.result or {}), "status": job.status}
+    finally:
+        db.close()
+
+
+async def aget_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """`get_job` fuori dal loop asyncio."""
+    return await asyncio.to_thread(get_job, job_id)
+
+
+def active_job_ids(kind: str) -> Dict[str, str]:
+    """Job pending/running di un tipo, per chiave di deduplica (dedup_key -> id)."""
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(models.GenerationJob.dedup_key, models.GenerationJob.id).where(
+                models.GenerationJob.kind == kind,
+                models.GenerationJob.status.in_(ACTIVE_STATUSES),
+                models.GenerationJob.dedup_key.isnot(None),
+            )
+        )
+        return {dedup_key: job_id for dedup_key, job_id in rows}
+    finally:
+        db.close()
+
+
+def update_result(job_id: str, **fields: Any) -> None:
+    """Aggiunge campi al risultato visibile di un job (es. avanzamento)."""
+    db = SessionLocal()
+    try:
+        job = db.get(models.GenerationJob, job_id)
+        if job is None:
+            return
+        job.result = {**(job.result or {}), **fields}
+        db.commit()
+    finally:
+        db.close()
+
+
+async def aupdate_result(job_id: str, **fields: Any) -> None:
+    """`update_result` fuori dal loop asyncio."""
+    await _write(update_result, job_id, **fields)
+
+
+def update_result_nowait(job_id: str, **fields: Any) -> None:
+    """Accoda `update_result` al thread di scrittura senza attendere."""
+    _writer.submit(update_result, job_id, **fields)
+
+
+# ── eventi ────────────────────────────────────────────────────────────────
+
+def emit_event(job_id: str, event_type: str, **data: Any) -> None:
+    """Registra un evento del job e sveglia gli stream SSE in ascolto."""
+    db = SessionLocal()
+    try:
+        db.add(models.GenerationJobEvent(job_id=job_id, type=event_type, data=data, created_at=_now()))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.warning("[job_queue] evento {} non salvato per {}: {}", event_type, job_id, e)
+        return
+    finally:
+        db.close()
+    for waiter in list(_subscribers.get(job_id, ())):
+        _call_in_loop(waiter.set)
+
+
+async def aemit_event(job_id: str, event_type: str, **data: Any) -> None:
+    """`emit_event` fuori dal loop asyncio."""
+    await _write(emit_event, job_id, event_type, **data)
+
+
+def emit_event_nowait(job_id: str, event_type: str, **data: Any) -> None:
+    """Accoda `emit_event` al thread di scrittura senza attendere (callback sync nel loop)."""
+    _writer.submit(emit_event, job_id, event_type, **data)
+
+
+def events_since(job_id: str, after_id: int = 0) -> List[Dict[str, Any]]:
+    """Eventi del job con id > `after_id`, in ordine."""
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(models.GenerationJobEvent)
+            .where(models.GenerationJobEvent.job_id == job_id, models.GenerationJobEvent.id > after_id)
+            .order_by(models.GenerationJobEvent.id)
+        ).scalars()
+        return [{"id": row.id, "type": row.type, "data": row.data or {}} for row in rows]
+    finally:
+        db.close()
+
+
+async def iter_events(
+    job_id: str, last_event_id: int = 0, heartbeat_seconds: float = 15.0,
+) -> AsyncIterator[Optional[Dict[str, Any]]]:
+    """Segue gli eventi del job fino allo stato terminale.
+
+    Attende la notifica in memoria di `emit_event`; il database viene riletto
+    solo alla notifica o, per gli eventi scritti da altri worker uvicorn,
+    ogni `JOB_EVENTS_POLL_SECONDS`. Produce dict evento (id, type, data)
+    oppure None ogni `heartbeat_seconds` senza novita', per tenere viva la
+    connessione SSE.
+    """
+    waiter = asyncio.Event()
+    _subscribers.setdefault(job_id, set()).add(waiter)
+    loop = asyncio.get_running_loop()
+    idle_since = loop.time()
+    try:
+        while True:
+            waiter.clear()
+            events = await asyncio.to_thread(events_since, job_id, last_event_id)
+            for event in events:
+                last_event_id = event["id"]
+                yield event
+                if event["type"] == "status" and event["data"].get("status") in TERMINAL_STATUSES:
+                    return
+            if events:
+                idle_since = loop.time()
+            else:
+                job = await asyncio.to_thread(get_job, job_id)
+                if job is None:
+                    return
+                if job["status"] in TERMINAL_STATUSES:
+                    # Evento terminale gia' consumato o mai scritto: chiudiamo con lo stato attuale
+                    yield {"id": None, "type": "status", "data": job}
+                    return
+            # Si attende la notifica; senza, il database si rilegge solo col poll di ripiego
+            poll_at = loop.time() + JOB_EVENTS_POLL_SECONDS
+            while True:
+                timeout = min(poll_at, idle_since + heartbeat_seconds) - loop.time()
+                try:
+                    await asyncio.wait_for(waiter.wait(), timeout=max(timeout, 0.0))
+                    break
+                except asyncio.TimeoutError:
+                    pass
+                if loop.time() >= poll_at:
+                    break
+                idle_since = loop.time()
+                yield None
+    finally:
+        subscribers = _subscribers.get(job_id)
+        if subscribers is not None:
+            subscribers.discard(waiter)
+            if not subscribers:
+                _subscribers.pop(job_id, None)
+
+
+# ── coda ──────────────────────────────────────────────────────────────────
+
+def _publish_positions() -> None:
+    """Aggiorna `queue_position` dei job pending (ordine di `_claim`) e notifica i cambiamenti."""
+    GJ = models.GenerationJob
+    creator_key = func.coalesce(GJ.creator, "")
+    changed: List[Tuple[str, int]] = []
+    db = SessionLocal()
+    try:
+        pending = db.execute(
+            select(GJ).where(GJ.status == STATUS_PENDING).order_by(GJ.created_at)
+        ).scalars().all()
+        if not pending:
+            return
+        last_served = dict(db.execute(
+            select(creator_key, func.max(GJ.started_at)).group_by(creator_key)
+        ).all())
+        queues: "OrderedDict[str, List[models.GenerationJob]]" = OrderedDict()
+        for job in pending:
+            queues.setdefault(job.creator or "", []).append(job)
+        # Turno: prima i creator mai serviti, poi quelli serviti meno di recente
+        turn = sorted(queues, key=lambda c: (last_served.get(c) is not None, last_served.get(c) or datetime.min))
+        order: List[models.GenerationJob] = []
+        depth = 0
+        while len(order) < len(pending):
+            order.extend(queues[c][depth] for c in turn if depth < len(queues[c]))
+            depth += 1
+        for position, job in enumerate(order, 1):
+            if (job.result or {}).get("queue_position") != position:
+                job.result = {**(job.result or {}), "queue_position": position}
+                changed.append((job.id, position))
+        db.commit()
+    finally:
+        db.close()
+    for job_id, position in changed:
+        emit_event(job_id, "queue", position=position)
+
+
+# ── worker ────────────────────────────────────────────────────────────────
+
+def _claim() -> Optional[models.GenerationJob]:
+    """Prende il prossimo job pending se c'e' posto sotto JOB_MAX_RUNNING.
+
+    Un solo UPDATE condizionale: SQLite lo esegue sotto lock di scrittura,
+    quindi conteggio dei running e passaggio a running sono atomici anche
+    tra processi diversi. Il candidato e' il job pending piu' vecchio del
+    creator con l'avvio (`started_at`) meno recente; i creator mai serviti
+    vengono prima (NULL in testa).
+    """
+    GJ = models.GenerationJob
+    now = _now()
+    token = f"{_worker_id}:{uuid.uuid4().hex}"
+    running = (
+        select(func.count()).select_from(GJ)
+        .where(GJ.status == STATUS_RUNNING, GJ.lease_expires_at > now)
+        .scalar_subquery()
+    )
+    queued = aliased(GJ)
+    served = aliased(GJ)
+    last_served = (
+        select(func.max(served.started_at))
+        .where(func.coalesce(served.creator, "") == func.coalesce(queued.creator, ""))
+        .correlate(queued)
+        .scalar_subquery()
+    )
+    candidate = (
+        select(queued.id)
+        .where(queued.status == STATUS_PENDING, queued.kind.in_(list(_handlers)), queued.next_run_at <= now)
+        .order_by(last_served.asc().nulls_first(), queued.created_at)
+        .limit(1)
+        .scalar_subquery()
+    )
+    db = SessionLocal()
+    try:
+        claimed = db.execute(
+            update(GJ)
+            .where(GJ.id == candidate, GJ.status == STATUS_PENDING, running < JOB_MAX_RUNNING)
+            .values(
+                status=STATUS_RUNNING,
+                lease_owner=token,
+                lease_expires_at=now + timedelta(seconds=JOB_LEASE_SECONDS),
+                attempts=GJ.attempts + 1,
+                started_at=now,
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        if not claimed:
+            return None
+        job = db.execute(select(GJ).where(GJ.lease_owner == token)).scalar_one()
+        if (job.result or {}).get("queue_position"):
+            job.result = {**job.result, "queue_position": 0}
+            db.commit()
+            db.refresh(job)
+        db.expunge(job)
+    finally:
+        db.close()
+    emit_event(job.id, "status", status=STATUS_RUNNING, attempt=job.attempts)
+    _publish_positions()
+    return job
+
+
+def _renew_lease(job_id: str, token: str) -> None:
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(models.GenerationJob)
+            .where(models.GenerationJob.id == job_id, models.GenerationJob.lease_owner == token)
+            .values(lease_expires_at=_now() + timedelta(seconds=JOB_LEASE_SECONDS))
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _complete(job: models.GenerationJob, status: str, fields: Dict[str, Any]) -> None:
+    now = _now()
+    db = SessionLocal()
+    try:
+        row = db.get(models.GenerationJob, job.id)
+        if row is None or row.lease_owner != job.lease_owner:
+            # Lease perso (scaduto e ripreso da un altro worker): non sovrascriviamo
+            logger.warning("[job_queue] job {} non piu' di questo worker, esito scartato", job.id)
+            return
+        row.status = status
+        row.result = {**(row.result or {}), **fields}
+        row.finished_at = now
+        row.expires_at = now + timedelta(seconds=JOB_TTL_SECONDS)
+        row.lease_owner = None
+        row.lease_expires_at = None
+        db.commit()
+        final = {**row.result, "status": status}
+    finally:
+        db.close()
+    emit_event(job.id, "status", **final)
+
+
+def _retry_later(job: models.GenerationJob, error: str) -> None:
+    delay = JOB_RETRY_BASE_SECONDS * (2 ** max(job.attempts - 1, 0))
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(models.GenerationJob)
+            .where(models.GenerationJob.id == job.id, models.GenerationJob.lease_owner == job.lease_owner)
+            .values(
+                status=STATUS_PENDING,
+                next_run_at=_now() + timedelta(seconds=delay),
+                lease_owner=None,
+                lease_expires_at=None,
+            )
+        )
+        db.commit()
+    finally:
+        db.close()
+    emit_event(job.id, "status", status=STATUS_PENDING, retry_in=delay, error=error)
+    _publish_positions()
+    logger.warning("[job_queue] job {} tentativo {}/{} fallito ({}), retry tra {}s",
+                   job.id, job.attempts, job.max_attempts, error, delay)
+
+
+def _reap() -> None:
+    """Recupera lease scaduti, fa scadere i pending troppo vecchi e purga i job oltre TTL."""
+    GJ = models.GenerationJob
+    now = _now()
+    db = SessionLocal()
+    try:
+        lost = and_(GJ.status == STATUS_RUNNING, GJ.lease_expires_at < now)
+        db.execute(
+            update(GJ).where(lost, GJ.attempts < GJ.max_attempts + JOB_LEASE_RETRIES)
+            .values(status=STATUS_PENDING, next_run_at=now, lease_owner=None, lease_expires_at=None)
+        )
+        stale_pending = and_(
+            GJ.status == STATUS_PENDING,
+            GJ.created_at < now - timedelta(seconds=JOB_PENDING_TTL_SECONDS),
+        )
+        expired = []
+        for job in db.execute(select(GJ).where(or_(lost, stale_pending))).scalars():
+            job.status = STATUS_FAILED
+            job.result = {**(job.result or {}), "error": "Job scaduto (worker interrotto o coda troppo lunga)"}
+            job.finished_at = now
+            job.expires_at = now + timedelta(seconds=JOB_TTL_SECONDS)
+            job.lease_owner = None
+            job.lease_expires_at = None
+            expired.append((job.id, {**job.result, "status": STATUS_FAILED}))
+        db.execute(delete(GJ).where(GJ.expires_at < now))
+        db.execute(
+            delete(models.GenerationJobEvent)
+            .where(models.GenerationJobEvent.job_id.not_in(select(GJ.id)))
+        )
+        db.commit()
+    finally:
+        db.close()
+    for job_id, final in expired:
+        emit_event(job_id, "status", **final)
+    _publish_positions()
+
+
+async def _heartbeat(job_id: str, token: str) -> None:
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+        try:
+            await _write(_renew_lease, job_id, token)
+        except Exception as e:
+            logger.warning("[job_queue] rinnovo lease fallito per {}: {}", job_id, e)
+
+
+async def _execute(job: models.GenerationJob) -> None:
+    handler = _handlers[job.kind]
+    heartbeat = asyncio.create_task(_heartbeat(job.id, job.lease_owner))
+    logger.info("[job_queue] job {} ({}) avviato, tentativo {}/{}",
+                job.id, job.kind, job.attempts, job.max_attempts)
+    try:
+        result = await handler(job.id, job.params or {})
+        await _write(_complete, job, STATUS_DONE, result or {})
+        logger.info("[job_queue] job {} completato", job.id)
+    except PermanentJobError as e:
+        await _write(_complete, job, e.status, e.fields)
+        logger.info("[job_queue] job {} chiuso come {}: {}", job.id, e.status, e)
+    except Exception as e:
+        if job.attempts < job.max_attempts:
+            await _write(_retry_later, job, str(e))
+        else:
+            logger.exception("[job_queue] job {} fallito definitivamente: {}", job.id, e)
+            await _write(_complete, job, STATUS_FAILED, {"error": str(e)})
+    finally:
+        heartbeat.cancel()
+
+
+async def _worker_loop(n: int) -> None:
+    last_reap = 0.0
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            if n == 0 and loop.time() - last_reap >= JOB_POLL_SECONDS * 15:
+                await _write(_reap)
+                last_reap = loop.time()
+            job = await _write(_claim)
+            if job is not None:
+                await _execute(job)
+                continue
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception("[job_queue] errore nel worker {}: {}", n, e)
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=JOB_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+
+
+def start_workers() -> None:
+    """Avvia i worker nel loop corrente (da chiamare allo startup di FastAPI)."""
+    global _wakeup, _loop
+    if _worker_tasks:
+        return
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    for n in range(JOB_WORKERS):
+        _worker_tasks.append(asyncio.create_task(_worker_loop(n)))
+    logger.info("[job_queue] {} worker avviati (max running globale {}), id={}",
+                JOB_WORKERS, JOB_MAX_RUNNING, _worker_id)
+
+
+async def stop_workers() -> None:
+    """Ferma i worker; i job in corso restano running e verranno ripresi allo scadere del lease."""
+    for task in _worker_tasks:
+        task.cancel()
+    await asyncio.gather(*_worker_tasks, return_exceptions=True)
+    _worker_tasks.clear()
@@ -0,0 +1,633 @@
+"""Gateway LLM condiviso del backend (OpenAI, instructor, Anthropic).
+
+Gli endpoint `async def` (analyze_news, summarize_news, edit_news,
+generate_finetuning, generate_summary, job della skill) chiamavano i client
+sincroni `OpenAI`/`anthropic.Anthropic`: ogni completion bloccava l'intero
+event loop di uvicorn, compreso il polling di stato dei job. Le pipeline
+interpelli e selezione personale creavano un `anthropic.Anthropic` per ogni
+chiamata, nessuno rispettava il `retry-after` dei 429 e i token consumati
+non venivano contati.
+
+Qui:
+
+- client condivisi: `openai_client` / `instructor_client` /
+  `anthropic_client` per il codice che gira in thread, `openai_async` /
+  `instructor_async` / `anthropic_async` da usare con `await`. Un client
+  asincrono resta legato al loop su cui apre le connessioni, quindi ne viene
+  creato uno per event loop (di norma uno solo, quello di uvicorn);
+- chiamate gestite: `messages_create` (Anthropic), `chat_create`
+  (instructor, con o senza `response_model`), `responses_parse`, le
+  rispettive versioni asincrone `a*` e `aimages_generate`;
+- rate limit: per ogni modello due token bucket, richieste e token di input
+  al minuto (`LLM_RATE_LIMITS`, default per famiglia in `_DEFAULT_LIMITS`),
+  condivisi da thread e coroutine. Prima di ogni chiamata si prenota una
+  richiesta e la stima dei token del prompt; se i bucket sono vuoti si
+  attende invece di prendere un 429;
+- backoff adattivo: su 429 si rispetta `retry-after`, il modello va in
+  pausa per tutti i chiamanti e il ritmo scende a meta' (risale del 5% a
+  ogni chiamata riuscita); su 5xx/529/errori di rete backoff esponenziale
+  con jitter, fino a `LLM_MAX_RETRIES` tentativi. Un timeout costa gia'
+  `LLM_TIMEOUT` secondi e viene ritentato al massimo `LLM_TIMEOUT_RETRIES`
+  volte. Se la chiamata fallisce i token di input prenotati tornano nel
+  bucket. I retry interni degli SDK sono disattivati per non sommarsi a
+  questi;
+- prompt caching Anthropic: `cached_system` / `cached_text` marcano i
+  blocchi statici (system prompt, istruzioni fisse) con `cache_control`,
+  cosi' un batch di centinaia di item paga il prompt per intero solo alla
+  prima chiamata (poi lettura da cache a 1/10 del prezzo). Anthropic mette
+  in cache solo prefissi sopra una soglia minima di token per modello
+  (`_CACHE_MIN_TOKENS`: 1024 per Sonnet, 4096 per Opus 4 e Haiku 4): sotto
+  soglia la richiesta va a buon fine ma senza cache, viene segnalato una
+  volta nel log e nei totali la chiamata risulta non idonea
+  (`cache_eligible: false`) invece che un miss;
+- contabilita': token di input/output/cache e costo stimato
+  (`MODEL_PRICES`) vengono sommati nel contatore della pipeline corrente,
+  impostato con `with track("interpelli") as usage:` (contextvar, quindi
+  separato tra job concorrenti), con hit/miss della cache per le chiamate
+  che la richiedono con un prefisso sopra soglia. `usage_totals()` riporta i totali di processo per
+  pipeline.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import os
+import random
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+import anthropic
+import instructor
+import openai
+from openai import AsyncOpenAI, OpenAI
+
+from .logger import logger
+
+# Timeout (secondi) di una singola chiamata
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "600"))
+# Retry interni degli SDK: 0 perche' i retry li gestisce il gateway
+LLM_SDK_RETRIES = int(os.getenv("LLM_SDK_RETRIES", "0"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "6"))
+# Timeout ritentati (APITimeoutError e' una APIConnectionError, ma ogni tentativo dura LLM_TIMEOUT)
+LLM_TIMEOUT_RETRIES = int(os.getenv("LLM_TIMEOUT_RETRIES", "1"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "60"))
+# Quota dei limiti del provider effettivamente usata (margine per altri client)
+LLM_RATE_HEADROOM = float(os.getenv("LLM_RATE_HEADROOM", "0.9"))
+# "modello=richieste/token_input,..." al minuto, es. "claude-opus-4-7=50/30000,gpt-4o=500/30000"
+LLM_RATE_LIMITS = os.getenv("LLM_RATE_LIMITS", "")
+
+# Limiti di default per prefisso di modello: (richieste/min, token input/min)
+_DEFAULT_LIMITS = {
+    "claude": (50, 30_000),
+    "gpt": (500, 30_000),
+    "dall-e": (5, 1_000_000),
+}
+_FALLBACK_LIMITS = (50, 30_000)
+
+# USD per milione di token: (input, output, lettura cache, scrittura cache).
+# Vince il prefisso piu' lungo; aggiornare qui quando cambiano i listini.
+MODEL_PRICES = {
+    "claude-opus-4": (5.0, 25.0, 0.5, 6.25),
+    "claude-sonnet-4": (3.0, 15.0, 0.3, 3.75),
+    "claude-haiku-4": (1.0, 5.0, 0.1, 1.25),
+    "gpt-4o-mini": (0.15, 0.6, 0.075, 0.15),
+    "gpt-4o": (2.5, 10.0, 1.25, 2.5),
+    "gpt-4.1-mini": (0.4, 1.6, 0.1, 0.4),
+    "gpt-4.1": (2.0, 8.0, 0.5, 2.0),
+}
+
+# Soglia minima (token) del prefisso per il prompt caching Anthropic, per prefisso di modello
+_CACHE_MIN_TOKENS = {
+    "claude": 1024,
+    "claude-haiku-3": 2048,
+    "claude-haiku-4": 4096,
+    "claude-opus-4": 4096,
+}
+_CACHE_CONTROL = {"type": "ephemeral"}
+
+# ── client ───────────────────────────────────────────────────────────────
+
+_lock = threading.RLock()
+_sync_clients: dict = {}
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = weakref.WeakKeyDictionary()
+
+# Le chiavi si leggono alla creazione del client, dopo il load_dotenv dei moduli chiamanti.
+# instructor.patch modifica il client che riceve: "instructor" ha un'istanza OpenAI propria.
+_FACTORIES = {
+    "openai": lambda: OpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=LLM_TIMEOUT, max_retries=LLM_SDK_RETRIES),
+    "anthropic": lambda: anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"), timeout=LLM_TIMEOUT,
+                                             max_retries=LLM_SDK_RETRIES),
+}
+_FACTORIES["instructor"] = lambda: instructor.patch(_FACTORIES["openai"]())
+_ASYNC_FACTORIES = {
+    "openai": lambda: AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=LLM_TIMEOUT, max_retries=LLM_SDK_RETRIES),
+    "anthropic": lambda: anthropic.AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY"), timeout=LLM_TIMEOUT,
+                                                  max_retries=LLM_SDK_RETRIES),
+}
+_ASYNC_FACTORIES["instructor"] = lambda: instructor.patch(_ASYNC_FACTORIES["openai"]())
+
+
+def _sync(name: str):
+    client = _sync_clients.get(name)
+    if client is None:
+        with _lock:
+            client = _sync_clients.get(name)
+            if client is None:
+                client = _sync_clients[name] = _FACTORIES[name]()
+    return client
+
+
+def _async(name: str):
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(name)
+        if client is None:
+            client = clients[name] = _ASYNC_FACTORIES[name]()
+    return client
+
+
+def openai_client() -> OpenAI:
+    return _sync("openai")
+
+
+def instructor_client() -> OpenAI:
+    """Client OpenAI con `response_model` (instructor)."""
+    return _sync("instructor")
+
+
+def anthropic_client() -> anthropic.Anthropic:
+    return _sync("anthropic")
+
+
+def openai_async() -> AsyncOpenAI:
+    """AsyncOpenAI del loop corrente (da chiamare dentro una coroutine)."""
+    return _async("openai")
+
+
+def instructor_async() -> AsyncOpenAI:
+    """AsyncOpenAI con `response_model` (instructor) del loop corrente."""
+    return _async("instructor")
+
+
+def anthropic_async() -> anthropic.AsyncAnthropic:
+    """AsyncAnthropic del loop corrente."""
+    return _async("anthropic")
+
+
+# ── rate limit ───────────────────────────────────────────────────────────
+
+class _Bucket:
+    """Token bucket al minuto; il livello puo' andare in negativo (prenotazione)."""
+
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = max(per_minute, 1.0)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float, factor: float) -> None:
+        rate = self.capacity * factor / 60.0
+        self.level = min(self.capacity, self.level + (now - self.updated) * rate)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float, factor: float) -> float:
+        """Prenota `amount` e ritorna i secondi da attendere prima di usarli."""
+        self._refill(now, factor)
+        self.level -= amount
+        if self.level >= 0:
+            return 0.0
+        return -self.level / (self.capacity * factor / 60.0)
+
+    def refund(self, amount: float) -> None:
+        self.level = min(self.capacity, self.level + amount)
+
+
+class _ModelLimiter:
+    def __init__(self, model: str, requests_per_minute: float, tokens_per_minute: float) -> None:
+        self.model = model
+        self.requests = _Bucket(requests_per_minute * LLM_RATE_HEADROOM)
+        self.tokens = _Bucket(tokens_per_minute * LLM_RATE_HEADROOM)
+        # Frazione del ritmo nominale: dimezzata a ogni 429, risale con i successi
+        self.factor = 1.0
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            wait = max(self.requests.reserve(1, now, self.factor),
+                       self.tokens.reserve(tokens, now, self.factor))
+            return max(wait, self.paused_until - now)
+
+    def release(self, estimated: int) -> None:
+        """Restituisce i token prenotati da una chiamata fallita."""
+        with self._lock:
+            self.tokens.refund(estimated)
+
+    def settle(self, estimated: int, actual: Optional[int]) -> None:
+        """Corregge la prenotazione con i token effettivi e riaccelera."""
+        with self._lock:
+            if actual is not None:
+                self.tokens.refund(estimated - actual)
+            self.factor = min(1.0, self.factor + 0.05)
+
+    def throttle(self, delay: float) -> None:
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            self.factor = max(0.1, self.factor * 0.5)
+
+
+def _parse_rate_limits(spec: str) -> Dict[str, Tuple[float, float]]:
+    limits: Dict[str, Tuple[float, float]] = {}
+    for entry in spec.split(","):
+        if "=" not in entry:
+            continue
+        model, values = entry.split("=", 1)
+        try:
+            rpm, tpm = values.split("/", 1)
+            limits[model.strip()] = (float(rpm), float(tpm))
+        except ValueError:
+            logger.warning("[LLM] LLM_RATE_LIMITS: voce non valida {!r}", entry)
+    return limits
+
+
+_configured_limits = _parse_rate_limits(LLM_RATE_LIMITS)
+_limiters: Dict[str, _ModelLimiter] = {}
+
+
+def _by_prefix(table: dict, model: str):
+    matches = [prefix for prefix in table if model.startswith(prefix)]
+    return table[max(matches, key=len)] if matches else None
+
+
+def _limiter(model: str) -> _ModelLimiter:
+    limiter = _limiters.get(model)
+    if limiter is None:
+        with _lock:
+            limiter = _limiters.get(model)
+            if limiter is None:
+                rpm, tpm = (_configured_limits.get(model) or _by_prefix(_DEFAULT_LIMITS, model)
+                            or _FALLBACK_LIMITS)
+                limiter = _limiters[model] = _ModelLimiter(model, rpm, tpm)
+    return limiter
+
+
+def _blocks(content: Any) -> list:
+    """Contenuto di system/messaggio come lista di blocchi (una stringa e' un blocco solo)."""
+    if content is None:
+        return []
+    if isinstance(content, list):
+        return content
+    return [content]
+
+
+def _block_chars(block: Any) -> int:
+    if isinstance(block, dict):
+        return len(str(block.get("text", block.get("content", ""))))
+    return len(str(block))
+
+
+def _prompt_blocks(kwargs: dict) -> list:
+    """Blocchi del prompt nell'ordine in cui il provider li concatena."""
+    blocks = list(_blocks(kwargs.get("system")))
+    messages = kwargs.get("messages") or kwargs.get("input") or kwargs.get("prompt") or []
+    for message in _blocks(messages):
+        if isinstance(message, dict) and "role" in message:
+            blocks.extend(_blocks(message.get("content")))
+        else:
+            blocks.append(message)
+    return blocks
+
+
+def _estimate_tokens(kwargs: dict) -> int:
+    """Stima grezza dei token di input (~4 caratteri per token)."""
+    return sum(_block_chars(block) for block in _prompt_blocks(kwargs)) // 4 + 1
+
+
+def _cached_prefix_tokens(kwargs: dict) -> Optional[int]:
+    """Stima dei token fino all'ultimo blocco con `cache_control`, None se la cache non e' richiesta."""
+    chars, prefix = 0, None
+    for block in _prompt_blocks(kwargs):
+        chars += _block_chars(block)
+        if isinstance(block, dict) and "cache_control" in block:
+            prefix = chars
+    return prefix // 4 + 1 if prefix is not None else None
+
+
+def cache_requested(kwargs: dict) -> bool:
+    """True se i parametri della chiamata contengono blocchi con `cache_control`."""
+    return _cached_prefix_tokens(kwargs) is not None
+
+
+def cache_eligible(model: str, kwargs: dict) -> bool:
+    """True se il prefisso marcato con `cache_control` raggiunge la soglia minima del modello."""
+    prefix = _cached_prefix_tokens(kwargs)
+    return prefix is not None and prefix >= (_by_prefix(_CACHE_MIN_TOKENS, model) or 0)
+
+
+def cached_system(text: str) -> list:
+    """System prompt statico marcato per il prompt caching Anthropic."""
+    return [cached_text(text)]
+
+
+def cached_text(text: str) -> dict:
+    """Blocco di testo statico (es. istruzioni fisse nel messaggio utente) da mettere in cache."""
+    return {"type": "text", "text": text, "cache_control": dict(_CACHE_CONTROL)}
+
+
+_small_prefix_warned: set = set()
+
+
+def _check_cache_prefix(model: str, kwargs: dict) -> Tuple[bool, bool]:
+    """(cache richiesta, prefisso sopra soglia); avvisa se il prefisso e' sotto soglia."""
+    prefix = _cached_prefix_tokens(kwargs)
+    if prefix is None:
+        return False, False
+    minimum = _by_prefix(_CACHE_MIN_TOKENS, model) or 0
+    if prefix < minimum:
+        key = (model, prefix // 256)
+        if key not in _small_prefix_warned:
+            _small_prefix_warned.add(key)
+            logger.info("[LLM] {}: prefisso in cache di ~{} token sotto la soglia di {}, "
+                        "il provider non lo mettera' in cache", model, prefix, minimum)
+        return True, False
+    return True, True
+
+
+# ── retry ────────────────────────────────────────────────────────────────
+
+_CONNECTION_ERRORS = (anthropic.APIConnectionError, openai.APIConnectionError)
+_TIMEOUT_ERRORS = (anthropic.APITimeoutError, openai.APITimeoutError)
+_STATUS_ERRORS = (anthropic.APIStatusError, openai.APIStatusError)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def _retry_delay(error: Exception, attempt: int, timeouts: int = 0) -> Tuple[Optional[float], bool]:
+    """(secondi di attesa o None se non ritentabile, True se il provider chiede di rallentare).
+
+    `timeouts` sono i timeout gia' ritentati in questa chiamata.
+    """
+    backoff = min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)) * random.uniform(0.5, 1.0)
+    if isinstance(error, _TIMEOUT_ERRORS):
+        return (backoff if timeouts < LLM_TIMEOUT_RETRIES else None), False
+    if isinstance(error, _CONNECTION_ERRORS):
+        return backoff, False
+    if isinstance(error, _STATUS_ERRORS):
+        status = error.status_code
+        if status == 429:
+            return max(_retry_after(error) or 0.0, backoff), True
+        if status in (408, 409) or status >= 500:
+            # 529 = Anthropic overloaded
+            return max(_retry_after(error) or 0.0, backoff), status == 529
+    return None, False
+
+
+# ── contabilita' ─────────────────────────────────────────────────────────
+
+@dataclass
+class Usage:
+    """Token e costo stimato di un insieme di chiamate (thread-safe)."""
+
+    pipeline: str
+    calls: int = 0
+    retries: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_tokens: int = 0
+    cache_write_tokens: int = 0
+    # Chiamate con cache_control sopra soglia: lette dalla cache / non lette (scrittura)
+    cache_hits: int = 0
+    cache_misses: int = 0
+    # Chiamate con cache_control ma prefisso sotto la soglia del modello: mai in cache
+    cache_ineligible: int = 0
+    cost_usd: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add(self, model: str, input_tokens: int, output_tokens: int,
+            cache_read: int = 0, cache_write: int = 0, retries: int = 0,
+            cache_requested: bool = False, cache_eligible: bool = True,
+            cost_factor: float = 1.0) -> None:
+        price = _by_prefix(MODEL_PRICES, model)
+        cost = 0.0
+        if price:
+            cost = (input_tokens * price[0] + output_tokens * price[1]
+                    + cache_read * price[2] + cache_write * price[3]) / 1_000_000 * cost_factor
+        with self._lock:
+            self.calls += 1
+            self.retries += retries
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+            self.cache_read_tokens += cache_read
+            self.cache_write_tokens += cache_write
+            if cache_requested and not cache_eligible:
+                self.cache_ineligible += 1
+            elif cache_requested:
+                if cache_read:
+                    self.cache_hits += 1
+                else:
+                    self.cache_misses += 1
+            self.cost_usd += cost
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            cached = self.cache_hits + self.cache_misses
+            eligible = None
+            if cached or self.cache_ineligible:
+                # false: tutte le chiamate con cache_control avevano un prefisso sotto soglia
+                eligible = cached > 0
+            return {
+                "calls": self.calls,
+                "retries": self.retries,
+                "input_tokens": self.input_tokens,
+                "output_tokens": self.output_tokens,
+                "cache_read_tokens": self.cache_read_tokens,
+                "cache_write_tokens": self.cache_write_tokens,
+                "cache_hits": self.cache_hits,
+                "cache_misses": self.cache_misses,
+                "cache_ineligible": self.cache_ineligible,
+                "cache_eligible": eligible,
+                "cache_hit_rate": round(self.cache_hits / cached, 3) if cached else None,
+                "cost_usd": round(self.cost_usd, 4),
+            }
+
+
+_current_usage: contextvars.ContextVar[Optional[Usage]] = contextvars.ContextVar("llm_usage", default=None)
+_totals: Dict[str, Usage] = {}
+
+
+def _total(pipeline: str) -> Usage:
+    usage = _totals.get(pipeline)
+    if usage is None:
+        with _lock:
+            usage = _totals.setdefault(pipeline, Usage(pipeline))
+    return usage
+
+
+@contextmanager
+def track(pipeline: str) -> Iterator[Usage]:
+    """Conta token e costo delle chiamate fatte nel blocco (una run di pipeline)."""
+    usage = Usage(pipeline)
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+        logger.info("[LLM] {}: {}", pipeline, usage.as_dict())
+
+
+def usage_totals() -> Dict[str, Dict[str, Any]]:
+    """Totali di processo per pipeline (le chiamate fuori da `track` in "default")."""
+    return {name: usage.as_dict() for name, usage in list(_totals.items())}
+
+
+def _usage_numbers(result: Any) -> Optional[Tuple[int, int, int, int]]:
+    """(input non in cache, output, letti da cache, scritti in cache) dalla risposta."""
+    usage = getattr(result, "usage", None)
+    if usage is None:
+        # Modelli instructor: la risposta originale e' in _raw_response
+        usage = getattr(getattr(result, "_raw_response", None), "usage", None)
+    if usage is None:
+        return None
+    if hasattr(usage, "prompt_tokens"):
+        # Chat Completions: prompt_tokens comprende i token in cache
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", 0) or 0
+        return (usage.prompt_tokens or 0) - cached, usage.completion_tokens or 0, cached, 0
+    details = getattr(usage, "input_tokens_details", None)
+    if details is not None:
+        # Responses API: come sopra
+        cached = getattr(details, "cached_tokens", 0) or 0
+        return (usage.input_tokens or 0) - cached, usage.output_tokens or 0, cached, 0
+    # Anthropic: input_tokens esclude gia' i token letti/scritti in cache
+    return (getattr(usage, "input_tokens", 0) or 0, getattr(usage, "output_tokens", 0) or 0,
+            getattr(usage, "cache_read_input_tokens", 0) or 0,
+            getattr(usage, "cache_creation_input_tokens", 0) or 0)
+
+
+def record_usage(model: str, result: Any, retries: int = 0, cache_requested: bool = False,
+                 cache_eligible: bool = True, cost_factor: float = 1.0) -> None:
+    """Somma i token di una risposta al contatore corrente e ai totali di processo.
+
+    Usata anche per le risposte ottenute fuori dal gateway (es. Message Batches,
+    `cost_factor=0.5`).
+    """
+    numbers = _usage_numbers(result) or (0, 0, 0, 0)
+    current = _current_usage.get()
+    _total(current.pipeline if current else "default").add(
+        model, *numbers, retries=retries, cache_requested=cache_requested,
+        cache_eligible=cache_eligible, cost_factor=cost_factor)
+    if current is not None:
+        current.add(model, *numbers, retries=retries, cache_requested=cache_requested,
+                    cache_eligible=cache_eligible, cost_factor=cost_factor)
+
+
+def _record(model: str, estimated: int, result: Any, retries: int, cache: Tuple[bool, bool]) -> None:
+    numbers = _usage_numbers(result)
+    _limiter(model).settle(estimated, numbers[0] + numbers[3] if numbers else None)
+    record_usage(model, result, retries=retries, cache_requested=cache[0], cache_eligible=cache[1])
+
+
+# ── chiamate ─────────────────────────────────────────────────────────────
+
+def _run(model: str, kwargs: dict, invoke: Callable[[], Any]) -> Any:
+    limiter = _limiter(model)
+    estimated = _estimate_tokens(kwargs)
+    cache = _check_cache_prefix(model, kwargs)
+    timeouts = 0
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        wait = limiter.reserve(estimated)
+        if wait > 0:
+            time.sleep(wait)
+        try:
+            result = invoke()
+        except Exception as e:
+            limiter.release(estimated)
+            delay, slow_down = _retry_delay(e, attempt, timeouts)
+            if delay is None or attempt == LLM_MAX_RETRIES:
+                raise
+            if isinstance(e, _TIMEOUT_ERRORS):
+                timeouts += 1
+            if slow_down:
+                limiter.throttle(delay)
+            logger.warning("[LLM] {} tentativo {} fallito ({}), riprovo tra {:.1f}s",
+                           model, attempt + 1, e, delay)
+            time.sleep(delay)
+            continue
+        _record(model, estimated, result, attempt, cache)
+        return result
+
+
+async def _arun(model: str, kwargs: dict, invoke: Callable[[], Any]) -> Any:
+    limiter = _limiter(model)
+    estimated = _estimate_tokens(kwargs)
+    cache = _check_cache_prefix(model, kwargs)
+    timeouts = 0
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        wait = limiter.reserve(estimated)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        try:
+            result = await invoke()
+        except Exception as e:
+            limiter.release(estimated)
+            delay, slow_down = _retry_delay(e, attempt, timeouts)
+            if delay is None or attempt == LLM_MAX_RETRIES:
+                raise
+            if isinstance(e, _TIMEOUT_ERRORS):
+                timeouts += 1
+            if slow_down:
+                limiter.throttle(delay)
+            logger.warning("[LLM] {} tentativo {} fallito ({}), riprovo tra {:.1f}s",
+                           model, attempt + 1, e, delay)
+            await asyncio.sleep(delay)
+            continue
+        _record(model, estimated, result, attempt, cache)
+        return result
+
+
+def messages_create(**kwargs) -> Any:
+    """`messages.create` di Anthropic con rate limit, retry e contabilita'."""
+    return _run(kwargs["model"], kwargs, lambda: anthropic_client().messages.create(**kwargs))
+
+
+async def amessages_create(**kwargs) -> Any:
+    return await _arun(kwargs["model"], kwargs, lambda: anthropic_async().messages.create(**kwargs))
+
+
+def chat_create(**kwargs) -> Any:
+    """Chat Completions via instructor (`response_model` opzionale)."""
+    return _run(kwargs["model"], kwargs, lambda: instructor_client().chat.completions.create(**kwargs))
+
+
+async def achat_create(**kwargs) -> Any:
+    return await _arun(kwargs["model"], kwargs, lambda: instructor_async().chat.completions.create(**kwargs))
+
+
+def responses_parse(**kwargs) -> Any:
+    """Responses API con output strutturato (`text_format`)."""
+    return _run(kwargs["model"], kwargs, lambda: openai_client().responses.parse(**kwargs))
+
+
+async def aresponses_parse(**kwargs) -> Any:
+    return await _arun(kwargs["model"], kwargs, lambda: openai_async().responses.parse(**kwargs))
+
+
+async def aimages_generate(**kwargs) -> Any:
+    return await _arun(kwargs["model"], kwargs, lambda: openai_async().images.generate(**kwargs))
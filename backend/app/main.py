@@ -2,30 +2,27 @@ import os
 import asyncio
 from typing import List, Union, Optional
 import json
-import instructor
-from openai import OpenAI
-import anthropic
 from pydantic import BaseModel
 from dotenv import load_dotenv
-import requests
 from bs4 import BeautifulSoup
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import Body, FastAPI, HTTPException, Depends, Header
 import uvicorn
-from . import schemas, models, database, skill_runner, persona_runner
+from . import schemas, models, database, skill_runner, persona_runner, url_store, page_cache, interlink_index, interlink_scoring, job_queue, s3_storage, tts_cache, tts_text, image_probe, image_cache, image_candidates, http_client, llm_gateway
 from .database import engine, get_db, get_supabase_client
 from sqlalchemy.orm import Session
-from urllib.parse import urlparse, urljoin
+from urllib.parse import urlparse
 from fastapi.middleware.cors import CORSMiddleware
 from enum import Enum
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from requests.auth import HTTPBasicAuth
 from datetime import datetime, timedelta
 import pytz
 from .variables_edunews import *
 from .logger import logger
 from firecrawl import Firecrawl
-import boto3
+from collections import deque
 import math
+import threading
 import re
 
 class ExtractSchema(BaseModel):
@@ -40,13 +37,15 @@ class ExtractSchema(BaseModel):
 load_dotenv()
 
 models.Base.metadata.create_all(bind=engine)
+url_store.migrate_json_file('to_scrape.json')
 FIRECRAWL_API_KEY_EXTRACT = os.getenv("FIRECRAWL_API_KEY")
 FIRECRAWL_API_KEY = os.getenv("FIRECRAWL_API_KEY")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# URL elaborati in parallelo da /summarize_news (scrape -> summary -> categoria)
+SUMMARIZE_CONCURRENCY = int(os.getenv("SUMMARIZE_CONCURRENCY", "4"))
+# "combined": riassunto e categoria in una sola chiamata GPT-4o;
+# "separate": vecchio flusso summarize_news_content_via_openai + classify_category
+SUMMARIZE_CLASSIFY_MODE = os.getenv("SUMMARIZE_CLASSIFY_MODE", "combined").strip().lower()
 
-client = instructor.patch(OpenAI(api_key=OPENAI_API_KEY))
-client_openai = OpenAI(api_key=OPENAI_API_KEY)
-claude_client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
 app = FastAPI()
 firecrawl_app = Firecrawl(api_key=FIRECRAWL_API_KEY)
 firecrawl_app_extract = Firecrawl(api_key=FIRECRAWL_API_KEY_EXTRACT)
@@ -62,23 +61,20 @@ app.add_middleware(
 
 def filter_existing_links(all_links: List[str], db: Session) -> List[str]:
     """
-    Filter out links that already exist in database or to_scrape.json
+    Filter out links that are already tracked in the URL state store
     """
-    with open('to_scrape.json', 'r') as f:
-        to_scrape = json.load(f)
     logger.debug("all_links: {}", all_links)
-
-    filtered_links = []
-    for link in all_links:
-        if link not in to_scrape:
-            filtered_links.append(link)
-            
-    return filtered_links
+    if not all_links:
+        return []
+    known = url_store.known_urls(db, all_links)
+    return [link for link in all_links if link not in known]
 
 @app.post("/scrape_news")
 async def scrape_news(url: str, valid_prefix: str = None, db: Session = Depends(get_db)):
 
-    all_links: List[str] = get_links_from_url_via_firecrawl(url)
+    # Firecrawl e' bloccante: in un thread, cosi' le richieste concorrenti del
+    # sender (una per fonte) non si serializzano sull'event loop.
+    all_links: List[str] = await asyncio.to_thread(get_links_from_url_via_firecrawl, url)
     logger.debug("all_links: {}", all_links)
     filtered_links = filter_existing_links(all_links, db)
     #news_list: List[str] = get_news_links_from_all_links_via_openai(filtered_links, root_url)
@@ -90,7 +86,7 @@ async def scrape_news(url: str, valid_prefix: str = None, db: Session = Depends(
     news_list = news_list[:3]
 
     logger.debug("News list: {}", news_list)
-    insert_news_into_json(news_list, db)
+    insert_news_into_store(news_list, db)
 
     return {"news_links": news_list}
 
@@ -105,7 +101,7 @@ async def analyze_news(unpublished_news: schemas.LinkList, db: Session = Depends
 
         comparison_text: str = get_comparison_text(published_news, unpublished_news.links)
         logger.debug("Comparison text: {}", comparison_text)
-        events_to_publish: schemas.EventList = get_unpublished_events_via_openai(comparison_text)
+        events_to_publish: schemas.EventList = await get_unpublished_events_via_openai(comparison_text)
         #send_telegram_notifications([unpublished_events, events_to_publish_message])
         logger.debug("Events to publish: {}", events_to_publish)
         
@@ -121,11 +117,7 @@ async def analyze_news(unpublished_news: schemas.LinkList, db: Session = Depends
         simplified_selection = [group.links[0] for group in events_to_publish.events]
         logger.debug("Simplified selection: {}", simplified_selection)
         
-        to_scrape = read_to_scrape_file('to_scrape.json')
-        for link in simplified_selection:
-            to_scrape[link] = "to_summarize"
-        with open('to_scrape.json', 'w') as f:
-            json.dump(to_scrape, f, indent=2)
+        url_store.set_status(db, simplified_selection, url_store.STATUS_TO_SUMMARIZE)
 
         return {
             "all_news_analysis": events_to_publish,
@@ -139,48 +131,68 @@ async def analyze_news(unpublished_news: schemas.LinkList, db: Session = Depends
 
 @app.get("/summarize_news")
 async def summarize_news(db: Session = Depends(get_db)):
+    """Riassume in parallelo tutti gli URL in stato `to_summarize`.
+
+    Ogni URL e' un task indipendente (scrape -> summary -> categoria) e al
+    massimo SUMMARIZE_CONCURRENCY task girano insieme. Appena un URL finisce,
+    la riga `news` e il suo stato vengono committati nella stessa transazione:
+    se il processo muore a meta', la run successiva riprende solo gli URL
+    rimasti in `to_summarize`. Un errore su un URL non interrompe gli altri.
+    """
+    urls = url_store.urls_with_status(db, url_store.STATUS_TO_SUMMARIZE)
+    slots = asyncio.Semaphore(max(SUMMARIZE_CONCURRENCY, 1))
+    logger.info("Summarizing {} URLs (concurrency={})", len(urls), SUMMARIZE_CONCURRENCY)
+
+    async def _summarize_one(url: str):
+        async with slots:
+            try:
+                logger.info("Summarizing news from {}", url)
+                parsed_content = await asyncio.to_thread(get_news_from_link_via_firecrawl, url)
+                logger.debug("Parsed content length: {}", len(parsed_content) if parsed_content else 0)
+                combined = SUMMARIZE_CLASSIFY_MODE == "combined"
+                summarize = summarize_and_classify_news_via_openai if combined else summarize_news_content_via_openai
+                summary: schemas.News = await summarize(parsed_content)
+                logger.debug("Summary: {}", summary)
+                if summary is None:
+                    logger.warning("Skipping {} — scraping/summary failed", url)
+                    url_store.transition(db, url, url_store.STATUS_FAILED,
+                                         from_status=url_store.STATUS_TO_SUMMARIZE)
+                    return None
+                category = summary.category if combined else None
+                if category is None:
+                    category = await classify_category(summary)
+            except Exception as e:
+                # Lo stato resta `to_summarize`: l'URL verra' ritentato alla prossima run.
+                logger.error("Error summarizing {}: {}", url, e)
+                return None
+
+            id = store_summarized_news(db, url, summary, category=category)
+            if id is None:
+                return None
+            logger.info("Summarized news ID: {}", id)
+            return url, summary, id
+
+    with llm_gateway.track("summarize_news"):
+        results = await asyncio.gather(*(_summarize_one(url) for url in urls))
+
     summarized_news = []
     summarized_news_ids = []
     summarized_urls = []  # Track the URLs for each ID
-    to_scrape: List[dict] = read_to_scrape_file('to_scrape.json')
-
-    for url, status in to_scrape.items():
-        if status != "to_summarize":
+    for result in results:
+        if result is None:
             continue
-        try:
-            logger.info("Summarizing news from {}", url)
-            parsed_content = get_news_from_link_via_firecrawl(url)
-            logger.debug("Parsed content length: {}", len(parsed_content) if parsed_content else 0)
-            summary: schemas.News = summarize_news_content_via_openai(parsed_content)
-            logger.debug("Summary: {}", summary)
-            if summary is None:
-                logger.warning("Skipping {} — scraping/summary failed", url)
-                to_scrape[url] = "failed"
-                continue
-            summarized_news.append(summary)
-            id = store_summarized_news(db, url, summary)
-            logger.info("Summarized news ID: {}", id)
-            summarized_news_ids.append(id)
-            summarized_urls.append(url)  # Store the URL for this ID
-            logger.debug("Summarized news ID: {}, until now {}", id, summarized_news_ids)
-            to_scrape[url] = "summarized"
-            logger.debug("URL {} = {}", url, to_scrape[url])
-        except Exception as e:
-            return {"error": str(e)}
-        
-    update_to_scrape_file(to_scrape)
+        url, summary, id = result
+        summarized_news.append(summary)
+        summarized_news_ids.append(id)
+        summarized_urls.append(url)  # Store the URL for this ID
+    logger.info("Summarized {}/{} URLs", len(summarized_news_ids), len(urls))
+
     return {
         "summarized_news": summarized_news, 
         "summarized_news_IDs": summarized_news_ids,
         "summarized_urls": summarized_urls  # Return the URLs with their IDs
     }
 
-# Set di news_id attualmente in generazione (skill in background).
-# In-memory: si resetta al riavvio uvicorn (accettabile: la riga news resta con
-# is_published=False e riappare in "Da generare", l'utente puo' rilanciare).
-_generating_news_ids: set[int] = set()
-
-
 def _strip_em_dashes(value):
     """Rimuove l'em-dash (U+2014 `—`) dai contenuti generati dalla skill.
 
@@ -202,7 +214,32 @@ def _strip_em_dashes(value):
     return value
 
 
-def generate_seo_keywords(news_item: models.New) -> list[str]:
+async def _claude_seo_keywords(info: str) -> list[str]:
+    """10 keyword SEO da CLAUDE_KEYWORDS_PROMPT; solleva eccezione se la risposta non e' valida."""
+    response = await llm_gateway.amessages_create(
+        model=CLAUDE_MODEL,
+        max_tokens=1000,
+        messages=[{
+            "role": "user",
+            # Istruzioni fisse in cache, informazioni dell'articolo in un blocco a parte
+            "content": [
+                llm_gateway.cached_text(CLAUDE_KEYWORDS_PROMPT),
+                {"type": "text", "text": f"Informazioni:\n{info}"},
+            ],
+        }],
+    )
+    text = response.content[0].text.strip()
+    if "```" in text:
+        text = text.split("```")[1]
+        if text.startswith("json"):
+            text = text[4:]
+        text = text.strip()
+    data = json.loads(text)
+    tags = data.get("tags", []) or []
+    return [t for t in tags if isinstance(t, str) and t.strip()]
+
+
+async def generate_seo_keywords(news_item: models.New) -> list[str]:
     """Genera 10 keyword SEO via Claude (stesso prompt del vecchio flusso).
 
     Usato dal background task della skill per popolare il campo articles.tags
@@ -221,29 +258,13 @@ def generate_seo_keywords(news_item: models.New) -> list[str]:
             f"Luogo: {news_item.location}\n"
             f"Data pubblicazione: {news_item.published_date}"
         )
-        response = claude_client.messages.create(
-            model=CLAUDE_MODEL,
-            max_tokens=1000,
-            messages=[{
-                "role": "user",
-                "content": f"{CLAUDE_KEYWORDS_PROMPT}\n\nInformazioni:\n{news_info}",
-            }],
-        )
-        text = response.content[0].text.strip()
-        if "```" in text:
-            text = text.split("```")[1]
-            if text.startswith("json"):
-                text = text[4:]
-            text = text.strip()
-        data = json.loads(text)
-        tags = data.get("tags", []) or []
-        return [t for t in tags if isinstance(t, str) and t.strip()]
+        return await _claude_seo_keywords(news_info)
     except Exception as e:
         logger.warning("generate_seo_keywords fallita: {}", e)
         return []
 
 
-def _generate_seo_keywords_from_prompt(prompt: str, source_url: str = "") -> list[str]:
+async def _generate_seo_keywords_from_prompt(prompt: str, source_url: str = "") -> list[str]:
     """Genera 10 keyword dal prompt del modal, PRIMA di invocare la skill.
 
     Serve a dare a `find_related_articles` abbastanza tag da scorare
@@ -256,29 +277,13 @@ def _generate_seo_keywords_from_prompt(prompt: str, source_url: str = "") -> lis
         info = f"Argomento: {prompt}"
         if source_url:
             info += f"\nFonte URL: {source_url}"
-        response = claude_client.messages.create(
-            model=CLAUDE_MODEL,
-            max_tokens=1000,
-            messages=[{
-                "role": "user",
-                "content": f"{CLAUDE_KEYWORDS_PROMPT}\n\nInformazioni:\n{info}",
-            }],
-        )
-        text = response.content[0].text.strip()
-        if "```" in text:
-            text = text.split("```")[1]
-            if text.startswith("json"):
-                text = text[4:]
-            text = text.strip()
-        data = json.loads(text)
-        tags = data.get("tags", []) or []
-        return [t for t in tags if isinstance(t, str) and t.strip()]
+        return await _claude_seo_keywords(info)
     except Exception as e:
         logger.warning("_generate_seo_keywords_from_prompt fallita: {}", e)
         return []
 
 
-def _generate_seo_keywords_from_persona_payload(payload: dict) -> list[str]:
+async def _generate_seo_keywords_from_persona_payload(payload: dict) -> list[str]:
     """Variante di generate_seo_keywords che parte dal payload della skill persona.
 
     Usa meta_title, meta_description, keyword e angolo per dare a Claude
@@ -293,32 +298,16 @@ def _generate_seo_keywords_from_persona_payload(payload: dict) -> list[str]:
             f"Angolo: {payload.get('angolo') or ''}\n"
             f"Livello: {payload.get('livello') or ''}"
         )
-        response = claude_client.messages.create(
-            model=CLAUDE_MODEL,
-            max_tokens=1000,
-            messages=[{
-                "role": "user",
-                "content": f"{CLAUDE_KEYWORDS_PROMPT}\n\nInformazioni:\n{news_info}",
-            }],
-        )
-        text = response.content[0].text.strip()
-        if "```" in text:
-            text = text.split("```")[1]
-            if text.startswith("json"):
-                text = text[4:]
-            text = text.strip()
-        data = json.loads(text)
-        tags = data.get("tags", []) or []
-        return [t for t in tags if isinstance(t, str) and t.strip()]
+        return await _claude_seo_keywords(news_info)
     except Exception as e:
         logger.warning("_generate_seo_keywords_from_persona_payload fallita: {}", e)
         return []
 
 
-def _build_persona_keywords(payload: dict) -> list[str]:
+async def _build_persona_keywords(payload: dict) -> list[str]:
     """Keyword della skill come primo elemento + 10 tag SEO, dedup case-insensitive."""
     skill_keyword = (payload.get("keyword") or "").strip()
-    seo_tags = _generate_seo_keywords_from_persona_payload(payload)
+    seo_tags = await _generate_seo_keywords_from_persona_payload(payload)
     combined: list[str] = []
     seen: set[str] = set()
     for tag in ([skill_keyword] + seo_tags if skill_keyword else seo_tags):
@@ -333,7 +322,7 @@ def _build_persona_keywords(payload: dict) -> list[str]:
     return combined
 
 
-def _map_persona_payload_to_article(payload: dict) -> dict:
+async def _map_persona_payload_to_article(payload: dict) -> dict:
     """Mappa il payload della skill persona nel formato atteso dal frontend."""
     seo = payload.get("seo") or {}
     article_block = payload.get("article") or {}
@@ -342,7 +331,7 @@ def _map_persona_payload_to_article(payload: dict) -> dict:
         "title": seo.get("meta_title") or article_block.get("h1") or "",
         "excerpt": seo.get("meta_description") or "",
         "content": sections_to_markdown(sections),
-        "keywords": _build_persona_keywords(payload),
+        "keywords": await _build_persona_keywords(payload),
         "sourceUrl": payload.get("source_url") or "",
         "angolo": payload.get("angolo") or "",
         "livello": payload.get("livello") or "",
@@ -358,7 +347,7 @@ def _words_to_livello(total_words: int) -> str:
     return "evergreen"
 
 
-def _classify_article_category(title: str, content_markdown: str) -> tuple[str, str]:
+async def _classify_article_category(title: str, content_markdown: str) -> tuple[str, str]:
     """Classifica automaticamente un articolo generato dalla skill in una
     delle CategoryEnum, riusando lo stesso prompt del flusso news scraper.
 
@@ -369,7 +358,7 @@ def _classify_article_category(title: str, content_markdown: str) -> tuple[str,
         # Prendi i primi ~2000 char del content per non sforare il context
         excerpt = content_markdown.strip()[:2000]
         classification_text = f"Title: {title}\n\nContent:\n{excerpt}"
-        response = client.chat.completions.create(
+        response = await llm_gateway.achat_create(
             model=MODEL,
             messages=[
                 {"role": "system", "content": CLASSIFICATION_PROMPT},
@@ -390,19 +379,32 @@ def _classify_article_category(title: str, content_markdown: str) -> tuple[str,
         return "Scuola", "scuola"
 
 
-async def _run_skill_and_save_background(news_id: int) -> None:
-    """Task di background: esegue la skill e crea la bozza articles su Supabase.
+def _forward_skill_events(job_id: str):
+    """Callback `on_event` della skill: inoltra stage e tool call allo stream del job."""
+    def _forward(event: dict) -> None:
+        data = dict(event)
+        job_queue.emit_event_nowait(job_id, data.pop("type", "stage"), **data)
+    return _forward
+
+
+async def _run_skill_and_save_background(job_id: str, params: dict) -> dict:
+    """Job `skill` della job_queue: esegue la skill e crea la bozza articles su Supabase.
 
     Non bloccha la risposta HTTP del client: il frontend puo' navigare altrove
     mentre la skill (5-7 min) completa lato server. Al termine la riga news
     viene marcata is_published=True cosi' sparisce da "Da generare".
+    Le eccezioni non gestite fanno ritentare il job (vedi job_queue).
     """
+    news_id = params["news_id"]
     db = database.SessionLocal()
     try:
         news_item = db.query(models.New).filter(models.New.id == news_id).first()
         if news_item is None:
             logger.error("[bg] news {} non trovata", news_id)
-            return
+            raise job_queue.PermanentJobError(error=f"News {news_id} non trovata")
+        if news_item.is_published:
+            # Retry dopo un tentativo che aveva gia' salvato l'articolo
+            return {"news_id": news_id, "slug": news_item.proposed_slug}
 
         related = find_related_articles(
             news_item.title or "",
@@ -421,7 +423,13 @@ async def _run_skill_and_save_background(news_id: int) -> None:
             if a.get("category_slug") and a.get("slug")
         ]
 
-        payload = await skill_runner.generate_article_for_news(news_item, interlink_urls)
+        await job_queue.aemit_event(job_id, "stage", stage="interlinks_ready", interlinks=len(interlink_urls))
+
+        payload = await skill_runner.generate_article_for_news(
+            news_item, interlink_urls,
+            on_event=_forward_skill_events(job_id),
+        )
+        await job_queue.aemit_event(job_id, "stage", stage="saving")
         # Safety net: rimuovi em-dash dall'intero payload prima del mapping su articles.
         payload = _strip_em_dashes(payload)
 
@@ -438,7 +446,7 @@ async def _run_skill_and_save_background(news_id: int) -> None:
 
         # Tag: 10 keyword SEO via Claude (come prima della skill) + keyword
         # della skill come primo elemento (dedup case-insensitive).
-        seo_tags = generate_seo_keywords(news_item)
+        seo_tags = await generate_seo_keywords(news_item)
         combined_tags: list[str] = []
         if keyword:
             combined_tags.append(keyword)
@@ -485,7 +493,7 @@ async def _run_skill_and_save_background(news_id: int) -> None:
 
         if not result.data:
             logger.error("[bg] Supabase insert senza dati per news {}", news_id)
-            return
+            raise job_queue.PermanentJobError(error="Inserimento Supabase senza dati")
 
         inserted = result.data[0]
         news_item.is_published = True
@@ -495,39 +503,49 @@ async def _run_skill_and_save_background(news_id: int) -> None:
             "[bg] skill article salvato: news_id={}, article_id={}, slug={}",
             news_id, inserted.get("id"), inserted.get("slug"),
         )
-    except Exception as e:
-        logger.exception("[bg] generazione skill fallita per news {}: {}", news_id, e)
+        return {"news_id": news_id, "article_id": inserted.get("id"), "slug": inserted.get("slug")}
     finally:
-        _generating_news_ids.discard(news_id)
         db.close()
 
 
 @app.post("/api/news/reconstruct/{news_id}")
-async def reconstruct_specific_article(news_id: int, db: Session = Depends(get_db)):
+async def reconstruct_specific_article(
+    news_id: int,
+    payload: Optional[dict] = Body(None),
+    db: Session = Depends(get_db),
+):
     """Avvia in background la generazione via skill news-angle-rewriter.
 
     Risposta immediata 202 Accepted: la skill (5-7 min) gira in background
-    e il frontend puo' navigare altrove. L'avanzamento e' esposto dalla
-    lista pending-review tramite il campo `is_generating`.
+    e il frontend puo' navigare altrove. Il job vive nella job_queue
+    persistente: l'avanzamento e' esposto dalla lista pending-review tramite
+    il campo `is_generating` e da /api/articles/generation-status/{jobId}.
+    Il body opzionale `{"creator": ...}` identifica il redattore per l'equita'
+    della coda tra creator.
     """
     news_item: models.New = get_new_with_id(news_id, db)
     if news_item is None:
         raise HTTPException(status_code=404, detail="News item not found")
     if news_item.is_published:
         raise HTTPException(status_code=409, detail="Article already generated")
-    if news_id in _generating_news_ids:
+    creator = ((payload or {}).get("creator") or "").strip()
+    job_id, created = await job_queue.aenqueue(
+        "skill",
+        {"news_id": news_id, "creator": creator},
+        dedup_key=f"news:{news_id}",
+        creator=creator or None,
+        initial={"news_id": news_id, "started_at": datetime.now(ITALY_TZ).isoformat()},
+    )
+    if not created:
         return JSONResponse(
             status_code=202,
-            content={"status": "in_progress", "news_id": news_id},
+            content={"status": "in_progress", "news_id": news_id, "jobId": job_id},
         )
 
-    _generating_news_ids.add(news_id)
-    asyncio.create_task(_run_skill_and_save_background(news_id))
-
-    logger.info("reconstruct: avviata skill in background per news_id={}", news_id)
+    logger.info("reconstruct: accodata skill per news_id={} job={}", news_id, job_id)
     return JSONResponse(
         status_code=202,
-        content={"status": "accepted", "news_id": news_id},
+        content={"status": "accepted", "news_id": news_id, "jobId": job_id},
     )
 
 
@@ -538,13 +556,15 @@ async def get_pending_review_news(db: Session = Depends(get_db)):
     Il campo `is_generating` segnala che la skill e' attualmente in corso
     per quella news (background task avviato da reconstruct_specific_article),
     cosi' che il frontend possa disabilitare il link di modifica ed evitare
-    doppie generazioni.
+    doppie generazioni. `job_id` e' il job da seguire su
+    /api/articles/generation-events/{job_id} fino alla conclusione.
     """
     pending = db.query(models.New).filter(
         models.New.title.isnot(None),
         models.New.proposed_response.is_(None),
         models.New.is_published == False
     ).order_by(models.New.date_scraped.desc()).all()
+    generating = await asyncio.to_thread(job_queue.active_job_ids, "skill")
 
     return [{
         "id": n.id,
@@ -556,36 +576,30 @@ async def get_pending_review_news(db: Session = Depends(get_db)):
         "published_date": n.published_date,
         "date_scraped": str(n.date_scraped) if n.date_scraped else None,
         "url": n.url,
-        "is_generating": n.id in _generating_news_ids,
+        "is_generating": f"news:{n.id}" in generating,
+        "job_id": generating.get(f"news:{n.id}"),
     } for n in pending]
 
 
 # --- Persona skill: fire-and-forget + polling --------------------------------
-# Tracciamento job in-memory: key = job_id (uuid), value = stato. Sopravvive
-# solo al processo: se il server riparte i job attivi si perdono. In edit mode
-# questo significa che l'utente dovra' rigenerare; in create mode la bozza
-# potrebbe comunque essere stata scritta su Supabase prima del restart.
-_persona_jobs: dict[str, dict] = {}
-
-
-async def _run_persona_skill_background(
-    job_id: str,
-    *,
-    url: str,
-    livello: str,
-    tono: str,
-    persona: str,
-    target: str | None,
-    interlink_urls: list[str],
-    article_id: int | None,
-    creator: str,
-    source_url: str,
-) -> None:
-    """Task di background: esegue la skill persona, salva o prepara i dati
-    per il frontend, e aggiorna lo stato del job in `_persona_jobs`.
+# I job vivono nella job_queue persistente (tabella generation_jobs): lo stato
+# sopravvive ai riavvii ed e' condiviso tra i worker uvicorn.
+
+
+async def _run_persona_skill_background(job_id: str, params: dict) -> dict:
+    """Job `persona` della job_queue: esegue la skill persona, salva o prepara
+    i dati per il frontend e ritorna i campi esposti da generation-status.
     """
+    url = params["url"]
+    livello = params["livello"]
+    tono = params["tono"]
+    persona = params["persona"]
+    target = params.get("target")
+    interlink_urls = params.get("interlink_urls") or []
+    article_id = params.get("article_id")
+    creator = params.get("creator") or ""
+    source_url = params.get("source_url") or ""
     try:
-        _persona_jobs[job_id]["status"] = "running"
         skill_payload = await persona_runner.generate_article_with_persona(
             url=url,
             livello=livello,
@@ -593,7 +607,9 @@ async def _run_persona_skill_background(
             persona=persona,
             target=target,
             interlinks=interlink_urls,
+            on_event=_forward_skill_events(job_id),
         )
+        await job_queue.aemit_event(job_id, "stage", stage="saving")
         skill_payload = _strip_em_dashes(skill_payload)
 
         seo = skill_payload.get("seo") or {}
@@ -611,7 +627,7 @@ async def _run_persona_skill_background(
 
         # Classificazione automatica della categoria (stesso pattern del
         # flusso scraping news: GPT-4o + CLASSIFICATION_PROMPT + CategoryEnum).
-        category_name, final_category_slug = _classify_article_category(title, content_markdown)
+        category_name, final_category_slug = await _classify_article_category(title, content_markdown)
 
         proposed_slug, _ = generate_slugs(title, category_name)
         try:
@@ -620,7 +636,7 @@ async def _run_persona_skill_background(
             logger.warning("generate_summary fallita, continuo senza: {}", e)
             summary, title_summary = None, None
 
-        seo_tags = _generate_seo_keywords_from_persona_payload(skill_payload)
+        seo_tags = await _generate_seo_keywords_from_persona_payload(skill_payload)
         combined_tags: list[str] = []
         if keyword:
             combined_tags.append(keyword)
@@ -660,19 +676,17 @@ async def _run_persona_skill_background(
             # EDIT MODE: niente scrittura su Supabase. Il frontend popolera'
             # il form con base_fields+skill_fields; al click "Salva" l'update
             # endpoint persistera' tutto.
-            _persona_jobs[job_id].update({
-                "status": "done",
-                "mode": "edit",
-                "article": _map_persona_payload_to_article(skill_payload),
-                "skill_fields": skill_fields,
-                "base_fields": base_fields,
-                "articleId": article_id,
-            })
             logger.info(
                 "persona job {} [edit] done article_id={} livello={} keyword={!r}",
                 job_id, article_id, skill_payload.get("livello"), keyword,
             )
-            return
+            return {
+                "mode": "edit",
+                "article": await _map_persona_payload_to_article(skill_payload),
+                "skill_fields": skill_fields,
+                "base_fields": base_fields,
+                "articleId": article_id,
+            }
 
         # CREATE MODE: insert bozza su Supabase, ritorna supabaseId/slug.
         now_iso = datetime.now(ITALY_TZ).isoformat()
@@ -689,37 +703,29 @@ async def _run_persona_skill_background(
         supabase = get_supabase_client()
         result = supabase.table("articles").insert(article_row).execute()
         if not result.data:
-            _persona_jobs[job_id].update({
-                "status": "failed",
-                "error": "Inserimento Supabase senza dati",
-            })
-            return
+            raise job_queue.PermanentJobError(error="Inserimento Supabase senza dati")
         inserted = result.data[0]
-        _persona_jobs[job_id].update({
-            "status": "done",
-            "mode": "create",
-            "supabaseId": inserted.get("id"),
-            "slug": inserted.get("slug"),
-            "article": _map_persona_payload_to_article(skill_payload),
-            "skill_fields": skill_fields,
-            "base_fields": base_fields,
-        })
         logger.info(
             "persona job {} [create] done id={} slug={} livello={} keyword={!r}",
             job_id, inserted.get("id"), inserted.get("slug"),
             skill_payload.get("livello"), keyword,
         )
+        return {
+            "mode": "create",
+            "supabaseId": inserted.get("id"),
+            "slug": inserted.get("slug"),
+            "article": await _map_persona_payload_to_article(skill_payload),
+            "skill_fields": skill_fields,
+            "base_fields": base_fields,
+        }
 
     except ValueError as e:
-        _persona_jobs[job_id].update({"status": "failed", "error": str(e)})
         logger.warning("persona job {} fallito (ValueError): {}", job_id, e)
+        raise job_queue.PermanentJobError(job_queue.STATUS_FAILED, error=str(e))
     except RuntimeError as e:
         # STEP 1.5: combinazione tono+persona bloccata
-        _persona_jobs[job_id].update({"status": "blocked", "detail": str(e)})
         logger.info("persona job {} bloccato dallo STEP 1.5: {}", job_id, e)
-    except Exception as e:
-        logger.exception("persona job {} fallito: {}", job_id, e)
-        _persona_jobs[job_id].update({"status": "failed", "error": str(e)})
+        raise job_queue.PermanentJobError(job_queue.STATUS_BLOCKED, detail=str(e))
 
 
 @app.post("/api/articles/generate-with-persona")
@@ -730,7 +736,6 @@ async def generate_article_with_persona_endpoint(payload: dict):
     /api/articles/generation-status/{jobId} finche' lo stato non diventa
     done/failed/blocked. Evita timeout del reverse proxy.
     """
-    import uuid
     prompt = (payload.get("prompt") or "").strip()
     source_url = (payload.get("sourceUrl") or "").strip()
     tono = (payload.get("tone") or "Neutrale").strip() or "Neutrale"
@@ -754,7 +759,8 @@ async def generate_article_with_persona_endpoint(payload: dict):
     # `find_related_articles` puo' calcolare il 60% di score dal tag overlap
     # (che altrimenti sarebbe zero). Questa call Claude extra costa ~2-3s ed
     # e' determinante per ottenere interlink di qualita'.
-    prompt_tags = _generate_seo_keywords_from_prompt(prompt, source_url)
+    with llm_gateway.track("persona_pretags"):
+        prompt_tags = await _generate_seo_keywords_from_prompt(prompt, source_url)
     logger.info("persona pre-tags per interlink ({}): {}", len(prompt_tags), prompt_tags)
     related = find_related_articles(prompt or "", prompt_tags, "")
     site_base = os.getenv("PUBLIC_SITE_URL", "https://edunews24.it").rstrip("/")
@@ -770,24 +776,25 @@ async def generate_article_with_persona_endpoint(payload: dict):
     except (TypeError, ValueError):
         article_id = None
 
-    job_id = str(uuid.uuid4())
-    _persona_jobs[job_id] = {
-        "status": "pending",
-        "started_at": datetime.now(ITALY_TZ).isoformat(),
-        "mode": "edit" if article_id else "create",
-    }
-    asyncio.create_task(_run_persona_skill_background(
-        job_id,
-        url=url,
-        livello=livello,
-        tono=tono,
-        persona=persona,
-        target=target,
-        interlink_urls=interlink_urls,
-        article_id=article_id,
-        creator=creator,
-        source_url=source_url,
-    ))
+    job_id, _ = await job_queue.aenqueue(
+        "persona",
+        {
+            "url": url,
+            "livello": livello,
+            "tono": tono,
+            "persona": persona,
+            "target": target,
+            "interlink_urls": interlink_urls,
+            "article_id": article_id,
+            "creator": creator,
+            "source_url": source_url,
+        },
+        creator=creator or None,
+        initial={
+            "started_at": datetime.now(ITALY_TZ).isoformat(),
+            "mode": "edit" if article_id else "create",
+        },
+    )
     logger.info(
         "persona job {} avviato: mode={} article_id={} livello={} tono={} persona={}",
         job_id, "edit" if article_id else "create",
@@ -808,11 +815,73 @@ async def get_persona_job_status(job_id: str):
     `blocked`: include detail (messaggio STEP 1.5 per il giornalista)
     `failed`:  include error
     """
-    job = _persona_jobs.get(job_id)
+    job = await job_queue.aget_job(job_id)
     if job is None:
         raise HTTPException(status_code=404, detail="Job non trovato o scaduto")
     return job
 
+@app.get("/api/articles/generation-events/{job_id}")
+async def stream_generation_events(job_id: str, last_event_id: Optional[str] = Header(None)):
+    """Stream SSE degli eventi di un job di generazione (skill o persona).
+
+    Alternativa push al polling di generation-status: ogni evento e'
+    `event: <status|queue|stage|tool>` con `data` JSON. Lo stream si chiude
+    dopo l'evento `status` terminale (done/failed/blocked), il cui `data` ha
+    lo stesso formato di generation-status. Con l'header `Last-Event-ID`
+    un client che si riconnette riprende dagli eventi non ancora ricevuti.
+    """
+    if await job_queue.aget_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job non trovato o scaduto")
+    try:
+        resume_from = int(last_event_id or 0)
+    except ValueError:
+        resume_from = 0
+
+    async def _sse():
+        yield "retry: 3000\n\n"
+        async for event in job_queue.iter_events(job_id, resume_from):
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            id_line = f"id: {event['id']}\n" if event["id"] is not None else ""
+            data = json.dumps(event["data"], ensure_ascii=False, default=str)
+            yield f"{id_line}event: {event['type']}\ndata: {data}\n\n"
+
+    return StreamingResponse(
+        _sse(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/llm/usage")
+async def get_llm_usage():
+    """Totali LLM di processo per pipeline: token, costo stimato e hit/miss della prompt cache."""
+    return llm_gateway.usage_totals()
+
+
+def _tracked(pipeline: str, handler):
+    """Handler della job_queue con le chiamate LLM contate nella run `pipeline` (hit/miss della cache)."""
+    async def run(job_id: str, params: dict) -> dict:
+        with llm_gateway.track(pipeline):
+            return await handler(job_id, params)
+    return run
+
+
+job_queue.register_handler("skill", _tracked("skill", _run_skill_and_save_background))
+job_queue.register_handler("persona", _tracked("persona", _run_persona_skill_background))
+
+
+@app.on_event("startup")
+async def _start_job_workers():
+    job_queue.start_workers()
+
+
+@app.on_event("shutdown")
+async def _stop_job_workers():
+    await job_queue.stop_workers()
+
+
 @app.get("/api/news/{news_id}")
 async def get_news_detail(news_id: int, db: Session = Depends(get_db)):
     """Get a single news article by ID"""
@@ -847,251 +916,178 @@ from google.cloud import texttospeech
 _default_creds = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "google-credentials.json")
 os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = os.getenv("CREDENTIALS_GOOGLE_SPEECH", _default_creds)
 
-async def convert_text_to_audio(text: str, id: int):
-    """
-    Converts text to speech using Google Cloud Text-to-Speech API,
-    splitting the text into three parts, generating audio for each,
-    concatenating them, and uploading to S3.
-    
-    Args:
-        text (str): The text you want to convert into speech.
-        id (int): The ID to use for naming the output audio file.
-    """
-    id_str = str(id)
+# Chunk sintetizzati in parallelo (per processo, condiviso tra articoli)
+TTS_CONCURRENCY = int(os.getenv("TTS_CONCURRENCY", "4"))
+TTS_CHUNK_TIMEOUT = int(os.getenv("TTS_CHUNK_TIMEOUT", "90"))
 
-    client = texttospeech.TextToSpeechClient()
-
-    # Simple de-markdowning, corrected regex patterns and replacements
-    processed_text = re.sub(r'^#+\s*', '', text, flags=re.MULTILINE)
-    processed_text = re.sub(r'\*\*(.*?)\*\*', r'\1', processed_text)
-    processed_text = re.sub(r'__(.*?)__', r'\1', processed_text)
-    processed_text = re.sub(r'\*(.*?)\*', r'\1', processed_text)
-    processed_text = re.sub(r'_(.*?)_', r'\1', processed_text)
-    processed_text = re.sub(r'~~(.*?)~~', r'\1', processed_text)
-    processed_text = re.sub(r'`(.*?)`', r'\1', processed_text)
-    processed_text = re.sub(r'```[a-zA-Z]*\n(.*?)\n```', r'\1', processed_text, flags=re.DOTALL)
-    processed_text = re.sub(r'\[(.*?)\]\((.*?)\)', r'\1', processed_text)
-    processed_text = re.sub(r'!\[(.*?)\]\((.*?)\)', r'\1', processed_text)
-    processed_text = re.sub(r'^\*\s+', '', processed_text, flags=re.MULTILINE)
-    processed_text = re.sub(r'^-\s+', '', processed_text, flags=re.MULTILINE)
-    processed_text = re.sub(r'^\d+\.\s+', '', processed_text, flags=re.MULTILINE)
-    processed_text = re.sub(r'^-{3,}\s*$', '', processed_text, flags=re.MULTILINE)
-    processed_text = re.sub(r'^\*{3,}\s*$', '', processed_text, flags=re.MULTILINE)
-    processed_text = re.sub(r'^_{3,}\s*$', '', processed_text, flags=re.MULTILINE)
-    processed_text = re.sub(r'^>\s*', '', processed_text, flags=re.MULTILINE)
-
-    # Intelligent newline handling to create better sentence breaks for TTS
-    # 1. Consolidate multiple newlines (more than 2) into a double newline (paragraph-like separation)
-    processed_text = re.sub(r'\n{3,}', '\n\n', processed_text)
-    # 2. For remaining double newlines (paragraph breaks), replace with a period and two spaces if no punctuation.
-    processed_text = re.sub(r'(?<![.!?;:])\n\n', '.  ', processed_text) 
-    # 3. For single newlines, replace with a period and a space if no punctuation.
-    processed_text = re.sub(r'(?<![.!?;:])\n', '. ', processed_text)
-    # 4. Clean up: remove leading/trailing whitespace from lines that might have become empty.
-    processed_text = '\n'.join([line.strip() for line in processed_text.split('\n') if line.strip()])
-    # 5. Consolidate multiple spaces into a single space.
-    processed_text = re.sub(r'\s{2,}', ' ', processed_text).strip()
-    # 6. Ensure space after common punctuation if missing, to help TTS phrasing.
-    processed_text = re.sub(r'([.!?;:])(?=[^\s])', r'\1 ', processed_text)
-    # 7. Remove any space before punctuation
-    processed_text = re.sub(r'\s+([.!?;:])', r'\1', processed_text).strip()
-
-    full_text = processed_text
-
-    text_parts: list[str] = []
-    if not full_text: # Handle empty text case
-        # Or decide to return an error or a silent audio
-        s3_client = boto3.client(
-            's3',
-            region_name=os.getenv('AWS_REGION'),
-            aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-            aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-        )
-        file_key = f"audios/audio_{id_str}.mp3"
-        # Upload an empty or minimal MP3 file, or handle this case as an error
-        # For now, let's assume we upload an empty Body, which might be invalid for S3/MP3
-        # A better approach would be to have a pre-generated silent MP3 file.
-        await asyncio.to_thread(
-            s3_client.put_object,
-            Bucket=os.getenv('AWS_BUCKET_NAME'),
-            Key=file_key,
-            Body=b'',
-            ContentType='audio/mpeg'
-        )
-        s3_url = f"https://{os.getenv('AWS_BUCKET_NAME')}.s3.{os.getenv('AWS_REGION')}.amazonaws.com/{file_key}"
-        return s3_url
+TTS_VOICE = texttospeech.VoiceSelectionParams(
+    language_code="it-IT",
+    name="it-IT-Journey-O",
+    ssml_gender=texttospeech.SsmlVoiceGender.FEMALE
+)
+TTS_AUDIO_CONFIG = texttospeech.AudioConfig(
+    audio_encoding=texttospeech.AudioEncoding.MP3
+)
+TTS_VOICE_FINGERPRINT = tts_cache.fingerprint(TTS_VOICE, TTS_AUDIO_CONFIG)
 
+_tts_client = None
+_tts_client_lock = threading.Lock()
+_tts_semaphore = asyncio.Semaphore(TTS_CONCURRENCY)
 
-    # Split text into chunks that stay under 5000 bytes (Google TTS limit)
-    MAX_BYTES = 4800  # margine di sicurezza
-    remaining = full_text
-    while remaining:
-        end = len(remaining)
-        while len(remaining[:end].encode('utf-8')) > MAX_BYTES:
-            prev_end = end
-            # Try to cut at a sentence boundary
-            cut = remaining.rfind('. ', 0, end)
-            if cut > 0 and cut > end * 0.3:
-                end = cut + 1
-            else:
-                space_cut = remaining.rfind(' ', 0, end)
-                end = space_cut if space_cut > 0 else int(end * 0.8)
-            # Safety: force progress to avoid infinite loop
-            if end >= prev_end:
-                end = int(prev_end * 0.8)
-            if end <= 0:
-                end = 1
-                break
-        text_parts.append(remaining[:end])
-        remaining = remaining[end:].lstrip()
-
-    audio_contents: list[bytes] = []
-
-    for text_part in text_parts:
-        if not text_part.strip():  # Skip empty parts
-            continue
 
-        # 3️⃣ Set the input text
-        input_text_segment = texttospeech.SynthesisInput(text=text_part)
+def _get_tts_client() -> texttospeech.TextToSpeechClient:
+    """TextToSpeechClient condiviso: il canale gRPC e' thread-safe e riusabile."""
+    global _tts_client
+    if _tts_client is None:
+        with _tts_client_lock:
+            if _tts_client is None:
+                _tts_client = texttospeech.TextToSpeechClient()
+    return _tts_client
 
-        # 4️⃣ Select the voice parameters (using Neural2 voice)
-        voice = texttospeech.VoiceSelectionParams(
-            language_code="it-IT",
-            name="it-IT-Journey-O",
-            ssml_gender=texttospeech.SsmlVoiceGender.FEMALE
-        )
-
-        # 5️⃣ Select the audio configuration
-        audio_config = texttospeech.AudioConfig(
-            audio_encoding=texttospeech.AudioEncoding.MP3
-        )
 
-        # 6️⃣ Request text-to-speech conversion (90s timeout per chunk)
+async def _synthesize_chunk(text_part: str) -> bytes:
+    """Sintetizza un chunk (< 5000 byte) rispettando il limite TTS_CONCURRENCY."""
+    async with _tts_semaphore:
         logger.info("Sending request to Google Cloud Text-to-Speech API for part: '{}...'", text_part[:30])
         response = await asyncio.wait_for(
             asyncio.to_thread(
-                client.synthesize_speech,
-                input=input_text_segment,
-                voice=voice,
-                audio_config=audio_config
+                _get_tts_client().synthesize_speech,
+                input=texttospeech.SynthesisInput(text=text_part),
+                voice=TTS_VOICE,
+                audio_config=TTS_AUDIO_CONFIG
             ),
-            timeout=90
+            timeout=TTS_CHUNK_TIMEOUT
         )
-        if response.audio_content:
-            audio_contents.append(response.audio_content)
+    return response.audio_content or b""
 
-    # Concatenate audio buffers
-    combined_audio_buffer = b"".join(audio_contents)
 
+# Budget di un chunk: paragrafi interi accorpati fino a questa soglia (sotto i 5000 byte di Google TTS)
+TTS_CHUNK_BYTES = min(int(os.getenv("TTS_CHUNK_BYTES", "4500")), tts_text.MAX_CHUNK_BYTES)
 
-    # 6️⃣ Prepare to upload to S3
-    s3_client = boto3.client(
-        's3',
-        region_name=os.getenv('AWS_REGION'),
-        aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-        aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-    )
-    logger.debug("s3_client = {}", s3_client)
 
-    # Construct the file key (path inside the bucket)
-    file_key = f"audios/audio_{id_str}.mp3"
+def _join_tts_sentences(head: str, tail: str) -> str:
+    return f"{head} {tail}" if head[-1] in ".!?;:" else f"{head}. {tail}"
 
 
-    # 7️⃣ Upload to S3
-    await asyncio.to_thread(
-        s3_client.put_object,
-        Bucket=os.getenv('AWS_BUCKET_NAME'),
-        Key=file_key,
-        Body=combined_audio_buffer,
-        ContentType='audio/mpeg'
-    )
+def _tts_chunks(text: str) -> list[str]:
+    """Chunk di paragrafi interi accorpati fino a `TTS_CHUNK_BYTES`.
 
+    Ogni paragrafo del testo originale viene de-markdownato a parte e i
+    paragrafi consecutivi vengono uniti finche' stanno nel budget: le
+    richieste TTS (e le letture dei segmenti in cache) restano poche come
+    con il vecchio taglio a ~4.5 KB. I confini cadono sempre tra paragrafi,
+    quindi una revisione che non cambia molto la lunghezza dei paragrafi
+    invalida solo il chunk che li contiene. I paragrafi oltre il budget
+    vengono divisi con `tts_text.split`.
+    """
+    chunks: list[str] = []
+    current = ""
+    for paragraph in re.split(r'\n\s*\n', text):
+        cleaned = tts_text.clean(paragraph)
+        if not cleaned:
+            continue
+        if current:
+            merged = _join_tts_sentences(current, cleaned)
+            if len(merged.encode('utf-8')) <= TTS_CHUNK_BYTES:
+                current = merged
+                continue
+            chunks.append(current)
+        if len(cleaned.encode('utf-8')) <= TTS_CHUNK_BYTES:
+            current = cleaned
+        else:
+            chunks.extend(tts_text.split(cleaned, TTS_CHUNK_BYTES))
+            current = ""
+    if current:
+        chunks.append(current)
+    return chunks
 
-    # 8️⃣ Construct the S3 public URL (if your bucket policy allows public read)
-    s3_url = f"https://{os.getenv('AWS_BUCKET_NAME')}.s3.{os.getenv('AWS_REGION')}.amazonaws.com/{file_key}"
 
-    
+async def _chunk_audio(text_part: str) -> bytes:
+    """Segmento MP3 del chunk: dalla cache TTS se presente, altrimenti sintetizzato e salvato."""
+    digest = tts_cache.chunk_hash(TTS_VOICE_FINGERPRINT, text_part)
+    audio = await asyncio.to_thread(tts_cache.load_segment, digest)
+    if audio is not None:
+        logger.debug("[TTS] Segmento in cache per chunk '{}...'", text_part[:30])
+        return audio
+    audio = await _synthesize_chunk(text_part)
+    await asyncio.to_thread(tts_cache.store_segment, digest, audio)
+    return audio
 
-    return s3_url
-from PIL import Image
-from io import BytesIO
-import cloudscraper
-
-# Parole chiave da escludere nelle URL/alt delle immagini (loghi, icone, banner, tracking pixel)
-_IMAGE_BLACKLIST = {'logo', 'icon', 'favicon', 'sprite', 'avatar', 'badge', 'banner-ad',
-                    'tracking', 'pixel', 'spacer', 'arrow', 'button', 'spinner', 'loader',
-                    'emoji', 'share', 'social', 'facebook', 'twitter', 'whatsapp', 'linkedin',
-                    'pinterest', 'telegram', 'youtube', 'instagram', 'tiktok', 'cookie'}
-
-def _is_blacklisted(url: str, alt: str = "") -> bool:
-    """Controlla se un URL o alt text contiene parole da escludere."""
-    url_lower = url.lower()
-    alt_lower = alt.lower() if alt else ""
-    for word in _IMAGE_BLACKLIST:
-        if word in url_lower or word in alt_lower:
-            return True
-    # Escludi formati non fotografici
-    if url_lower.endswith('.svg') or url_lower.endswith('.gif') or url_lower.endswith('.ico'):
-        return True
-    # Escludi immagini encode base64
-    if url_lower.startswith('data:'):
-        return True
-    return False
-
-def _make_absolute_url(src: str, base_url: str) -> str:
-    """Converte URL relativo in assoluto."""
-    if not src:
-        return ""
-    if src.startswith('//'):
-        return 'https:' + src
-    if src.startswith('/') or not src.startswith('http'):
-        return urljoin(base_url, src)
-    return src
 
-def _get_image_dimensions(url: str, scraper) -> tuple:
+async def convert_text_to_audio(text: str, id: int):
     """
-    Scarica l'immagine e restituisce (width, height).
-    Usa stream per limitare il download a immagini ragionevoli.
-    Ritorna (0, 0) in caso di errore.
+    Converts text to speech using Google Cloud Text-to-Speech API,
+    splitting the text into chunks of whole paragraphs under the 5000-byte limit,
+    synthesizing them concurrently, concatenating them in order, and
+    uploading to S3.
+
+    Chunks already synthesized with the same voice settings are reused from
+    the TTS cache; if the article audio on S3 was generated from the same
+    text, nothing is synthesized or uploaded.
+
+    Args:
+        text (str): The text you want to convert into speech.
+        id (int): The ID to use for naming the output audio file.
     """
+    id_str = str(id)
+    file_key = f"audios/audio_{id_str}.mp3"
+    text_parts = _tts_chunks(text)
+
+    if not text_parts: # Handle empty text case
+        # Or decide to return an error or a silent audio
+        # Upload an empty or minimal MP3 file, or handle this case as an error
+        # For now, let's assume we upload an empty Body, which might be invalid for S3/MP3
+        # A better approach would be to have a pre-generated silent MP3 file.
+        return await asyncio.to_thread(s3_storage.put_bytes, file_key, b'', 'audio/mpeg')
+
+    digest = tts_cache.article_hash(
+        tts_cache.chunk_hash(TTS_VOICE_FINGERPRINT, part) for part in text_parts
+    )
+    if await asyncio.to_thread(tts_cache.stored_article_hash, file_key) == digest:
+        logger.info("[TTS] Audio {} gia' aggiornato (testo invariato), sintesi saltata", file_key)
+        return s3_storage.public_url(file_key)
+
+    # Chunk sintetizzati in parallelo (max TTS_CONCURRENCY) e inviati a S3 in
+    # ordine man mano che sono pronti: al massimo TTS_CONCURRENCY chunk in
+    # volo, l'upload di una parte si sovrappone alla sintesi delle successive.
+    writer = s3_storage.MultipartWriter(file_key, 'audio/mpeg', tts_cache.article_metadata(digest))
+    pending = iter(text_parts)
+    window: deque[asyncio.Task] = deque()
+
+    def _schedule_next() -> None:
+        part = next(pending, None)
+        if part is not None:
+            window.append(asyncio.create_task(_chunk_audio(part)))
+
+    for _ in range(TTS_CONCURRENCY):
+        _schedule_next()
     try:
-        resp = scraper.get(url, timeout=12, stream=True)
-        if resp.status_code != 200:
-            return (0, 0)
-        content_type = resp.headers.get('content-type', '')
-        if 'image' not in content_type and 'octet-stream' not in content_type:
-            return (0, 0)
-        # Limita il download a 10MB per sicurezza
-        content_length = resp.headers.get('content-length')
-        if content_length and int(content_length) > 10_000_000:
-            return (0, 0)
-        img_data = BytesIO(resp.content)
-        img = Image.open(img_data)
-        return img.size  # (width, height)
-    except Exception as e:
-        logger.debug("[IMG] Errore dimensioni per {}...: {}", url[:80], e)
-        return (0, 0)
-
-def _extract_srcset_candidates(img_tag, base_url: str) -> list:
-    """Estrae candidati dal srcset, ordinati per larghezza decrescente."""
-    candidates = []
-    srcset = img_tag.get('srcset', '')
-    if not srcset:
-        return candidates
-    for entry in srcset.split(','):
-        parts = entry.strip().split()
-        if len(parts) >= 2:
-            url = _make_absolute_url(parts[0], base_url)
-            descriptor = parts[1]
-            if descriptor.endswith('w'):
-                try:
-                    w = int(descriptor[:-1])
-                    candidates.append((url, w))
-                except ValueError:
-                    pass
-    # Ordina per larghezza decrescente (le piu grandi prima)
-    candidates.sort(key=lambda x: x[1], reverse=True)
-    return candidates
+        while window:
+            audio_content = await window.popleft()
+            _schedule_next()
+            await asyncio.to_thread(writer.write, audio_content)
+        s3_url = await asyncio.to_thread(writer.close)
+    except BaseException:
+        for task in window:
+            task.cancel()
+        await asyncio.to_thread(writer.abort)
+        raise
+
+    logger.debug("Audio {} caricato su S3: {} byte", file_key, writer.bytes_written)
+    # Segmenti orfani delle revisioni precedenti: pulizia periodica, non a ogni audio
+    await asyncio.to_thread(tts_cache.maybe_prune_segments)
+    return s3_url
+
+# Fasi di ricerca immagine: chiave -> (etichetta log, descrizione nel log di successo)
+_IMAGE_PHASES = {
+    'meta': ("META", "meta tag"),
+    'srcset': ("SRCSET", "srcset"),
+    'width_attr': ("WIDTH ATTR", "width attr"),
+    'priority_class': ("PRIORITY CLASS", "classe prioritaria"),
+    'scan': ("SCAN", "scan generale"),
+}
+_IMAGE_FALLBACK_PHASE = 'fallback_800'
+
 
 def find_best_image(source_url: str, min_width: int = 1200) -> str:
     """
@@ -1104,121 +1100,47 @@ def find_best_image(source_url: str, min_width: int = 1200) -> str:
       4. Tag <img> con classe/attributo che suggerisce immagine principale
       5. Tutte le <img> rimanenti — scarica e verifica dimensioni reali
 
+    I candidati di tutte le fasi vengono estratti con un solo passaggio sul
+    documento (image_candidates); le dimensioni vengono lette dagli header
+    delle immagini (image_probe), provando in parallelo i candidati di ogni
+    fase; ogni URL viene scaricato al massimo una volta per ricerca e le
+    dimensioni restano in image_cache per le ricerche successive. Le fasi che hanno gia' funzionato sullo
+    stesso dominio sorgente vengono provate per prime; i domini che non
+    hanno mai dato un'immagine utilizzabile vengono saltati per un periodo.
+
     Ritorna l'URL dell'immagine trovata o None.
     """
     logger.info("[IMAGE FINDER] Cercando immagine per: {}", source_url)
 
-    scraper = cloudscraper.create_scraper(
-        browser={'browser': 'chrome', 'platform': 'windows', 'mobile': False}
-    )
+    domain = image_cache.source_domain(source_url)
+    if image_cache.skip_domain(domain):
+        logger.info("[IMAGE FINDER] Dominio {} senza immagini utilizzabili nelle ultime ricerche, salto", domain)
+        return None
 
     try:
-        response = scraper.get(source_url, timeout=15)
+        response = page_cache.fetch_http(http_client.scraper(), source_url, timeout=15)
         if response.status_code != 200:
             logger.error("[IMAGE FINDER] Errore HTTP {}", response.status_code)
             return None
-        soup = BeautifulSoup(response.text, 'html.parser')
+        candidates = image_candidates.extract(response.text, source_url, min_width)
     except Exception as e:
         logger.error("[IMAGE FINDER] Errore fetch pagina: {}", e)
         return None
 
-    # ── FASE 1: Meta tag og:image e twitter:image ──────────────────────
-    meta_candidates = []
-    for attr_name, attr_key in [('property', 'og:image'), ('name', 'twitter:image')]:
-        tag = soup.find('meta', attrs={attr_name: attr_key})
-        if tag:
-            content = tag.get('content', '').strip()
-            if content:
-                url = _make_absolute_url(content, source_url)
-                if not _is_blacklisted(url):
-                    meta_candidates.append(url)
-
-    # Verifica dimensioni dei meta tag (spesso sono gia >= 1200px)
-    for url in meta_candidates:
-        w, h = _get_image_dimensions(url, scraper)
-        logger.debug("[META] {}... -> {}x{}", url[:80], w, h)
-        if w >= min_width:
-            logger.info("[IMAGE FINDER] Trovata via meta tag: {}x{}", w, h)
-            return url
-
-    # ── FASE 2: srcset con larghezza dichiarata >= min_width ───────────
-    srcset_urls = []
-    for img in soup.find_all('img'):
-        alt = img.get('alt', '')
-        candidates = _extract_srcset_candidates(img, source_url)
-        for url, declared_w in candidates:
-            if declared_w >= min_width and not _is_blacklisted(url, alt):
-                srcset_urls.append(url)
-
-    # Verifica dimensioni reali delle migliori candidate srcset
-    for url in srcset_urls[:5]:
-        w, h = _get_image_dimensions(url, scraper)
-        logger.debug("[SRCSET] {}... -> {}x{}", url[:80], w, h)
-        if w >= min_width:
-            logger.info("[IMAGE FINDER] Trovata via srcset: {}x{}", w, h)
-            return url
-
-    # ── FASE 3: <img> con attributo width >= min_width ─────────────────
-    for img in soup.find_all('img'):
-        width_attr = img.get('width', '')
-        try:
-            if int(str(width_attr).replace('px', '')) >= min_width:
-                src = img.get('src') or img.get('data-src') or img.get('data-lazy-src')
-                if src:
-                    url = _make_absolute_url(src, source_url)
-                    alt = img.get('alt', '')
-                    if not _is_blacklisted(url, alt):
-                        w, h = _get_image_dimensions(url, scraper)
-                        logger.debug("[WIDTH ATTR] {}... -> {}x{}", url[:80], w, h)
-                        if w >= min_width:
-                            logger.info("[IMAGE FINDER] Trovata via width attr: {}x{}", w, h)
-                            return url
-        except (ValueError, TypeError):
-            pass
-
-    # ── FASE 4: <img> con classi/attributi che suggeriscono immagine principale ─
-    priority_patterns = ['featured', 'hero', 'main-image', 'article-image', 'post-image',
-                         'cover', 'thumb-big', 'image-full', 'wp-post-image', 'detail',
-                         'foto_large', 'img_articolo', 'image-principale']
-
-    for img in soup.find_all('img'):
-        img_str = str(img).lower()
-        for pattern in priority_patterns:
-            if pattern in img_str:
-                src = img.get('src') or img.get('data-src') or img.get('data-lazy-src')
-                if src:
-                    url = _make_absolute_url(src, source_url)
-                    alt = img.get('alt', '')
-                    if not _is_blacklisted(url, alt):
-                        w, h = _get_image_dimensions(url, scraper)
-                        logger.debug("[PRIORITY CLASS] {}... -> {}x{}", url[:80], w, h)
-                        if w >= min_width:
-                            logger.info("[IMAGE FINDER] Trovata via classe prioritaria: {}x{}", w, h)
-                            return url
-                break  # Una volta trovato il pattern, passa alla prossima img
-
-    # ── FASE 5: Scan tutte le <img> rimanenti ─────────────────────────
-    # Raccoglie tutte le immagini non ancora testate e verifica le dimensioni
-    all_img_urls = []
-    tested_urls = set(meta_candidates + srcset_urls)
-
-    for img in soup.find_all('img'):
-        for attr in ['src', 'data-src', 'data-lazy-src', 'data-original', 'data-full-url']:
-            src = img.get(attr)
-            if src:
-                url = _make_absolute_url(src, source_url)
-                alt = img.get('alt', '')
-                if url not in tested_urls and not _is_blacklisted(url, alt):
-                    all_img_urls.append(url)
-                    tested_urls.add(url)
-
-    # Testa al massimo 10 immagini rimanenti
-    for url in all_img_urls[:10]:
-        w, h = _get_image_dimensions(url, scraper)
-        logger.debug("[SCAN] {}... -> {}x{}", url[:80], w, h)
-        if w >= min_width:
-            logger.info("[IMAGE FINDER] Trovata via scan generale: {}x{}", w, h)
-            return url
+    with image_probe.ImageProber() as prober:
+        url, phase = _find_best_image_in_page(candidates, min_width, prober, domain)
+    image_cache.record_search(domain, phase)
+    return url
+
+
+def _find_best_image_in_page(candidates: dict, min_width: int, prober, domain: str) -> tuple:
+    """(url, fase vincente) oppure (None, None)."""
+    for phase in image_cache.phase_order(domain, image_candidates.PHASES):
+        label, description = _IMAGE_PHASES[phase]
+        found = prober.first_at_least(candidates[phase], min_width, label)
+        if found:
+            logger.info("[IMAGE FINDER] Trovata via {}: {}x{}", description, found[1].width, found[1].height)
+            return found[0], phase
 
     # ── FASE 6: Fallback — rilassa il vincolo a 800px ──────────────────
     # Se non troviamo nulla >= 1200px, proviamo con un minimo di 800px
@@ -1226,25 +1148,19 @@ def find_best_image(source_url: str, min_width: int = 1200) -> str:
     best_url = None
     best_width = 0
 
-    # Ricontrolla i meta tag e le immagini gia scaricate con soglia ridotta
-    for url in meta_candidates:
-        w, h = _get_image_dimensions(url, scraper)
-        if w >= 800 and w > best_width:
+    # Ricontrolla i meta tag e le immagini gia provate con soglia ridotta:
+    # le dimensioni sono gia' in memoria, nessun nuovo download
+    for url, info in prober.probe_many(candidates['meta'] + candidates['scan']):
+        if info.width >= 800 and info.width > best_width:
             best_url = url
-            best_width = w
-
-    for url in all_img_urls[:10]:
-        w, h = _get_image_dimensions(url, scraper)
-        if w >= 800 and w > best_width:
-            best_url = url
-            best_width = w
+            best_width = info.width
 
     if best_url:
         logger.info("[IMAGE FINDER] Fallback a {}px: {}...", best_width, best_url[:80])
-        return best_url
+        return best_url, _IMAGE_FALLBACK_PHASE
 
     logger.info("[IMAGE FINDER] Nessuna immagine adatta trovata")
-    return None
+    return None, None
 
 
 async def generate_article_image(title: str, category: str, tags: list = None, summary: str = None) -> str:
@@ -1266,7 +1182,7 @@ async def generate_article_image(title: str, category: str, tags: list = None, s
     )
 
     logger.info("[DALL-E] Generating image for: {}...", title[:60])
-    response = client_openai.images.generate(
+    response = await llm_gateway.aimages_generate(
         model="dall-e-3",
         prompt=dalle_prompt,
         size="1792x1024",
@@ -1295,7 +1211,7 @@ async def upload_dalle_to_s3(dalle_url: str, title: str) -> str:
     }
 
     logger.info("[S3 UPLOAD] Uploading DALL-E image to S3 via {}...", upload_url)
-    resp = requests.post(upload_url, headers=headers, json=payload, timeout=60)
+    resp = http_client.post(upload_url, headers=headers, json=payload, timeout=60)
 
     if resp.status_code == 200:
         data = resp.json()
@@ -1317,7 +1233,7 @@ async def generate_and_save_audio(article_id: int, text: str):
             }
             update_url = f"{os.getenv('FRONTEND_URL', 'http://localhost:4321')}/api/articles/{article_id}"
             response = await asyncio.to_thread(
-                requests.put, update_url, headers=headers, json={"audio_url": audio_url}
+                http_client.put, update_url, headers=headers, json={"audio_url": audio_url}
             )
             if response.status_code == 200:
                 logger.info("[TTS] Audio salvato per articolo {}: {}", article_id, audio_url)
@@ -1415,7 +1331,7 @@ async def publish_to_cms(news_id: int, db: Session = Depends(get_db)):
             "Authorization": f"Bearer {os.getenv('API_SECRET_KEY')}"
         }
 
-        response = requests.post(CMS_API_URL, headers=headers, json=article_data)
+        response = http_client.post(CMS_API_URL, headers=headers, json=article_data)
         logger.debug("response = {}", response)
         if response.status_code == 200:
             # Update local database with published status
@@ -1550,7 +1466,7 @@ def sections_to_markdown(sections) -> str:
 
 def get_content_and_root_url(url: str):
     try:
-        response = requests.get(url)
+        response = http_client.get(url)
         content = response.text
         parsed_url = urlparse(url)
         root_url = f"{parsed_url.scheme}://{parsed_url.netloc}"
@@ -1566,7 +1482,7 @@ def get_news_links_from_all_links_via_openai(all_links: List[str], root_url: str
         return None
     
     try:
-        news_list = client.chat.completions.create(
+        news_list = llm_gateway.chat_create(
                 model=MODEL,
                 messages=[
                     {"role": "system", "content": f"{SCRAPPING_URLS_PROMPT}"},
@@ -1580,41 +1496,18 @@ def get_news_links_from_all_links_via_openai(all_links: List[str], root_url: str
         return None
     return final_news
 
-def insert_news_into_json(news_list: List[str], db: Session = Depends(get_db)):
+def insert_news_into_store(news_list: List[str], db: Session = Depends(get_db)):
     if news_list is None:
         return None
-    with open('to_scrape.json', 'r') as f:
-        to_scrape = json.load(f)
-
-    for new in news_list:
 
-        existing_news = db.query(models.New).filter(models.New.url == new).first()
-
-        if existing_news:
-            logger.info("Skipping {}, already in database", new)
-            continue
-        if new not in to_scrape:
-            to_scrape[new] = ""
-        else:
-            logger.info("Skipping {}, already in database", new)
-    
-    with open('to_scrape.json', 'w') as f:
-        json.dump(to_scrape, f, indent=2)
+    already_stored = {
+        row.url
+        for row in db.query(models.New.url).filter(models.New.url.in_(news_list)).all()
+    }
+    for new in already_stored:
+        logger.info("Skipping {}, already in database", new)
 
-
-def read_to_scrape_file(file_path: str) -> dict:
-    """
-    Reads the `to_scrape.json` file and returns its contents as a dictionary.
-    """
-    with open(file_path, 'r') as f:
-        return json.load(f)
-
-def update_to_scrape_file(to_scrape: dict, file_path: str = 'to_scrape.json') -> None:
-    """
-    Updates the `to_scrape.json` file with the provided dictionary.
-    """
-    with open(file_path, 'w') as f:
-        json.dump(to_scrape, f, indent=2)
+    url_store.add_urls(db, [new for new in news_list if new not in already_stored])
 
 def _scrape_via_firecrawl(link: str, **scrape_kwargs) -> Optional[str]:
     """Single Firecrawl scrape attempt. Returns markdown string or None."""
@@ -1644,17 +1537,14 @@ def _scrape_via_firecrawl(link: str, **scrape_kwargs) -> Optional[str]:
                        link, scrape_kwargs, len(markdown or ''))
         return None
 
+    page_cache.put(link, page_cache.VARIANT_FIRECRAWL_MARKDOWN, markdown)
     return markdown
 
 
 def _scrape_via_cloudscraper(link: str) -> Optional[str]:
     """Fallback scraper using cloudscraper + BeautifulSoup. Returns plain text or None."""
     try:
-        import cloudscraper
-        scraper = cloudscraper.create_scraper(
-            browser={'browser': 'chrome', 'platform': 'windows', 'mobile': False}
-        )
-        response = scraper.get(link, timeout=(15, 45))
+        response = page_cache.fetch_http(http_client.scraper(), link, timeout=(15, 45))
         if response.status_code != 200:
             logger.warning("Cloudscraper HTTP {} for {}", response.status_code, link)
             return None
@@ -1682,6 +1572,11 @@ def get_news_from_link_via_firecrawl(link: str) -> Optional[str]:
     """
     logger.info("Scraping URL: {}", link)
 
+    cached = page_cache.get(link, page_cache.VARIANT_FIRECRAWL_MARKDOWN)
+    if cached:
+        logger.debug("Page cache hit: {} chars from {}", len(cached), link)
+        return cached
+
     firecrawl_attempts = [
         {"proxy": "stealth", "timeout": 30000},
         {"proxy": "auto", "wait_for": 2000, "timeout": 30000},
@@ -1703,11 +1598,18 @@ def get_news_from_link_via_firecrawl(link: str) -> Optional[str]:
     return None
 
 def get_links_from_url_via_firecrawl(link: str) -> List[str]:
-    try:
+    def _fetch_links() -> Optional[str]:
         scrape_result = firecrawl_app.scrape(link, formats=['links'])
         logger.debug("Scrape result: {}", scrape_result)
         # Extract links from the response object
         links = scrape_result.links if hasattr(scrape_result, 'links') else []
+        return json.dumps(links or [])
+
+    try:
+        # Index pages change often: short TTL, just enough to dedupe repeated runs
+        links = json.loads(page_cache.get_or_fetch(
+            link, page_cache.VARIANT_FIRECRAWL_LINKS, _fetch_links, ttl=page_cache.PAGE_CACHE_LINKS_TTL,
+        ))
         logger.debug("Extracted links: {}", links)
         return links
     except Exception as e:
@@ -1715,7 +1617,7 @@ def get_links_from_url_via_firecrawl(link: str) -> List[str]:
         return None
 
     
-def summarize_news_content_via_openai(parsed_content: str) -> schemas.News:
+async def summarize_news_content_via_openai(parsed_content: str) -> schemas.News:
     """
     Summarizes the given content using OpenAI's chat model.
     """
@@ -1724,7 +1626,7 @@ def summarize_news_content_via_openai(parsed_content: str) -> schemas.News:
         logger.warning("Skipping OpenAI summary: empty/short parsed_content")
         return None
     try:
-        summary = client.chat.completions.create(
+        summary = await llm_gateway.achat_create(
             model=MODEL,
             messages=[
                 {"role": "system", "content": f"{SUMMARIZING_PROMPT}"},
@@ -1737,17 +1639,45 @@ def summarize_news_content_via_openai(parsed_content: str) -> schemas.News:
         logger.error("Error summarizing content: {}", e)
         return None
 
-def store_summarized_news(db: Session, url: str, summary: schemas.News) -> int:
+async def summarize_and_classify_news_via_openai(parsed_content: str) -> Optional[schemas.NewsWithCategory]:
+    """
+    Summarizes the content and classifies its category in a single OpenAI call.
+
+    Same output as summarize_news_content_via_openai followed by
+    classify_category, with half the round trips and tokens.
+    """
+
+    if not parsed_content or (isinstance(parsed_content, str) and len(parsed_content.strip()) < 100):
+        logger.warning("Skipping OpenAI summary: empty/short parsed_content")
+        return None
+    try:
+        summary = await llm_gateway.achat_create(
+            model=MODEL,
+            messages=[
+                {"role": "system", "content": f"{SUMMARIZING_AND_CLASSIFICATION_PROMPT}"},
+                {"role": "user", "content": f"News: {parsed_content}"},
+            ],
+            response_model=schemas.NewsWithCategory,
+        )
+        return summary
+    except Exception as e:
+        logger.error("Error summarizing and classifying content: {}", e)
+        return None
+
+def store_summarized_news(db: Session, url: str, summary: schemas.News, category: CategoryEnum = None) -> int:
     """
     Stores the summarized news in the database and returns the id of the created article.
+
+    The news row and the URL transition to `summarized` are committed together,
+    so a URL is never left half-processed. `category` is classified by the
+    caller (summarize_news) before storing.
     """
 
     if summary is None:
         return None
     
     try:
-        new_category = classify_category(summary)
-        category = mapping_category_enum_to_string(new_category)
+        category = mapping_category_enum_to_string(category)
         new_article = models.New(
             url=url,
             title=summary.title,
@@ -1759,9 +1689,19 @@ def store_summarized_news(db: Session, url: str, summary: schemas.News) -> int:
             date_scraped=datetime.now()
         )
         db.add(new_article)
+        claimed = url_store.transition(
+            db, url, url_store.STATUS_SUMMARIZED,
+            from_status=url_store.STATUS_TO_SUMMARIZE, commit=False,
+        )
+        if not claimed:
+            # Un'altra run ha gia' riassunto (o scartato) questo URL.
+            db.rollback()
+            logger.info("Skipping {}, no longer to_summarize", url)
+            return None
         db.commit()
         db.refresh(new_article)
     except Exception as e:
+        db.rollback()
         logger.error("Error storing summarized news: {}", e)
         return None
     logger.info("Added {} to database", url)
@@ -1833,7 +1773,7 @@ def get_reconstructed_article_via_openai(news_item: models.New):
         
         class SEOAnalysis(BaseModel):
             tags: List[str]
-        keywords = client_openai.responses.parse(
+        keywords = llm_gateway.responses_parse(
             model='gpt-4.1',
             input=[
                 {"role": "system", "content": f"{GET_KEYWORDS_PROMPT}"},
@@ -1847,7 +1787,7 @@ def get_reconstructed_article_via_openai(news_item: models.New):
 
 
         logger.debug("Provided informations: Title: {}, Facts: {}, Context: {}, Category: {}, Location: {}, Published date: {}, parole chiave: {}", news_item.title, news_item.facts, news_item.context, news_item.category, news_item.location, news_item.published_date, keywords)
-        article_response_openai = client_openai.responses.parse(
+        article_response_openai = llm_gateway.responses_parse(
                         model='gpt-4.1',
                         input=[
                             {"role": "system", "content": f"{NEW_RESTRUCTURING_PROMPT}"},
@@ -1870,85 +1810,16 @@ def get_reconstructed_article_via_openai(news_item: models.New):
 # CLAUDE OPUS 4.6 - Ricostruzione articoli
 # =============================================
 
-STOP_WORDS_IT = {
-    "di", "a", "da", "in", "con", "su", "per", "tra", "fra", "il", "lo", "la",
-    "i", "gli", "le", "un", "uno", "una", "e", "o", "ma", "che", "non", "si",
-    "del", "dello", "della", "dei", "degli", "delle", "al", "allo", "alla",
-    "ai", "agli", "alle", "dal", "dallo", "dalla", "dai", "dagli", "dalle",
-    "nel", "nello", "nella", "nei", "negli", "nelle", "sul", "sullo", "sulla",
-    "sui", "sugli", "sulle", "come", "se", "anche", "piu", "sono", "stato",
-    "essere", "ha", "hanno", "questo", "questa", "questi", "queste", "quello",
-}
-
+def find_related_articles(title: str, tags: List[str], category: str, k: Optional[int] = None) -> List[dict]:
+    """Trova i k articoli piu rilevanti dal database Supabase per interlinking.
 
-def find_related_articles(title: str, tags: List[str], category: str) -> List[dict]:
-    """Trova i 3 articoli piu rilevanti dal database Supabase per interlinking."""
+    Gli articoli stanno nell'indice in memoria di `interlink_index`, aggiornato
+    in modo incrementale; lo scoring (weighted storico 0.6/0.25/0.15 o BM25,
+    vedi INTERLINK_SCORING) e' vettoriale in `interlink_scoring`.
+    k di default e' INTERLINK_TOP_K (3).
+    """
     try:
-        supabase = get_supabase_client()
-        response = supabase.table('articles').select(
-            'id, title, slug, category_slug, tags'
-        ).eq('isdraft', False).execute()
-
-        if not response.data:
-            logger.info("No articles found in Supabase for interlinking")
-            return []
-
-        # Normalizza i tag dell'articolo nuovo
-        new_tags_set = set(t.lower().strip() for t in tags if t)
-
-        # Estrai parole significative dal titolo (no stop words)
-        title_words = set(
-            w.lower() for w in re.split(r'\W+', title)
-            if len(w) > 2 and w.lower() not in STOP_WORDS_IT
-        )
-
-        scored_articles = []
-        for article in response.data:
-            # Parsa i tag dell'articolo esistente
-            existing_tags_raw = article.get('tags', [])
-            if isinstance(existing_tags_raw, str):
-                try:
-                    existing_tags_raw = json.loads(existing_tags_raw)
-                except (json.JSONDecodeError, TypeError):
-                    existing_tags_raw = []
-            if not isinstance(existing_tags_raw, list):
-                existing_tags_raw = []
-
-            existing_tags_set = set(t.lower().strip() for t in existing_tags_raw if isinstance(t, str) and t)
-
-            # Score: tag overlap (peso 0.6)
-            tag_overlap = len(new_tags_set & existing_tags_set)
-            max_tags = max(len(new_tags_set), 1)
-            tag_score = (tag_overlap / max_tags) * 0.6
-
-            # Score: stessa categoria (peso 0.25)
-            article_category_slug = article.get('category_slug', '')
-            category_slug_new = category.lower().replace(' ', '-') if category else ''
-            category_score = 0.25 if article_category_slug == category_slug_new else 0
-
-            # Score: keyword nel titolo (peso 0.15)
-            existing_title = article.get('title', '')
-            existing_title_words = set(
-                w.lower() for w in re.split(r'\W+', existing_title)
-                if len(w) > 2 and w.lower() not in STOP_WORDS_IT
-            )
-            title_overlap = len(title_words & existing_title_words)
-            max_title_words = max(len(title_words), 1)
-            title_score = (title_overlap / max_title_words) * 0.15
-
-            total_score = tag_score + category_score + title_score
-
-            if total_score > 0.1:
-                scored_articles.append({
-                    'title': article['title'],
-                    'slug': article['slug'],
-                    'category_slug': article['category_slug'],
-                    'score': total_score
-                })
-
-        # Ordina per score decrescente, prendi i top 3
-        scored_articles.sort(key=lambda x: x['score'], reverse=True)
-        top_articles = scored_articles[:3]
+        top_articles = interlink_scoring.related(interlink_index.get_index(), title, tags, category, k=k)
 
         logger.info("Found {} related articles for interlinking:", len(top_articles))
         for a in top_articles:
@@ -1977,13 +1848,16 @@ def get_reconstructed_article_via_claude(news_item: models.New) -> schemas.NewsA
             f"Data pubblicazione: {news_item.published_date}"
         )
 
-        keywords_response = claude_client.messages.create(
+        keywords_response = llm_gateway.messages_create(
             model=CLAUDE_MODEL,
             max_tokens=1000,
             messages=[
                 {
                     "role": "user",
-                    "content": f"{CLAUDE_KEYWORDS_PROMPT}\n\nInformazioni:\n{news_info}"
+                    "content": [
+                        llm_gateway.cached_text(CLAUDE_KEYWORDS_PROMPT),
+                        {"type": "text", "text": f"Informazioni:\n{news_info}"},
+                    ]
                 }
             ]
         )
@@ -2025,13 +1899,16 @@ def get_reconstructed_article_via_claude(news_item: models.New) -> schemas.NewsA
             f"{interlinks_text}"
         )
 
-        article_response = claude_client.messages.create(
+        article_response = llm_gateway.messages_create(
             model=CLAUDE_MODEL,
             max_tokens=8000,
             messages=[
                 {
                     "role": "user",
-                    "content": f"{CLAUDE_RESTRUCTURING_PROMPT}\n\n{user_content}"
+                    "content": [
+                        llm_gateway.cached_text(CLAUDE_RESTRUCTURING_PROMPT),
+                        {"type": "text", "text": user_content},
+                    ]
                 }
             ]
         )
@@ -2066,8 +1943,7 @@ class Summary(BaseModel):
 
 async def generate_summary(content: str) -> str:
     try:
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        summary_response = client.responses.parse(
+        summary_response = await llm_gateway.aresponses_parse(
         model='gpt-4.1-mini',
         input=[
         {"role": "system", "content": f"fai un sunto di 3 paragrafi di 200 parole ciascuno. 200 parole ciascuno EXACT EXACT EXACT and 3 paragraphs!!! IMPORTANT: DEVE ESSERE SEMPRE DI 600 PAROLE TOTALE, usare markdown quando necessario"},
@@ -2149,11 +2025,11 @@ def get_unpublished_str(unpublished_events: List[schemas.Event]):
     logger.debug("Unpublished str: {}", unpublished_str)
     return unpublished_str
 
-def get_unpublished_events_via_openai(comparison_text: str):
+async def get_unpublished_events_via_openai(comparison_text: str):
     if comparison_text is None:
         return None
     try:
-        all_events_in_recent_news = client.chat.completions.create(
+        all_events_in_recent_news = await llm_gateway.achat_create(
             model=MODEL_BETTER,
             messages=[
                 {"role": "system", "content": PROMPT_FOR_HAVING_ALL_THE_NEWS},
@@ -2168,11 +2044,11 @@ def get_unpublished_events_via_openai(comparison_text: str):
         return None
 
 
-def get_events_to_publish_via_openai(unpublished_events_str: str) -> schemas.EventList:
+async def get_events_to_publish_via_openai(unpublished_events_str: str) -> schemas.EventList:
     if unpublished_events_str is None:
         return None
     try:
-        events_to_publish = client.chat.completions.create(
+        events_to_publish = await llm_gateway.achat_create(
             model=MODEL_BETTER,
             messages=[
             {"role": "system", "content": FINAL_SELECTION_PROMPT},
@@ -2199,7 +2075,7 @@ def get_events_to_publish_via_openai(unpublished_events_str: str) -> schemas.Eve
 def send_telegram_notifications(messages: List[str]):
     try:
         for message in messages:
-            requests.post("http://localhost:8001/send", params={"message": message})
+            http_client.post("http://localhost:8001/send", params={"message": message})
     except Exception as e:
         logger.error("Failed to send Telegram notification: {}", e)
 
@@ -2286,44 +2162,37 @@ async def get_today_published_news(db: Session = Depends(get_db)):
 async def reconstruct_article(db: Session = Depends(get_db)):
     final_results = []
 
-    with open('to_scrape.json', 'r') as f:
-        to_scrape = json.load(f)
-
-    for url, status in to_scrape.items():
-        if status == "summarized":
-            try:
-                news_item = get_new_with_url(url, db)
-
-                #print(f"News item: \n\n{news_item.title}\n{news_item.facts}\n{news_item.context}\n{news_item.category}\n{news_item.location}\n{news_item.published_date}\n\n")
-
-                if news_item:
-                    article_response = client.chat.completions.create(
-                        model=MODEL_BETTER,
-                        messages=[
-                            {"role": "system", "content": f"{RECONSTRUCTING_PROMPT}"},
-                            {"role": "user", "content": f"This is the provided informations: Title: {news_item.title}, Facts: {news_item.facts}, Context: {news_item.context}, Category: {news_item.category}, Location: {news_item.location}, Published date: {news_item.published_date}"},
-                        ],
-                        response_model=schemas.NewsArticle,
-                    )
-                    #print(f"Article response: {article_response}\n\n")
-                    
-                    logger.debug("Provided informations: Title: {}, Facts: {}, Context: {}, Category: {}, Location: {}, Published date: {}", news_item.title, news_item.facts, news_item.context, news_item.category, news_item.location, news_item.published_date)
-                    # Update the database with the reconstructed article
-                    news_item.proposed_title = article_response.proposed_title
-                    news_item.proposed_response = article_response.proposed_content
-                    news_item.proposed_subtitle = article_response.proposed_subtitle
-                    db.commit()
-                    #print(f"Updated database entry for {url}")
-
-                    final_results.append(article_response)
-
-                    to_scrape[url] = "reconstructed"
-            except Exception as e:
-                logger.error("Error processing {}: {}", url, e)
-                continue
-
-    with open('to_scrape.json', 'w') as f:
-        json.dump(to_scrape, f, indent=2)
+    for url in url_store.urls_with_status(db, url_store.STATUS_SUMMARIZED):
+        try:
+            news_item = get_new_with_url(url, db)
+
+            #print(f"News item: \n\n{news_item.title}\n{news_item.facts}\n{news_item.context}\n{news_item.category}\n{news_item.location}\n{news_item.published_date}\n\n")
+
+            if news_item:
+                article_response = await llm_gateway.achat_create(
+                    model=MODEL_BETTER,
+                    messages=[
+                        {"role": "system", "content": f"{RECONSTRUCTING_PROMPT}"},
+                        {"role": "user", "content": f"This is the provided informations: Title: {news_item.title}, Facts: {news_item.facts}, Context: {news_item.context}, Category: {news_item.category}, Location: {news_item.location}, Published date: {news_item.published_date}"},
+                    ],
+                    response_model=schemas.NewsArticle,
+                )
+                #print(f"Article response: {article_response}\n\n")
+                
+                logger.debug("Provided informations: Title: {}, Facts: {}, Context: {}, Category: {}, Location: {}, Published date: {}", news_item.title, news_item.facts, news_item.context, news_item.category, news_item.location, news_item.published_date)
+                # Update the database with the reconstructed article
+                news_item.proposed_title = article_response.proposed_title
+                news_item.proposed_response = article_response.proposed_content
+                news_item.proposed_subtitle = article_response.proposed_subtitle
+                db.commit()
+                #print(f"Updated database entry for {url}")
+
+                final_results.append(article_response)
+
+                url_store.transition(db, url, url_store.STATUS_RECONSTRUCTED)
+        except Exception as e:
+            logger.error("Error processing {}: {}", url, e)
+            continue
     
     return final_results
 
@@ -2347,7 +2216,7 @@ async def generate_finetuning(news: schemas.FinetuneContext):
     response = []
     logger.info("News: {}", len(news.news))
     for new in news.news:
-        summary = client.chat.completions.create(
+        summary = await llm_gateway.achat_create(
                         model=MODEL,
                         messages=[
                             {"role": "system", "content": "Read user's new's article and extract the news item. The news item should be in the form of a JSON object with the following structure: title, context, facts. ITS VERY IMPORTANT THAT YOU SHOULD MODIFY THE TITLE, MAKE IT A LITTLE BIT DIFFERENT. You should do this in order so another one with NO more info about the matter makes a new article. Check the language. The facts should be concrete and specific to the news item. Facts need to be short, with the less amount of well-done phrases and more like \"Someone did this\", \"Response was this\". Everything in your response should be in Italian."},
@@ -2383,7 +2252,7 @@ async def edit_news(body: schemas.Edit_new, db: Session = Depends(get_db)):
         Published Date: {news_item.published_date}
         """
     # Make the API call to OpenAI
-    response = client.chat.completions.create(
+    response = await llm_gateway.achat_create(
         model=MODEL,
         messages=[
             {"role": "system", "content": f"You are an AI assistant helping to edit a news article. Here's the original article user want to edit:\n\n{context}"},
@@ -2518,7 +2387,7 @@ async def test_wordpress_post():
 
     try:
         # Make request to WordPress API
-        response = requests.post(
+        response = http_client.post(
             WORDPRESS_API_URL,
             json=post_data,
             auth=HTTPBasicAuth(WORDPRESS_USERNAME, WORDPRESS_APP_PASSWORD)
@@ -2554,7 +2423,7 @@ async def get_wordpress_post(post_id: int):
         post_url = f"{WORDPRESS_API_URL}/{post_id}?context=edit"
 
         # Make request to WordPress API
-        response = requests.get(
+        response = http_client.get(
             post_url,
             auth=HTTPBasicAuth(WORDPRESS_USERNAME, WORDPRESS_APP_PASSWORD)
         )
@@ -2671,7 +2540,7 @@ mapping_category = {
 # Define Italy timezone
 ITALY_TZ = pytz.timezone('Europe/Rome')
 
-def classify_category(new: schemas.News):
+async def classify_category(new: schemas.News):
 
     classification_text = f"""
     Title: {new.title}
@@ -2680,7 +2549,7 @@ def classify_category(new: schemas.News):
     """
     logger.debug("Classification text: {}", classification_text)
 
-    response = client.chat.completions.create(
+    response = await llm_gateway.achat_create(
         model=MODEL,
         messages=[
             {
@@ -2719,23 +2588,10 @@ def update_ratings_json(news_id, ratings):
         json.dump(data, f, indent=2)
 
 @app.post("/dismiss_failed_links")
-async def dismiss_failed_links():
+async def dismiss_failed_links(db: Session = Depends(get_db)):
     try:
-        with open('to_scrape.json', 'r') as f:
-            to_scrape = json.load(f)
-        
-        # Count how many links were marked as failed
-        failed_count = 0
-        
         # Update empty status to "failed"
-        for url, status in to_scrape.items():
-            if status == "":
-                to_scrape[url] = "failed"
-                failed_count += 1
-        
-        # Save the updated json
-        with open('to_scrape.json', 'w') as f:
-            json.dump(to_scrape, f, indent=2)
+        failed_count = url_store.transition_all(db, url_store.STATUS_NEW, url_store.STATUS_FAILED)
             
         return {
             "status": "success",
@@ -2749,21 +2605,10 @@ async def dismiss_failed_links():
             detail=f"Error dismissing failed links: {str(e)}"
         )
 @app.post("/put_links_in_summarized")
-async def put_links_in_summarized():
+async def put_links_in_summarized(db: Session = Depends(get_db)):
     try:
-        with open('to_scrape.json', 'r') as f:
-            to_scrape = json.load(f)
-        
-        
-        
-        # Update empty status to "failed"
-        for url, status in to_scrape.items():
-            if status == "":
-                to_scrape[url] = "summarized"
-        
-        # Save the updated json
-        with open('to_scrape.json', 'w') as f:
-            json.dump(to_scrape, f, indent=2)
+        # Update empty status to "summarized"
+        url_store.transition_all(db, url_store.STATUS_NEW, url_store.STATUS_SUMMARIZED)
             
         return {
             "status": "success",
@@ -2789,7 +2634,7 @@ async def reconstruct_first_article(db: Session = Depends(get_db)):
 
     # 2. Call the reconstruction function
     try:
-        reconstructed_article: schemas.NewsArticle = get_reconstructed_article_via_openai(news_item)
+        reconstructed_article: schemas.NewsArticle = await asyncio.to_thread(get_reconstructed_article_via_openai, news_item)
 
         if not reconstructed_article:
             raise HTTPException(status_code=500, detail="Failed to reconstruct article (OpenAI call might have failed)")
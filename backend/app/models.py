@@ -34,4 +34,46 @@ class New(Base):
     tags = Column(MutableList.as_mutable(JSON), default=list)
 
 
+class ScrapeUrl(Base):
+    """Stato di avanzamento di ogni URL visto dallo scraping (ex to_scrape.json)."""
+    __tablename__ = "scrape_urls"
 
+    id = Column(Integer, primary_key=True)
+    url = Column(String, unique=True, index=True, nullable=False)
+    status = Column(String, index=True, nullable=False, default="")
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class GenerationJob(Base):
+    """Job di generazione skill/persona gestito da `job_queue` (ex _persona_jobs)."""
+    __tablename__ = "generation_jobs"
+
+    id = Column(String, primary_key=True)
+    kind = Column(String, index=True, nullable=False)
+    status = Column(String, index=True, nullable=False, default="pending")
+    # Chiave di deduplica: al massimo un job attivo per chiave (es. "news:42")
+    dedup_key = Column(String, index=True)
+    creator = Column(String)
+    params = Column(JSON, nullable=False, default=dict)
+    # Campi restituiti da generation-status (mode, supabaseId, error, ...)
+    result = Column(JSON, nullable=False, default=dict)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=1)
+    next_run_at = Column(DateTime, index=True)
+    lease_owner = Column(String, index=True)
+    lease_expires_at = Column(DateTime)
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    expires_at = Column(DateTime, index=True)
+
+
+class GenerationJobEvent(Base):
+    """Evento di avanzamento di un GenerationJob (stream SSE generation-events)."""
+    __tablename__ = "generation_job_events"
+
+    id = Column(Integer, primary_key=True)
+    job_id = Column(String, index=True, nullable=False)
+    type = Column(String, nullable=False)
+    data = Column(JSON, nullable=False, default=dict)
+    created_at = Column(DateTime, nullable=False)
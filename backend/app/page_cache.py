@@ -0,0 +1,346 @@
+"""Cache su disco delle pagine scaricate (Firecrawl, cloudscraper, skill).
+
+Lo stesso articolo veniva scaricato piu' volte nel corso della pipeline:
+`get_news_from_link_via_firecrawl` (fino a due tentativi Firecrawl piu'
+cloudscraper), poi `find_best_image`, gli step interpelli e gli script
+`firecrawl_scrape.py` delle skill. Questo modulo centralizza il contenuto:
+
+- chiave = URL normalizzato + "variante" (es. `firecrawl:markdown`, `html`),
+  cosi' formati diversi della stessa pagina non si sovrascrivono;
+- i contenuti sono salvati come blob indirizzati dallo sha256 del testo
+  (`<PAGE_CACHE_DIR>/blobs/ab/abcd...`), pagine identiche occupano un solo file;
+- l'indice e' un DB SQLite (WAL) condiviso tra worker uvicorn e sottoprocessi
+  delle skill, con TTL per voce ed eviction LRU quando la dimensione totale
+  supera `PAGE_CACHE_MAX_BYTES`;
+- per i fetch HTTP diretti (`fetch_http`) le voci scadute vengono
+  rivalidate con If-None-Match / If-Modified-Since: un 304 rinnova la voce
+  senza riscaricare il corpo.
+
+`get_or_fetch` serializza i fetch concorrenti sulla stessa chiave nello
+stesso processo, quindi una pagina viene scaricata una sola volta anche
+quando piu' step paralleli la chiedono insieme.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+from typing import Callable, Dict, List, NamedTuple, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from .logger import logger
+
+PAGE_CACHE_ENABLED = os.getenv("PAGE_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+PAGE_CACHE_DIR = os.getenv(
+    "PAGE_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "pages"),
+)
+# TTL di default per il contenuto degli articoli (24h)
+PAGE_CACHE_TTL = int(os.getenv("PAGE_CACHE_TTL", "86400"))
+# Le pagine indice delle fonti cambiano spesso: TTL breve per la scoperta dei link
+PAGE_CACHE_LINKS_TTL = int(os.getenv("PAGE_CACHE_LINKS_TTL", "600"))
+PAGE_CACHE_MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Varianti usate dai chiamanti
+VARIANT_FIRECRAWL_MARKDOWN = "firecrawl:markdown"
+VARIANT_FIRECRAWL_HTML = "firecrawl:html"
+VARIANT_FIRECRAWL_LINKS = "firecrawl:links"
+VARIANT_HTML = "html"
+
+# Parametri di tracking che non cambiano il contenuto della pagina
+_TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "mc_cid", "mc_eid", "ref_src")
+
+_DB_PATH = os.path.join(PAGE_CACHE_DIR, "index.sqlite3")
+_BLOBS_DIR = os.path.join(PAGE_CACHE_DIR, "blobs")
+
+_init_lock = threading.Lock()
+_initialized = False
+_key_locks_guard = threading.Lock()
+# chiave -> [lock, thread che lo usano/attendono]; la voce sparisce quando il contatore torna a 0
+_key_locks: Dict[str, List] = {}
+
+
+class CachedPage(NamedTuple):
+    text: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fresh: bool
+
+
+class HttpPage(NamedTuple):
+    status_code: int
+    text: str
+    from_cache: bool
+
+
+def normalize_url(url: str) -> str:
+    """Forma canonica dell'URL usata come chiave.
+
+    Schema e host in minuscolo, porta di default e frammento rimossi,
+    parametri di tracking eliminati e query ordinata.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    port = parts.port
+    if port and not ((scheme == "http" and port == 80) or (scheme == "https" and port == 443)):
+        host = f"{host}:{port}"
+    query = sorted(
+        (k, v)
+        for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith(_TRACKING_PARAMS)
+    )
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+
+def _cache_key(url: str, variant: str) -> str:
+    return hashlib.sha256(f"{variant}\n{normalize_url(url)}".encode("utf-8")).hexdigest()
+
+
+def _blob_path(digest: str) -> str:
+    return os.path.join(_BLOBS_DIR, digest[:2], digest)
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(_DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _ensure_initialized() -> bool:
+    global _initialized
+    if _initialized:
+        return True
+    with _init_lock:
+        if _initialized:
+            return True
+        try:
+            os.makedirs(_BLOBS_DIR, exist_ok=True)
+            with closing(_connect()) as conn, conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS pages (
+                        key TEXT PRIMARY KEY,
+                        url TEXT NOT NULL,
+                        variant TEXT NOT NULL,
+                        blob TEXT NOT NULL,
+                        size INTEGER NOT NULL,
+                        etag TEXT,
+                        last_modified TEXT,
+                        fetched_at REAL NOT NULL,
+                        expires_at REAL NOT NULL,
+                        accessed_at REAL NOT NULL
+                    )
+                    """
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS ix_pages_accessed ON pages(accessed_at)")
+                conn.execute("CREATE INDEX IF NOT EXISTS ix_pages_blob ON pages(blob)")
+            _initialized = True
+        except (OSError, sqlite3.Error) as e:
+            logger.error("[page_cache] Inizializzazione fallita in {}: {}", PAGE_CACHE_DIR, e)
+            return False
+    return True
+
+
+def _lookup(key: str) -> Optional[CachedPage]:
+    """Voce dell'indice (anche scaduta) con il relativo contenuto, None se assente."""
+    now = time.time()
+    try:
+        with closing(_connect()) as conn, conn:
+            row = conn.execute(
+                "SELECT blob, etag, last_modified, expires_at FROM pages WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            try:
+                with open(_blob_path(row["blob"]), "r", encoding="utf-8") as f:
+                    text = f.read()
+            except OSError:
+                # Blob rimosso da un'eviction concorrente: la voce non e' piu' valida
+                conn.execute("DELETE FROM pages WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE pages SET accessed_at = ? WHERE key = ?", (now, key))
+    except sqlite3.Error as e:
+        logger.warning("[page_cache] Lettura indice fallita: {}", e)
+        return None
+    return CachedPage(text, row["etag"], row["last_modified"], row["expires_at"] > now)
+
+
+def get(url: str, variant: str) -> Optional[str]:
+    """Contenuto in cache non scaduto per (url, variant), altrimenti None."""
+    if not PAGE_CACHE_ENABLED or not url or not _ensure_initialized():
+        return None
+    page = _lookup(_cache_key(url, variant))
+    if page is None or not page.fresh:
+        return None
+    logger.debug("[page_cache] HIT {} {}", variant, url)
+    return page.text
+
+
+def put(
+    url: str,
+    variant: str,
+    text: str,
+    ttl: Optional[int] = None,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+) -> None:
+    """Salva `text` come contenuto di (url, variant) per `ttl` secondi."""
+    if not PAGE_CACHE_ENABLED or not url or text is None or not _ensure_initialized():
+        return
+    data = text.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    path = _blob_path(digest)
+    now = time.time()
+    try:
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        with closing(_connect()) as conn, conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO pages
+                    (key, url, variant, blob, size, etag, last_modified, fetched_at, expires_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    _cache_key(url, variant), normalize_url(url), variant, digest, len(data),
+                    etag, last_modified, now, now + (PAGE_CACHE_TTL if ttl is None else ttl), now,
+                ),
+            )
+    except (OSError, sqlite3.Error) as e:
+        logger.warning("[page_cache] Scrittura fallita per {}: {}", url, e)
+        return
+    _evict_if_needed()
+
+
+def _renew(key: str, ttl: Optional[int]) -> None:
+    now = time.time()
+    try:
+        with closing(_connect()) as conn, conn:
+            conn.execute(
+                "UPDATE pages SET fetched_at = ?, expires_at = ?, accessed_at = ? WHERE key = ?",
+                (now, now + (PAGE_CACHE_TTL if ttl is None else ttl), now, key),
+            )
+    except sqlite3.Error as e:
+        logger.warning("[page_cache] Rinnovo voce fallito: {}", e)
+
+
+def _evict_if_needed() -> None:
+    """Eviction LRU: rimuove le voci meno usate finche' la cache rientra nel 90% del limite."""
+    try:
+        with closing(_connect()) as conn, conn:
+            total = conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM (SELECT MAX(size) AS size FROM pages GROUP BY blob)"
+            ).fetchone()[0]
+            if total <= PAGE_CACHE_MAX_BYTES:
+                return
+            target = int(PAGE_CACHE_MAX_BYTES * 0.9)
+            evicted = 0
+            for row in conn.execute("SELECT key, blob, size FROM pages ORDER BY accessed_at").fetchall():
+                if total <= target:
+                    break
+                conn.execute("DELETE FROM pages WHERE key = ?", (row["key"],))
+                evicted += 1
+                still_used = conn.execute(
+                    "SELECT 1 FROM pages WHERE blob = ? LIMIT 1", (row["blob"],)
+                ).fetchone()
+                if still_used is None:
+                    total -= row["size"]
+                    try:
+                        os.remove(_blob_path(row["blob"]))
+                    except OSError:
+                        pass
+        logger.info("[page_cache] Eviction LRU: {} voci rimosse, {} byte occupati", evicted, total)
+    except sqlite3.Error as e:
+        logger.warning("[page_cache] Eviction fallita: {}", e)
+
+
+@contextmanager
+def _key_lock(key: str):
+    """Serializza i fetch della stessa chiave senza tenere un lock per ogni URL mai visto."""
+    with _key_locks_guard:
+        entry = _key_locks.get(key)
+        if entry is None:
+            entry = _key_locks[key] = [threading.Lock(), 0]
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _key_locks_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _key_locks[key]
+
+
+def get_or_fetch(
+    url: str,
+    variant: str,
+    fetch: Callable[[], Optional[str]],
+    ttl: Optional[int] = None,
+) -> Optional[str]:
+    """Ritorna il contenuto in cache o lo ottiene con `fetch()` e lo salva.
+
+    I risultati None/vuoti non vengono salvati, cosi' un fallimento
+    temporaneo non viene "ricordato" per tutto il TTL.
+    """
+    if not PAGE_CACHE_ENABLED:
+        return fetch()
+    cached = get(url, variant)
+    if cached is not None:
+        return cached
+    with _key_lock(_cache_key(url, variant)):
+        cached = get(url, variant)
+        if cached is not None:
+            return cached
+        content = fetch()
+        if content:
+            put(url, variant, content, ttl=ttl)
+        return content
+
+
+def fetch_http(session, url: str, variant: str = VARIANT_HTML, ttl: Optional[int] = None, **kwargs) -> HttpPage:
+    """GET tramite `session` (requests/cloudscraper) passando dalla cache.
+
+    Le voci valide vengono servite senza rete; quelle scadute sono rivalidate
+    con ETag/Last-Modified e un 304 riusa il corpo gia' salvato. Solo le
+    risposte 200 finiscono in cache. Le eccezioni di rete sono propagate.
+    """
+    if not PAGE_CACHE_ENABLED or not _ensure_initialized():
+        response = session.get(url, **kwargs)
+        return HttpPage(response.status_code, response.text, False)
+
+    key = _cache_key(url, variant)
+    with _key_lock(key):
+        cached = _lookup(key)
+        if cached is not None and cached.fresh:
+            logger.debug("[page_cache] HIT {} {}", variant, url)
+            return HttpPage(200, cached.text, True)
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+        response = session.get(url, headers=headers, **kwargs)
+
+        if response.status_code == 304 and cached is not None:
+            logger.debug("[page_cache] REVALIDATED {} {}", variant, url)
+            _renew(key, ttl)
+            return HttpPage(200, cached.text, True)
+        if response.status_code == 200:
+            put(
+                url, variant, response.text, ttl=ttl,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+            )
+        return HttpPage(response.status_code, response.text, False)
@@ -12,7 +12,7 @@ import os
 import sys
 import time
 from pathlib import Path
-from typing import Iterable
+from typing import Callable, Iterable
 
 from .logger import logger
 
@@ -47,6 +47,7 @@ async def generate_article_with_persona(
     persona: str = "Giornalista",
     target: str | None = None,
     interlinks: Iterable[str] | None = None,
+    on_event: Callable[[dict], None] | None = None,
 ) -> dict:
     """Esegue la skill persona e ritorna il payload JSON.
 
@@ -57,6 +58,7 @@ async def generate_article_with_persona(
         persona: una delle 10 persone ammesse (default Giornalista).
         target: target di riferimento (docenti, studenti, ecc.).
         interlinks: URL assoluti del proprio sito da linkare internamente.
+        on_event: callback per gli eventi di avanzamento della skill (stage, tool call).
 
     Returns:
         dict con payload (seo, angolo, competitor_report, factcheck_report,
@@ -92,6 +94,7 @@ async def generate_article_with_persona(
             target=target,
             tono=tono,
             persona=persona,
+            on_event=on_event,
         )
     except Exception as e:
         logger.exception(
@@ -0,0 +1,154 @@
+"""Client S3 condiviso e upload multipart in streaming.
+
+Prima ogni chiamata a `convert_text_to_audio` creava un nuovo client boto3
+(nuova sessione, nuovo pool di connessioni, handshake TLS) e caricava l'MP3
+con un solo `put_object` dopo aver concatenato in memoria tutti i chunk.
+
+Qui:
+
+- `get_s3_client()` restituisce un unico client per processo (i client
+  boto3 sono thread-safe) con pool di `S3_MAX_POOL_CONNECTIONS` connessioni;
+- `MultipartWriter` riceve i byte man mano che sono pronti e li invia come
+  parti di un multipart upload. S3 richiede parti di almeno 5 MiB (tranne
+  l'ultima), quindi il writer accumula fino a `S3_PART_SIZE` prima di
+  inviare: la memoria resta limitata a una parte invece dell'intero file.
+  Se alla chiusura non e' mai stata raggiunta una parte intera, il contenuto
+  viene caricato con un semplice `put_object` (niente multipart per file
+  piccoli). In caso di errore l'upload multipart viene annullato, per non
+  lasciare parti orfane fatturate nel bucket.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from typing import Dict, List, Optional
+
+import boto3
+from botocore.config import Config
+
+from .logger import logger
+
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "20"))
+# Minimo imposto da S3 per le parti di un multipart upload (tranne l'ultima)
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+S3_PART_SIZE = max(int(os.getenv("S3_PART_SIZE", str(S3_MIN_PART_SIZE))), S3_MIN_PART_SIZE)
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_s3_client():
+    """Client S3 condiviso del processo, creato alla prima richiesta."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = boto3.client(
+                    's3',
+                    region_name=os.getenv('AWS_REGION'),
+                    aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
+                    aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
+                    config=Config(
+                        max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+                        retries={'max_attempts': 5, 'mode': 'adaptive'},
+                    ),
+                )
+    return _client
+
+
+def bucket_name() -> Optional[str]:
+    return os.getenv('AWS_BUCKET_NAME')
+
+
+def public_url(key: str) -> str:
+    """URL pubblico dell'oggetto (se la bucket policy consente la lettura)."""
+    return f"https://{bucket_name()}.s3.{os.getenv('AWS_REGION')}.amazonaws.com/{key}"
+
+
+def put_bytes(key: str, body: bytes, content_type: str, metadata: Optional[Dict[str, str]] = None) -> str:
+    """Carica un oggetto con un solo `put_object` e ne restituisce l'URL pubblico."""
+    extra = {'Metadata': metadata} if metadata else {}
+    get_s3_client().put_object(Bucket=bucket_name(), Key=key, Body=body, ContentType=content_type, **extra)
+    return public_url(key)
+
+
+class MultipartWriter:
+    """Scrive un oggetto S3 a pezzi, inviando una parte ogni `part_size` byte.
+
+    I metodi sono bloccanti (chiamate boto3): dal codice async vanno
+    eseguiti con `asyncio.to_thread`. Le scritture devono arrivare in ordine.
+    """
+
+    def __init__(self, key: str, content_type: str, metadata: Optional[Dict[str, str]] = None,
+                 part_size: int = S3_PART_SIZE) -> None:
+        self.key = key
+        self.content_type = content_type
+        self.metadata = metadata or {}
+        self.part_size = max(part_size, S3_MIN_PART_SIZE)
+        self.bytes_written = 0
+        self._buffer = bytearray()
+        self._upload_id: Optional[str] = None
+        self._parts: List[dict] = []
+        self._closed = False
+
+    def write(self, data: bytes) -> None:
+        if self._closed:
+            raise ValueError(f"MultipartWriter per {self.key} gia' chiuso")
+        self._buffer += data
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self.part_size:
+            part = bytes(self._buffer[:self.part_size])
+            del self._buffer[:self.part_size]
+            self._upload_part(part)
+
+    def _upload_part(self, data: bytes) -> None:
+        client = get_s3_client()
+        if self._upload_id is None:
+            extra = {'Metadata': self.metadata} if self.metadata else {}
+            response = client.create_multipart_upload(
+                Bucket=bucket_name(), Key=self.key, ContentType=self.content_type, **extra
+            )
+            self._upload_id = response['UploadId']
+        part_number = len(self._parts) + 1
+        response = client.upload_part(
+            Bucket=bucket_name(), Key=self.key, UploadId=self._upload_id,
+            PartNumber=part_number, Body=data,
+        )
+        self._parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+        logger.debug("[s3] {}: parte {} inviata ({} byte)", self.key, part_number, len(data))
+
+    def close(self) -> str:
+        """Invia l'ultima parte, completa l'upload e restituisce l'URL pubblico."""
+        if self._closed:
+            return public_url(self.key)
+        self._closed = True
+        if self._upload_id is None:
+            # Mai raggiunta una parte intera: un put_object basta
+            url = put_bytes(self.key, bytes(self._buffer), self.content_type, self.metadata)
+            self._buffer.clear()
+            return url
+        if self._buffer:
+            self._upload_part(bytes(self._buffer))
+            self._buffer.clear()
+        get_s3_client().complete_multipart_upload(
+            Bucket=bucket_name(), Key=self.key, UploadId=self._upload_id,
+            MultipartUpload={'Parts': self._parts},
+        )
+        logger.info("[s3] {}: multipart completato, {} parti, {} byte",
+                    self.key, len(self._parts), self.bytes_written)
+        return public_url(self.key)
+
+    def abort(self) -> None:
+        """Annulla l'upload: le parti gia' inviate vengono eliminate da S3."""
+        self._closed = True
+        self._buffer.clear()
+        if self._upload_id is None:
+            return
+        try:
+            get_s3_client().abort_multipart_upload(
+                Bucket=bucket_name(), Key=self.key, UploadId=self._upload_id
+            )
+        except Exception as e:
+            logger.warning("[s3] abort multipart di {} fallito: {}", self.key, e)
+        finally:
+            self._upload_id = None
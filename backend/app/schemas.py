@@ -1,6 +1,7 @@
 from pydantic import BaseModel
 from typing import Optional, List, Union
 from datetime import datetime
+from .variables_edunews import CategoryEnum
 
 class ExtractArticleContent(BaseModel):
     title_of_the_article: str
@@ -34,6 +35,9 @@ class News(BaseModel):
     date: Optional[str] = None
     language: Optional[str] = None
 
+class NewsWithCategory(News):
+    category: CategoryEnum
+
 class NewsList(BaseModel):
     news: list[str]
 
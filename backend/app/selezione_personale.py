@@ -12,11 +12,9 @@ Eseguibile con: python -m app.selezione_personale (dalla cartella backend/)
 
 import re
 import json
-import requests
 from datetime import datetime
 from typing import List, Dict, Optional, Any
 
-import anthropic
 from dotenv import load_dotenv
 import os
 
@@ -26,13 +24,14 @@ from .database import get_supabase_client
 from .indexnow import submit_to_indexnow
 from .google_indexing import notify_google_indexing
 from .logger import logger
+from . import claude_batch, http_client, llm_gateway
+from .supabase_bulk import BulkWriter
 
 # ---------------------------------------------------------------------------
 # Configurazione
 # ---------------------------------------------------------------------------
 
 INPA_API_URL = "https://portale.inpa.gov.it/concorsi-smart/api/concorso-public-area/search-better"
-ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:4321")
 
 CLAUDE_MODEL = "claude-opus-4-7"
@@ -45,34 +44,43 @@ HEADERS = {
 }
 
 
-def _llm_json_request(
+def _json_request_params(
     system_prompt: str,
     user_content: str,
     temperature: float = 0,
     max_tokens: int = 4096,
 ) -> dict:
-    """Chiama Claude Opus 4.6 per ottenere una risposta JSON."""
-    claude = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-
+    """Parametri di messages.create per una risposta JSON (chiamata diretta o batch)."""
+    # Forza output JSON nel system prompt
     json_system = system_prompt + "\n\nIMPORTANTE: Rispondi SOLO con JSON valido. Esegui l'escape di tutte le virgolette nei valori stringa con backslash (\\\")"
-
-    response = claude.messages.create(
+    return dict(
         model=CLAUDE_MODEL,
         max_tokens=max_tokens,
-        system=json_system,
+        # Prompt statico per tutti gli item della run: in cache dopo la prima chiamata
+        system=llm_gateway.cached_system(json_system),
         messages=[
             {"role": "user", "content": user_content},
         ],
         temperature=temperature,
     )
-    raw = response.content[0].text.strip()
-    # Gestisci eventuale blocco markdown ```json ... ```
+
+
+def _strip_json_fence(raw: str) -> str:
+    """Gestisci eventuale blocco markdown ```json ... ```"""
+    raw = raw.strip()
     if "```" in raw:
         raw = raw.split("```")[1]
         if raw.startswith("json"):
             raw = raw[4:]
         raw = raw.strip()
+    return raw
+
 
+def _parse_json_response(raw: str, max_tokens: int = 4096) -> dict:
+    """JSON dalla risposta di Claude; se malformato chiede a Claude di correggerlo."""
+    raw = _strip_json_fence(raw)
+
+    # Primo tentativo di parsing
     try:
         return json.loads(raw)
     except json.JSONDecodeError:
@@ -80,7 +88,7 @@ def _llm_json_request(
 
     # Fallback: chiedi a Claude di fixare il JSON malformato
     try:
-        fix_response = claude.messages.create(
+        fix_response = llm_gateway.messages_create(
             model=CLAUDE_MODEL,
             max_tokens=max_tokens,
             system="Correggi il seguente JSON malformato. Rispondi SOLO con il JSON corretto, senza markdown, senza spiegazioni. Assicurati che tutte le virgolette dentro i valori stringa siano escapate con backslash.",
@@ -89,18 +97,25 @@ def _llm_json_request(
             ],
             temperature=0,
         )
-        fixed = fix_response.content[0].text.strip()
-        if "```" in fixed:
-            fixed = fixed.split("```")[1]
-            if fixed.startswith("json"):
-                fixed = fixed[4:]
-            fixed = fixed.strip()
-        return json.loads(fixed)
+        return json.loads(_strip_json_fence(fix_response.content[0].text))
     except Exception as fix_err:
         logger.error("Impossibile fixare JSON: {}", fix_err)
         raise
 
 
+def _llm_json_request(
+    system_prompt: str,
+    user_content: str,
+    temperature: float = 0,
+    max_tokens: int = 4096,
+) -> dict:
+    """Chiama Claude Opus 4.6 per ottenere una risposta JSON."""
+    response = llm_gateway.messages_create(
+        **_json_request_params(system_prompt, user_content, temperature, max_tokens)
+    )
+    return _parse_json_response(response.content[0].text, max_tokens)
+
+
 
 def _generate_slug(titolo: str, codice: str, enti: list = None) -> str:
     """Genera uno slug URL-friendly dal titolo e codice del bando."""
@@ -145,7 +160,7 @@ def fetch_bandi_from_inpa(size: int = 2000) -> List[Dict]:
 
     try:
         url = f"{INPA_API_URL}?page=0&size={size}"
-        resp = requests.post(url, headers=HEADERS, json=payload, timeout=60)
+        resp = http_client.post(url, headers=HEADERS, json=payload, timeout=60)
         if resp.status_code != 200:
             logger.error("Errore HTTP {} dall'API INPA", resp.status_code)
             return []
@@ -202,43 +217,19 @@ def save_new_bandi_to_supabase(bandi: List[Dict]) -> int:
     if not bandi:
         return 0
 
-    supabase = get_supabase_client()
-
-    # Estrai codici per dedup
-    codici = [b.get("codice", "") for b in bandi if b.get("codice")]
-    if not codici:
+    # Solo bandi con codice (chiave di dedup)
+    rows = [_extract_bando_row(b) for b in bandi if b.get("codice")]
+    if not rows:
         return 0
 
-    # Query codici gia esistenti (in batch da 500)
-    existing_codici = set()
-    for i in range(0, len(codici), 500):
-        batch = codici[i : i + 500]
-        existing = (
-            supabase.table("selezione_personale")
-            .select("codice")
-            .in_("codice", batch)
-            .execute()
-        )
-        existing_codici.update(row["codice"] for row in (existing.data or []))
+    # Dedup con `in_` a blocchi e insert a blocchi da 100
+    with BulkWriter(get_supabase_client(), "selezione_personale", dedup_on="codice", chunk_size=100) as writer:
+        inserted = writer.insert_missing(rows)
 
-    # Filtra nuovi
-    new_rows = []
-    for bando in bandi:
-        codice = bando.get("codice", "")
-        if codice and codice not in existing_codici:
-            new_rows.append(_extract_bando_row(bando))
-
-    if not new_rows:
+    if not inserted:
         logger.info("Nessun nuovo bando da salvare")
         return 0
 
-    # Inserisci in batch da 100
-    inserted = 0
-    for i in range(0, len(new_rows), 100):
-        batch = new_rows[i : i + 100]
-        resp = supabase.table("selezione_personale").insert(batch).execute()
-        inserted += len(resp.data) if resp.data else 0
-
     logger.info("Salvati {} nuovi bandi su Supabase", inserted)
     return inserted
 
@@ -307,54 +298,94 @@ Rispondi ESCLUSIVAMENTE con un JSON valido nel formato:
 Le keywords devono essere 10 parole chiave SEO strategiche in italiano, mix short-tail e long-tail, pertinenti al bando specifico."""
 
 
+ARTICLE_MAX_TOKENS = 8000
+# Generazione sequenziale: articoli generati tra una scrittura su Supabase e la successiva
+ARTICLE_FLUSH_EVERY = int(os.getenv("SELEZIONE_ARTICLE_FLUSH_EVERY", "10"))
+
+
+def _bando_user_content(bando: dict) -> str:
+    sedi = bando.get("sedi") or []
+    enti = bando.get("enti_riferimento") or []
+    categorie = bando.get("categorie") or []
+    settori = bando.get("settori") or []
+
+    user_content = (
+        f"Titolo bando: {bando.get('titolo', '')}\n"
+        f"Codice: {bando.get('codice', '')}\n"
+        f"Descrizione: {bando.get('descrizione', '')}\n"
+        f"Descrizione breve: {bando.get('descrizione_breve', '')}\n"
+        f"Figura ricercata: {bando.get('figura_ricercata', '')}\n"
+        f"Numero posti: {bando.get('num_posti', 'N/D')}\n"
+        f"Tipo procedura: {bando.get('tipo_procedura', '')}\n"
+        f"Ente: {', '.join(enti) if enti else 'N/D'}\n"
+        f"Sedi: {', '.join(sedi) if sedi else 'N/D'}\n"
+        f"Categorie: {', '.join(categorie) if categorie else 'N/D'}\n"
+        f"Settori: {', '.join(settori) if settori else 'N/D'}\n"
+        f"Data pubblicazione: {bando.get('data_pubblicazione', 'N/D')}\n"
+        f"Data scadenza: {bando.get('data_scadenza', 'N/D')}\n"
+        f"Link ufficiale: {bando.get('link_reindirizzamento', 'N/D')}\n"
+    )
+    if bando.get("salary_min") or bando.get("salary_max"):
+        user_content += f"Retribuzione: {bando.get('salary_min', 'N/D')} - {bando.get('salary_max', 'N/D')}\n"
+    return user_content
+
+
+def _article_from_data(data: dict, bando: dict) -> dict:
+    return {
+        "article_title": data.get("article_title", bando.get("titolo", "")),
+        "article_subtitle": data.get("article_subtitle", ""),
+        "article_content": data.get("article_content", ""),
+        "article_keywords": data.get("article_keywords", []),
+    }
+
+
+def _completed_fields(article: dict, bando: dict) -> dict:
+    """Campi da scrivere per un articolo generato (slug rigenerato dal titolo)."""
+    slug = _generate_slug(
+        article["article_title"],
+        bando.get("codice", ""),
+        bando.get("enti_riferimento"),
+    )
+    return {
+        "article_title": article["article_title"],
+        "article_subtitle": article["article_subtitle"],
+        "article_content": article["article_content"],
+        "article_keywords": article["article_keywords"],
+        "slug": slug,
+        "status": "completed",
+        "updated_at": datetime.now().isoformat(),
+    }
+
+
+def _notify_published(page_urls: List[str]) -> None:
+    """IndexNow + Google Indexing API (JobPosting) per gli articoli appena scritti."""
+    if page_urls:
+        submit_to_indexnow(page_urls + ["https://edunews24.it/selezione-personale"])
+        notify_google_indexing(page_urls)
+
+
 def generate_article_for_bando(bando: dict) -> Optional[dict]:
     """Genera un articolo giornalistico per un singolo bando."""
     try:
-        sedi = bando.get("sedi") or []
-        enti = bando.get("enti_riferimento") or []
-        categorie = bando.get("categorie") or []
-        settori = bando.get("settori") or []
-
-        user_content = (
-            f"Titolo bando: {bando.get('titolo', '')}\n"
-            f"Codice: {bando.get('codice', '')}\n"
-            f"Descrizione: {bando.get('descrizione', '')}\n"
-            f"Descrizione breve: {bando.get('descrizione_breve', '')}\n"
-            f"Figura ricercata: {bando.get('figura_ricercata', '')}\n"
-            f"Numero posti: {bando.get('num_posti', 'N/D')}\n"
-            f"Tipo procedura: {bando.get('tipo_procedura', '')}\n"
-            f"Ente: {', '.join(enti) if enti else 'N/D'}\n"
-            f"Sedi: {', '.join(sedi) if sedi else 'N/D'}\n"
-            f"Categorie: {', '.join(categorie) if categorie else 'N/D'}\n"
-            f"Settori: {', '.join(settori) if settori else 'N/D'}\n"
-            f"Data pubblicazione: {bando.get('data_pubblicazione', 'N/D')}\n"
-            f"Data scadenza: {bando.get('data_scadenza', 'N/D')}\n"
-            f"Link ufficiale: {bando.get('link_reindirizzamento', 'N/D')}\n"
-        )
-        if bando.get("salary_min") or bando.get("salary_max"):
-            user_content += f"Retribuzione: {bando.get('salary_min', 'N/D')} - {bando.get('salary_max', 'N/D')}\n"
-
         data = _llm_json_request(
             system_prompt=ARTICLE_PROMPT,
-            user_content=user_content,
+            user_content=_bando_user_content(bando),
             temperature=0.7,
-            max_tokens=8000,
+            max_tokens=ARTICLE_MAX_TOKENS,
         )
-
-        return {
-            "article_title": data.get("article_title", bando.get("titolo", "")),
-            "article_subtitle": data.get("article_subtitle", ""),
-            "article_content": data.get("article_content", ""),
-            "article_keywords": data.get("article_keywords", []),
-        }
+        return _article_from_data(data, bando)
 
     except Exception as e:
         logger.error("Errore generazione articolo per '{}': {}", bando.get('titolo', ''), e)
         return None
 
 
-def generate_articles_for_pending() -> int:
-    """Genera articoli per tutti i bandi in status pending."""
+def generate_articles_for_pending(batch: Optional[bool] = None) -> int:
+    """Genera articoli per tutti i bandi in status pending.
+
+    Con `batch` (default: `claude_batch.enabled`) tutte le richieste passano
+    dalla Message Batches API e i risultati vengono scritti in blocco.
+    """
     supabase = get_supabase_client()
     pending = (
         supabase.table("selezione_personale")
@@ -368,48 +399,83 @@ def generate_articles_for_pending() -> int:
         logger.info("Nessun bando in attesa di articolo")
         return 0
 
+    use_batch = claude_batch.enabled(len(items)) if batch is None else batch
+    if use_batch:
+        return _generate_articles_batch(items)
+
     logger.info("Generazione articoli per {} bandi...", len(items))
-    success_count = 0
+    page_urls: List[str] = []
+
+    # Ogni riga costa una generazione LLM: si scrive ogni ARTICLE_FLUSH_EVERY articoli
+    with BulkWriter(supabase, "selezione_personale", chunk_size=ARTICLE_FLUSH_EVERY,
+                    expect={"status": "pending"}) as writer:
+        for item in items:
+            logger.info("Generando articolo per: {}...", item.get('titolo', '')[:60])
+            article = generate_article_for_bando(item)
+            if article:
+                # Rigenera slug con article_title se disponibile
+                fields = _completed_fields(article, item)
+                writer.stage_fields(item["id"], fields)
+                page_urls.append(f"https://edunews24.it/selezione-personale/{fields['slug']}")
+                logger.info("Articolo generato: {}...", article['article_title'][:60])
+            else:
+                writer.stage_fields(item["id"], {"status": "error", "updated_at": datetime.now().isoformat()})
+
+    _notify_published(page_urls)
+    logger.info("Generati {}/{} articoli", len(page_urls), len(items))
+    return len(page_urls)
+
+
+def _generate_articles_batch(items: List[Dict]) -> int:
+    """Generazione via Message Batches con scrittura dei risultati in blocco.
+
+    I bandi annullati/scaduti nel batch restano `pending` e vengono ripresi
+    alla run successiva; quelli in errore passano a `error`.
+    """
+    logger.info("Generazione articoli in batch per {} bandi...", len(items))
+    requests = {
+        f"bando-{item['id']}": _json_request_params(
+            ARTICLE_PROMPT,
+            _bando_user_content(item),
+            temperature=0.7,
+            max_tokens=ARTICLE_MAX_TOKENS,
+        )
+        for item in items
+    }
+    results = claude_batch.run(requests)
 
+    completed: Dict[Any, Dict] = {}
+    failed_ids: List[Any] = []
+    page_urls: Dict[Any, str] = {}
     for item in items:
-        logger.info("Generando articolo per: {}...", item.get('titolo', '')[:60])
-        article = generate_article_for_bando(item)
-        if article:
-            # Rigenera slug con article_title se disponibile
-            slug = _generate_slug(
-                article["article_title"],
-                item.get("codice", ""),
-                item.get("enti_riferimento"),
-            )
-            supabase.table("selezione_personale").update(
-                {
-                    "article_title": article["article_title"],
-                    "article_subtitle": article["article_subtitle"],
-                    "article_content": article["article_content"],
-                    "article_keywords": article["article_keywords"],
-                    "slug": slug,
-                    "status": "completed",
-                    "updated_at": datetime.now().isoformat(),
-                }
-            ).eq("id", item["id"]).execute()
-            success_count += 1
-            logger.info("Articolo generato: {}...", article['article_title'][:60])
-
-            # Notify IndexNow
-            submit_to_indexnow([
-                f"https://edunews24.it/selezione-personale/{slug}",
-                "https://edunews24.it/selezione-personale",
-            ])
-
-            # Notify Google Indexing API (JobPosting)
-            notify_google_indexing([f"https://edunews24.it/selezione-personale/{slug}"])
+        result = results.get(f"bando-{item['id']}")
+        if result is None or result.retryable:
+            continue
+        article = None
+        if result.ok:
+            try:
+                article = _article_from_data(_parse_json_response(result.text, ARTICLE_MAX_TOKENS), item)
+            except Exception as e:
+                logger.error("Errore generazione articolo per '{}': {}", item.get('titolo', ''), e)
         else:
-            supabase.table("selezione_personale").update(
-                {"status": "error", "updated_at": datetime.now().isoformat()}
-            ).eq("id", item["id"]).execute()
+            logger.error("Errore generazione articolo per '{}': {}", item.get('titolo', ''), result.error)
+        if article is None:
+            failed_ids.append(item["id"])
+            continue
+        fields = _completed_fields(article, item)
+        completed[item["id"]] = fields
+        page_urls[item["id"]] = f"https://edunews24.it/selezione-personale/{fields['slug']}"
+
+    # Il batch puo' durare ore: righe rilette ora (ancora `pending`) con i campi nuovi,
+    # un upsert per blocco invece di un update per riga
+    with BulkWriter(get_supabase_client(), "selezione_personale") as writer:
+        written = writer.upsert_current(completed, expect={"status": "pending"})
+        writer.update_in({"status": "error", "updated_at": datetime.now().isoformat()}, failed_ids)
+
+    _notify_published([page_urls[item_id] for item_id in written])
 
-    logger.info("Generati {}/{} articoli", success_count, len(items))
-    return success_count
+    logger.info("Generati {}/{} articoli (batch)", len(written), len(items))
+    return len(written)
 
 
 # ===========================================================================
@@ -428,28 +494,30 @@ def run_selezione_personale_pipeline() -> Dict[str, Any]:
         "status": "started",
     }
 
-    try:
-        # Step 1: Fetch bandi da INPA
-        logger.info("--- STEP 1: Fetch bandi da INPA API ---")
-        bandi = fetch_bandi_from_inpa()
-        result["bandi_fetched"] = len(bandi)
-
-        # Step 2: Salva nuovi su Supabase
-        logger.info("--- STEP 2: Salvataggio nuovi bandi ---")
-        saved = save_new_bandi_to_supabase(bandi)
-        result["bandi_saved"] = saved
-
-        # Step 3: Genera articoli per pending
-        logger.info("--- STEP 3: Generazione articoli ---")
-        articles = generate_articles_for_pending()
-        result["articles_generated"] = articles
-
-        result["status"] = "completed"
-
-    except Exception as e:
-        logger.error("ERRORE PIPELINE: {}", e)
-        result["status"] = "error"
-        result["error"] = str(e)
+    with llm_gateway.track("selezione_personale") as llm_usage:
+        try:
+            # Step 1: Fetch bandi da INPA
+            logger.info("--- STEP 1: Fetch bandi da INPA API ---")
+            bandi = fetch_bandi_from_inpa()
+            result["bandi_fetched"] = len(bandi)
+
+            # Step 2: Salva nuovi su Supabase
+            logger.info("--- STEP 2: Salvataggio nuovi bandi ---")
+            saved = save_new_bandi_to_supabase(bandi)
+            result["bandi_saved"] = saved
+
+            # Step 3: Genera articoli per pending
+            logger.info("--- STEP 3: Generazione articoli ---")
+            articles = generate_articles_for_pending()
+            result["articles_generated"] = articles
+
+            result["status"] = "completed"
+
+        except Exception as e:
+            logger.error("ERRORE PIPELINE: {}", e)
+            result["status"] = "error"
+            result["error"] = str(e)
+    result["llm_usage"] = llm_usage.as_dict()
 
     logger.info("=" * 60)
     logger.info("PIPELINE COMPLETATA: {}", result)
@@ -1,14 +1,15 @@
-import requests
 import json
 import time
 from datetime import datetime, timezone
 import schedule
 from typing import List, Dict, Any, Tuple, Optional
-from . import schemas
+from . import schemas, http_client
 import pytz
 import os
 from dotenv import load_dotenv
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
 
 load_dotenv()
 from supabase import create_client, Client
@@ -32,6 +33,11 @@ SUPABASE_KEY = PUBLIC_SUPABASE_ANON_KEY
 
 SCHEDULE_MINUTES = 60 # Run every hour
 
+# Scraping concorrente delle fonti: richieste /scrape_news in volo per run e
+# per singolo host. SCRAPE_CONCURRENCY=1 ripristina lo scraping sequenziale.
+SCRAPE_CONCURRENCY = int(os.getenv("SCRAPE_CONCURRENCY", "8"))
+SCRAPE_PER_HOST_CONCURRENCY = int(os.getenv("SCRAPE_PER_HOST_CONCURRENCY", "2"))
+
 def get_supabase_client() -> Client:
     """Initialize and return a Supabase client"""
     if not SUPABASE_URL or not SUPABASE_KEY:
@@ -74,8 +80,69 @@ def send_telegram_notification(message: str) -> bool:
         logger.error("Failed to send Telegram notification: {}", e)
         return False
 
+def _scrape_source(source: Dict[str, str]) -> Dict[str, Any]:
+    """Chiama /scrape_news per una singola fonte e ritorna l'esito.
+
+    L'esito e' un dict con `source` e una tra le chiavi `links` (successo),
+    `status_code` (risposta non 200) o `error` (eccezione), cosi' che il
+    chiamante possa registrarlo nel pipeline_state nello stesso formato sia
+    in modalita' sequenziale che concorrente.
+    """
+    try:
+        response = http_client.post(
+            f"{BASE_URL}/scrape_news", 
+            params={
+                "url": source['link'],
+                "valid_prefix": source['valid_prefix']
+            },
+            timeout=http_client.BACKEND_TIMEOUT,
+        )
+        if response.status_code == 200:
+            logger.info("Successfully scraped {}", source['link'])
+            return {"source": source['link'], "links": response.json()["news_links"]}
+        logger.error("Failed to scrape {}: {}", source['link'], response.status_code)
+        return {"source": source['link'], "status_code": response.status_code}
+    except Exception as e:
+        logger.error("Error scraping {}: {}", source['link'], e)
+        return {"source": source['link'], "error": str(e)}
+
+
+async def _scrape_sources_concurrently(
+    source_list: List[Dict[str, str]],
+    concurrency: int,
+    per_host: int,
+) -> List[Dict[str, Any]]:
+    """Esegue `_scrape_source` su tutte le fonti con un pool di worker limitato.
+
+    Al massimo `concurrency` richieste in volo per run e `per_host` per singolo
+    host, per non martellare lo stesso sito. Il semaforo dell'host viene
+    acquisito prima di quello globale: una fonte in attesa del proprio host non
+    occupa uno slot che potrebbe servire a un host libero. Gli esiti sono
+    restituiti nello stesso ordine di `source_list`.
+    """
+    loop = asyncio.get_running_loop()
+    run_slots = asyncio.Semaphore(concurrency)
+    host_slots: Dict[str, asyncio.Semaphore] = {}
+
+    async def _worker(executor: ThreadPoolExecutor, source: Dict[str, str]) -> Dict[str, Any]:
+        host = urlparse(source['link']).netloc.lower()
+        host_slot = host_slots.setdefault(host, asyncio.Semaphore(per_host))
+        async with host_slot:
+            async with run_slots:
+                return await loop.run_in_executor(executor, _scrape_source, source)
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="scrape") as executor:
+        return await asyncio.gather(*(_worker(executor, source) for source in source_list))
+
+
 def scrape_news(source_list: List[Dict[str, str]] = None, pipeline_state: Dict[str, Any] = None) -> List[str]:
-    """Scrape news from specified sources"""
+    """Scrape news from specified sources.
+
+    Con SCRAPE_CONCURRENCY > 1 le fonti vengono visitate in parallelo
+    (vedi `_scrape_sources_concurrently`), altrimenti una alla volta come in
+    origine. In entrambi i casi il pipeline_state viene riempito con la stessa
+    struttura e nell'ordine delle fonti.
+    """
     if source_list is None:
         logger.info("No source list provided")
         return []
@@ -90,46 +157,48 @@ def scrape_news(source_list: List[Dict[str, str]] = None, pipeline_state: Dict[s
         }
         
     send_telegram_notification("🔄 Avvio processo di scraping...")
-    logger.info("Starting scraping process...")
     success_count = 0
     news_list = []
-    
-    for source in source_list:
-        try:
-            response = requests.post(
-                f"{BASE_URL}/scrape_news", 
-                params={
-                    "url": source['link'],
-                    "valid_prefix": source['valid_prefix']
-                }
-            )
+
+    if SCRAPE_CONCURRENCY > 1 and len(source_list) > 1:
+        logger.info(
+            "Starting concurrent scraping of {} sources (concurrency={}, per_host={})...",
+            len(source_list), SCRAPE_CONCURRENCY, SCRAPE_PER_HOST_CONCURRENCY,
+        )
+        started = time.monotonic()
+        outcomes = asyncio.run(_scrape_sources_concurrently(
+            source_list,
+            concurrency=SCRAPE_CONCURRENCY,
+            per_host=max(SCRAPE_PER_HOST_CONCURRENCY, 1),
+        ))
+        logger.info("Concurrent scraping finished in {:.1f}s", time.monotonic() - started)
+    else:
+        logger.info("Starting scraping process...")
+        outcomes = [_scrape_source(source) for source in source_list]
+
+    for outcome in outcomes:
+        if "links" in outcome:
+            scraped_links = outcome["links"]
+            news_list.extend(scraped_links)
             
-            if response.status_code == 200:
-                logger.info("Successfully scraped {}", source['link'])
-                scraped_links = response.json()["news_links"]
-                news_list.extend(scraped_links)
-                
-                # Update pipeline state
-                if pipeline_state is not None:
-                    pipeline_state["scraping"]["scraped_links"].extend(scraped_links)
-                
-                success_count += 1
-            else:
-                logger.error("Failed to scrape {}: {}", source['link'], response.status_code)
-                # Add failure to pipeline state
-                if pipeline_state is not None:
-                    pipeline_state["scraping"].setdefault("failures", []).append({
-                        "source": source['link'],
-                        "status_code": response.status_code
-                    })
-        except Exception as e:
-            logger.error("Error scraping {}: {}", source['link'], e)
-            # Add error to pipeline state
+            # Update pipeline state
             if pipeline_state is not None:
-                pipeline_state["scraping"].setdefault("errors", []).append({
-                    "source": source['link'],
-                    "error": str(e)
+                pipeline_state["scraping"]["scraped_links"].extend(scraped_links)
+            
+            success_count += 1
+        elif "status_code" in outcome:
+            # Add failure to pipeline state
+            if pipeline_state is not None:
+                pipeline_state["scraping"].setdefault("failures", []).append({
+                    "source": outcome["source"],
+                    "status_code": outcome["status_code"]
                 })
+        elif pipeline_state is not None:
+            # Add error to pipeline state
+            pipeline_state["scraping"].setdefault("errors", []).append({
+                "source": outcome["source"],
+                "error": outcome["error"]
+            })
     
     # Update pipeline state with final scraping status
     if pipeline_state is not None:
@@ -156,7 +225,7 @@ def check_duplicates(news_list: List[str], pipeline_state: Dict[str, Any] = None
     logger.debug("News list: {}", news_list)
     link_list = schemas.LinkList(links=news_list)
     try:
-        response = requests.post(f"{BASE_URL}/api/news/analyze", json=link_list.model_dump())
+        response = http_client.post(f"{BASE_URL}/api/news/analyze", json=link_list.model_dump(), timeout=http_client.BACKEND_TIMEOUT)
         if response.status_code == 200:
             unique_ids = response.json().get("unique_news_ids", [])
             logger.info("Found {} unique news items", len(unique_ids))
@@ -198,7 +267,7 @@ def summarize_news(pipeline_state: Dict[str, Any] = None) -> List[str]:
     send_telegram_notification("🔄 Avvio processo di sintesi...")
     logger.info("Starting summarization process...")
     try:
-        response = requests.get(f"{BASE_URL}/summarize_news")
+        response = http_client.get(f"{BASE_URL}/summarize_news", timeout=http_client.BACKEND_TIMEOUT)
         if response.status_code == 200:
             logger.info("Successfully summarized news")
             summarized_ids = response.json().get("summarized_news_IDs", [])
@@ -257,7 +326,7 @@ def reconstruct_articles(news_ids: List[int], pipeline_state: Dict[str, Any] = N
     
     for news_id in news_ids:
         try:
-            response = requests.post(f"{BASE_URL}/api/news/reconstruct/{news_id}")
+            response = http_client.post(f"{BASE_URL}/api/news/reconstruct/{news_id}", timeout=http_client.BACKEND_TIMEOUT)
             if response.status_code == 200:
                 success_count += 1
                 logger.info("Successfully reconstructed article ID: {}", news_id)
@@ -314,7 +383,7 @@ def publish_news(news_ids: List[int], pipeline_state: Dict[str, Any] = None) ->
     
     for news_id in news_ids:
         try:
-            response = requests.post(f"{BASE_URL}/api/news/publish/{news_id}")
+            response = http_client.post(f"{BASE_URL}/api/news/publish/{news_id}", timeout=http_client.BACKEND_TIMEOUT)
             if response.status_code == 200:
                 published_count += 1
                 logger.info("Successfully published news ID: {}", news_id)
@@ -11,7 +11,7 @@ import os
 import sys
 import time
 from pathlib import Path
-from typing import Iterable
+from typing import Callable, Iterable
 
 from .logger import logger
 
@@ -22,12 +22,18 @@ if str(_SKILL_SCRIPTS_DIR) not in sys.path:
 from run_agent_sdk_json import run_skill  # type: ignore  # noqa: E402
 
 
-async def generate_article_for_news(news_item, interlinks: Iterable[str] | None = None) -> dict:
+async def generate_article_for_news(
+    news_item,
+    interlinks: Iterable[str] | None = None,
+    *,
+    on_event: Callable[[dict], None] | None = None,
+) -> dict:
     """Esegue la skill su una news row del backend e ritorna il payload JSON.
 
     Args:
         news_item: riga ORM `models.New` (serve solo `news_item.url`).
         interlinks: URL interni assoluti da suggerire come interlink nell'articolo.
+        on_event: callback per gli eventi di avanzamento della skill (stage, tool call).
 
     Returns:
         dict con la struttura definita da `generate_json_output.build_seo_article_payload`
@@ -54,6 +60,7 @@ async def generate_article_for_news(news_item, interlinks: Iterable[str] | None
             livello=None,
             interlink=interlink_list,
             target=None,
+            on_event=on_event,
         )
     except Exception as e:
         logger.exception("[skill_runner] skill fallita dopo {:.1f}s: {}",
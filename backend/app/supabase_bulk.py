@@ -0,0 +1,206 @@
+"""Scritture Supabase a blocchi per le pipeline interpelli e selezione personale.
+
+Le pipeline scrivevano una riga alla volta: per ogni sub-link espanso una
+``select ... eq(interpello_link)`` di dedup seguita da una ``insert``, per
+ogni enrichment e ogni articolo una ``update ... eq(id)``. Sono due (o una)
+richieste HTTP verso PostgREST per riga.
+
+`BulkWriter` accumula le scritture di una tabella e le invia a blocchi di
+`SUPABASE_BULK_CHUNK` righe:
+
+- `stage_insert(row)`: righe nuove con dedup su `dedup_on`; al flush i
+  valori gia' presenti vengono cercati con ``in_`` (a blocchi di
+  `SUPABASE_BULK_LOOKUP_CHUNK`, i valori finiscono nella query string) e le
+  righe rimaste, senza doppioni nel blocco stesso, vanno in ``insert``;
+- `stage_fields(row_id, fields)`: campi diversi per ogni riga (output LLM).
+  Al flush le righe vengono rilette con ``select * in_(id)`` e scritte con
+  ``upsert`` sulla chiave primaria applicando solo `fields`
+  (`upsert_current`): la snapshot presa all'inizio dello stage, vecchia di
+  tutte le chiamate LLM fatte nel frattempo, non viene mai riscritta;
+- `stage_update(row_id, fields)`: stessi `fields` per piu' id (transizioni
+  di stato), una ``update ... in_(id)`` per gruppo.
+
+Con `expect` (es. ``{"status": "enriched"}``) le righe che nel frattempo
+non soddisfano piu' la condizione, perche' un'altra run le ha gia'
+lavorate, non vengono toccate ne' da `stage_fields` ne' da `stage_update`.
+
+Ogni richiesta viene loggata con righe e latenza; all'uscita dal blocco
+``with`` il writer svuota i buffer e logga il totale.
+"""
+from __future__ import annotations
+
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .logger import logger
+
+SUPABASE_BULK_CHUNK = int(os.getenv("SUPABASE_BULK_CHUNK", "200"))
+# I valori di `in_` viaggiano nella query string: blocchi piu' piccoli per gli URL lunghi
+SUPABASE_BULK_LOOKUP_CHUNK = int(os.getenv("SUPABASE_BULK_LOOKUP_CHUNK", "100"))
+
+
+class BulkWriter:
+    """Buffer di scritture su una tabella Supabase, inviate a blocchi."""
+
+    def __init__(
+        self,
+        client,
+        table: str,
+        dedup_on: Optional[str] = None,
+        chunk_size: int = SUPABASE_BULK_CHUNK,
+        expect: Optional[dict] = None,
+    ) -> None:
+        self.client = client
+        self.table = table
+        self.dedup_on = dedup_on
+        self.chunk_size = max(1, chunk_size)
+        self.expect = expect or {}
+        self.inserted = 0
+        self.upserted = 0
+        self.updated = 0
+        self.batches = 0
+        self.seconds = 0.0
+        self._inserts: List[dict] = []
+        self._changes: Dict[Any, dict] = {}
+        self._updates: Dict[Tuple, List[Any]] = {}
+
+    def __enter__(self) -> "BulkWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.flush()
+        else:
+            # Le righe gia' pronte (es. articoli generati) non vanno perse per un errore a valle
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("[SUPABASE BULK] {}: flush fallito dopo un errore: {}", self.table, e)
+        if self.batches:
+            logger.info(
+                "[SUPABASE BULK] {}: {} inserite, {} upsert, {} aggiornate in {} batch ({:.0f} ms, media {:.0f} ms/batch)",
+                self.table, self.inserted, self.upserted, self.updated, self.batches,
+                self.seconds * 1000, self.seconds * 1000 / self.batches,
+            )
+
+    # ── richieste ──────────────────────────────────────────────────────────
+
+    def _execute(self, op: str, query, rows: int):
+        started = time.perf_counter()
+        resp = query.execute()
+        elapsed = time.perf_counter() - started
+        self.batches += 1
+        self.seconds += elapsed
+        logger.info("[SUPABASE BULK] {} {}: {} righe in {:.0f} ms", self.table, op, rows, elapsed * 1000)
+        return resp
+
+    def existing(self, column: str, values: Iterable[Any]) -> Set[Any]:
+        """Valori di `column` gia' presenti in tabella tra quelli richiesti."""
+        values = list(dict.fromkeys(v for v in values if v))
+        found: Set[Any] = set()
+        for start in range(0, len(values), SUPABASE_BULK_LOOKUP_CHUNK):
+            chunk = values[start:start + SUPABASE_BULK_LOOKUP_CHUNK]
+            resp = self._execute(
+                "select in_",
+                self.client.table(self.table).select(column).in_(column, chunk),
+                len(chunk),
+            )
+            found.update(row[column] for row in (resp.data or []))
+        return found
+
+    def insert_missing(self, rows: List[dict]) -> int:
+        """Inserisce le righe il cui `dedup_on` non esiste ancora. Ritorna le righe inserite."""
+        if not rows:
+            return 0
+        if self.dedup_on:
+            known = self.existing(self.dedup_on, (row.get(self.dedup_on) for row in rows))
+            new_rows = []
+            for row in rows:
+                key = row.get(self.dedup_on)
+                if key in known:
+                    continue
+                if key:
+                    known.add(key)
+                new_rows.append(row)
+            rows = new_rows
+        inserted = 0
+        for start in range(0, len(rows), self.chunk_size):
+            chunk = rows[start:start + self.chunk_size]
+            resp = self._execute("insert", self.client.table(self.table).insert(chunk), len(chunk))
+            inserted += len(resp.data) if resp.data else 0
+        self.inserted += inserted
+        return inserted
+
+    def upsert(self, rows: List[dict]) -> int:
+        """Upsert a blocchi di righe complete (chiave primaria inclusa)."""
+        for start in range(0, len(rows), self.chunk_size):
+            chunk = rows[start:start + self.chunk_size]
+            self._execute("upsert", self.client.table(self.table).upsert(chunk), len(chunk))
+        self.upserted += len(rows)
+        return len(rows)
+
+    def upsert_current(self, changes: Dict[Any, dict], expect: Optional[dict] = None, column: str = "id") -> List[Any]:
+        """Upsert di `changes` (id -> campi) sulle righe lette ora. Ritorna gli id scritti."""
+        ids = list(changes)
+        rows: List[dict] = []
+        for start in range(0, len(ids), SUPABASE_BULK_LOOKUP_CHUNK):
+            chunk = ids[start:start + SUPABASE_BULK_LOOKUP_CHUNK]
+            resp = self._execute("select in_", self.client.table(self.table).select("*").in_(column, chunk), len(chunk))
+            for row in resp.data or []:
+                if expect and any(row.get(key) != value for key, value in expect.items()):
+                    continue
+                rows.append({**row, **changes[row[column]]})
+        skipped = len(ids) - len(rows)
+        if skipped:
+            logger.info("[SUPABASE BULK] {}: {} righe cambiate nel frattempo, non riscritte", self.table, skipped)
+        self.upsert(rows)
+        return [row[column] for row in rows]
+
+    def update_in(self, fields: dict, ids: List[Any], column: str = "id") -> int:
+        """Stessi `fields` su tutti gli `ids`, una update per blocco."""
+        for start in range(0, len(ids), SUPABASE_BULK_LOOKUP_CHUNK):
+            chunk = ids[start:start + SUPABASE_BULK_LOOKUP_CHUNK]
+            query = self.client.table(self.table).update(fields).in_(column, chunk)
+            for key, value in self.expect.items():
+                query = query.eq(key, value)
+            self._execute("update in_", query, len(chunk))
+        self.updated += len(ids)
+        return len(ids)
+
+    # ── buffer ─────────────────────────────────────────────────────────────
+
+    def stage_insert(self, row: dict) -> None:
+        self._inserts.append(row)
+        if len(self._inserts) >= self.chunk_size:
+            self._flush_inserts()
+
+    def stage_fields(self, row_id: Any, fields: dict) -> None:
+        self._changes[row_id] = {**self._changes.get(row_id, {}), **fields}
+        if len(self._changes) >= self.chunk_size:
+            self._flush_changes()
+
+    def stage_update(self, row_id: Any, fields: dict) -> None:
+        key = tuple(sorted(fields.items()))
+        ids = self._updates.setdefault(key, [])
+        ids.append(row_id)
+        if len(ids) >= SUPABASE_BULK_LOOKUP_CHUNK:
+            self.update_in(dict(key), self._updates.pop(key))
+
+    def _flush_inserts(self) -> None:
+        rows, self._inserts = self._inserts, []
+        self.insert_missing(rows)
+
+    def _flush_changes(self) -> None:
+        changes, self._changes = self._changes, {}
+        self.upsert_current(changes, expect=self.expect)
+
+    def flush(self) -> None:
+        """Invia tutte le scritture in attesa (update, campi per riga, insert)."""
+        updates, self._updates = self._updates, {}
+        for key, ids in updates.items():
+            self.update_in(dict(key), ids)
+        if self._changes:
+            self._flush_changes()
+        if self._inserts:
+            self._flush_inserts()
@@ -0,0 +1,160 @@
+"""Cache della sintesi TTS indicizzata per hash del testo normalizzato.
+
+`publish_to_cms` rilancia `generate_and_save_audio` ad ogni pubblicazione,
+anche quando titolo e contenuto non sono cambiati (ad esempio nel ramo
+idempotente della bozza creata dalla skill). Qui la sintesi viene
+memorizzata a due livelli, entrambi su S3:
+
+- **chunk**: ogni chunk di testo de-markdownato viene salvato come segmento
+  MP3 in `audios/segments/<sha256>.mp3`, con chiave = hash di impronta voce
+  + testo. Quando un articolo viene rivisto solo i chunk modificati vengono
+  risintetizzati, gli altri vengono riletti dal bucket;
+- **articolo**: l'MP3 finale `audios/audio_<id>.mp3` porta nei metadati
+  (`x-amz-meta-tts-hash`) l'hash della sequenza di chunk. Se coincide con
+  quello del testo corrente l'audio e' gia' aggiornato e non si rifa' nulla.
+
+I segmenti non piu' referenziati (paragrafi riscritti, articoli
+rigenerati) resterebbero nel bucket per sempre: `maybe_prune_segments`,
+al massimo ogni `TTS_SEGMENT_PRUNE_HOURS`, elimina quelli piu' vecchi di
+`TTS_SEGMENT_MAX_AGE_DAYS`. Servono solo per le revisioni, che arrivano a
+ridosso della pubblicazione; un articolo invariato viene riconosciuto
+dall'hash nei metadati dell'MP3 finale senza leggere i segmenti.
+
+L'impronta della voce (`fingerprint`) comprende la serializzazione di voce
+e AudioConfig: cambiare voce, velocita' o encoding invalida tutta la cache.
+`TTS_CACHE_VERSION` permette di invalidarla a mano.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional
+
+from botocore.exceptions import ClientError
+
+from . import s3_storage
+from .logger import logger
+
+TTS_CACHE_ENABLED = os.getenv("TTS_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+TTS_CACHE_VERSION = os.getenv("TTS_CACHE_VERSION", "1")
+TTS_SEGMENT_PREFIX = os.getenv("TTS_SEGMENT_PREFIX", "audios/segments/")
+TTS_SEGMENT_MAX_AGE_DAYS = int(os.getenv("TTS_SEGMENT_MAX_AGE_DAYS", "30"))
+TTS_SEGMENT_PRUNE_HOURS = float(os.getenv("TTS_SEGMENT_PRUNE_HOURS", "24"))
+
+# Chiave dei metadati S3 (esposta come x-amz-meta-tts-hash)
+_ARTICLE_HASH_META = "tts-hash"
+# delete_objects accetta al massimo 1000 chiavi per richiesta
+_DELETE_BATCH = 1000
+
+_prune_lock = threading.Lock()
+_last_prune: Optional[float] = None
+
+
+def fingerprint(*messages) -> str:
+    """Impronta stabile dei parametri di sintesi (messaggi proto-plus di Google TTS)."""
+    h = hashlib.sha256(TTS_CACHE_VERSION.encode())
+    for message in messages:
+        h.update(b"\0")
+        h.update(type(message).serialize(message))
+    return h.hexdigest()
+
+
+def chunk_hash(voice_fingerprint: str, text: str) -> str:
+    return hashlib.sha256(f"{voice_fingerprint}\0{text}".encode("utf-8")).hexdigest()
+
+
+def article_hash(chunk_hashes: Iterable[str]) -> str:
+    """Hash dell'articolo: dipende dalla sequenza ordinata dei chunk."""
+    return hashlib.sha256("\n".join(chunk_hashes).encode()).hexdigest()
+
+
+def segment_key(digest: str) -> str:
+    return f"{TTS_SEGMENT_PREFIX}{digest}.mp3"
+
+
+def _is_not_found(error: ClientError) -> bool:
+    code = error.response.get("Error", {}).get("Code", "")
+    return code in ("404", "NoSuchKey", "NotFound")
+
+
+def stored_article_hash(key: str) -> Optional[str]:
+    """Hash del testo con cui e' stato generato l'audio in `key`, se presente."""
+    if not TTS_CACHE_ENABLED:
+        return None
+    try:
+        response = s3_storage.get_s3_client().head_object(Bucket=s3_storage.bucket_name(), Key=key)
+    except ClientError as e:
+        if not _is_not_found(e):
+            logger.warning("[tts_cache] head_object {} fallito: {}", key, e)
+        return None
+    return (response.get("Metadata") or {}).get(_ARTICLE_HASH_META)
+
+
+def article_metadata(digest: str) -> dict:
+    """Metadati da associare all'MP3 finale."""
+    return {_ARTICLE_HASH_META: digest}
+
+
+def load_segment(digest: str) -> Optional[bytes]:
+    """Segmento MP3 gia' sintetizzato per questo chunk, se esiste."""
+    if not TTS_CACHE_ENABLED:
+        return None
+    key = segment_key(digest)
+    try:
+        response = s3_storage.get_s3_client().get_object(Bucket=s3_storage.bucket_name(), Key=key)
+        return response["Body"].read()
+    except ClientError as e:
+        if not _is_not_found(e):
+            logger.warning("[tts_cache] lettura segmento {} fallita: {}", key, e)
+        return None
+
+
+def store_segment(digest: str, audio: bytes) -> None:
+    """Salva il segmento; un errore qui non deve far fallire la sintesi."""
+    if not TTS_CACHE_ENABLED or not audio:
+        return
+    try:
+        s3_storage.put_bytes(segment_key(digest), audio, "audio/mpeg")
+    except Exception as e:
+        logger.warning("[tts_cache] salvataggio segmento {} fallito: {}", digest, e)
+
+
+def prune_segments(max_age_days: int = TTS_SEGMENT_MAX_AGE_DAYS) -> int:
+    """Elimina i segmenti piu' vecchi di `max_age_days`. Ritorna quanti ne ha eliminati."""
+    client = s3_storage.get_s3_client()
+    bucket = s3_storage.bucket_name()
+    cutoff = datetime.now(timezone.utc) - timedelta(days=max_age_days)
+    expired = []
+    for page in client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=TTS_SEGMENT_PREFIX):
+        expired.extend(
+            {"Key": obj["Key"]} for obj in page.get("Contents", ()) if obj["LastModified"] < cutoff
+        )
+    for start in range(0, len(expired), _DELETE_BATCH):
+        client.delete_objects(
+            Bucket=bucket, Delete={"Objects": expired[start:start + _DELETE_BATCH], "Quiet": True},
+        )
+    return len(expired)
+
+
+def maybe_prune_segments() -> None:
+    """`prune_segments` al massimo una volta ogni `TTS_SEGMENT_PRUNE_HOURS` per processo."""
+    global _last_prune
+    if not TTS_CACHE_ENABLED or TTS_SEGMENT_MAX_AGE_DAYS <= 0:
+        return
+    if not _prune_lock.acquire(blocking=False):
+        return
+    try:
+        now = time.monotonic()
+        if _last_prune is not None and now - _last_prune < TTS_SEGMENT_PRUNE_HOURS * 3600:
+            return
+        _last_prune = now
+        removed = prune_segments()
+        if removed:
+            logger.info("[tts_cache] {} segmenti piu' vecchi di {} giorni eliminati", removed, TTS_SEGMENT_MAX_AGE_DAYS)
+    except Exception as e:
+        logger.warning("[tts_cache] pulizia segmenti fallita: {}", e)
+    finally:
+        _prune_lock.release()
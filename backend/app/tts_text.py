@@ -0,0 +1,125 @@
+"""Preparazione del testo per la sintesi vocale (de-markdown e chunking).
+
+La versione originale in `convert_text_to_audio` applicava una ventina di
+`re.sub` in sequenza sull'intero articolo e, per restare sotto il limite di
+5000 byte di Google TTS, ricodificava in UTF-8 prefissi sempre piu' lunghi
+del testo ad ogni tentativo di taglio (costo quadratico sui testi lunghi).
+
+Qui:
+
+- `clean` scorre il testo una riga alla volta: marcatori di blocco
+  (titoli, citazioni, elenchi, separatori) tolti con un solo match ancorato,
+  markup inline (grassetto, corsivo, barrato, codice, link, immagini)
+  rimosso con un'unica regex ad alternative; le righe vengono unite
+  aggiungendo un punto dove manca la punteggiatura e gli spazi attorno
+  alla punteggiatura sono sistemati con un ultimo passaggio. Tutti i
+  pattern sono precompilati;
+- `split` codifica il testo una sola volta e cerca i punti di taglio
+  (fine frase, spazio, confine di carattere UTF-8) direttamente sui byte
+  della finestra corrente: costo lineare nella lunghezza del testo.
+
+Rispetto alla pipeline originale l'output differisce solo nei casi in cui
+quella produceva artefatti (es. `![alt](url)` diventava `!alt`, dopo ogni
+paragrafo chiuso da un punto compariva `..`). `python bench_tts_text.py` confronta le due
+versioni su articoli reali.
+"""
+from __future__ import annotations
+
+import re
+from typing import List
+
+# Google TTS accetta fino a 5000 byte per richiesta: margine di sicurezza
+MAX_CHUNK_BYTES = 4800
+
+_PUNCTUATION = ".!?;:"
+
+# Separatori orizzontali: la riga viene scartata
+_RULE_RE = re.compile(r'(?:-{3,}|\*{3,}|_{3,})\s*')
+# Marcatori di inizio riga: titoli/citazioni (anche annidati) e marcatore d'elenco
+_LINE_PREFIX_RE = re.compile(r'(?:#+\s*|>\s*)*(?:[*\-]\s+|\d+\.\s+)?')
+# Il lookahead iniziale fa scartare subito le posizioni senza marcatori
+_INLINE_RE = re.compile(
+    r'(?=[!\[*_~`])(?:'
+    r'!?\[(?P<link>[^\]\n]*)\]\([^)\n]*\)'
+    r'|\*\*(?P<bold>.+?)\*\*'
+    r'|__(?P<ubold>.+?)__'
+    r'|~~(?P<strike>.+?)~~'
+    r'|`+(?P<code>[^`\n]*)`+'
+    r'|\*(?P<em>[^*\n]+?)\*'
+    r'|_(?P<uem>[^_\n]+?)_)'
+)
+# Spazio mancante dopo la punteggiatura (es. "fine.Inizio")
+_MISSING_SPACE_RE = re.compile(r'([.!?;:])(?=[^\s.!?;:])')
+# Fine frase: punteggiatura forte seguita da spazio (byte ASCII, il taglio e' sicuro)
+_SENTENCE_ENDS = (b'. ', b'! ', b'? ')
+_WHITESPACE_BYTES = b' \t\n\r\f\v'
+
+
+def _inline_replacement(match: re.Match) -> str:
+    inner = match.group(match.lastgroup)
+    # Il markup annidato (es. corsivo dentro grassetto) viene tolto ricorsivamente
+    if match.lastgroup != 'code' and ('*' in inner or '_' in inner or '~' in inner or '[' in inner):
+        return _INLINE_RE.sub(_inline_replacement, inner)
+    return inner
+
+
+def clean(text: str) -> str:
+    """De-markdown e normalizzazione della punteggiatura per la sintesi vocale."""
+    parts: List[str] = []
+    for line in (text or '').splitlines():
+        line = line.strip()
+        if not line or _RULE_RE.fullmatch(line):
+            continue
+        line = line[_LINE_PREFIX_RE.match(line).end():]
+        line = _INLINE_RE.sub(_inline_replacement, line).strip()
+        if not line or line.startswith('```'):
+            continue
+        if parts:
+            parts.append(' ' if parts[-1][-1] in _PUNCTUATION else '. ')
+        parts.append(line)
+    # Spazi multipli collassati, niente spazi prima della punteggiatura
+    joined = ' '.join(''.join(parts).split())
+    for mark in _PUNCTUATION:
+        if ' ' + mark in joined:
+            joined = joined.replace(' ' + mark, mark)
+    return _MISSING_SPACE_RE.sub(r'\1 ', joined)
+
+
+def _char_boundary(data: bytes, pos: int) -> int:
+    """Arretra `pos` fino all'inizio di un carattere UTF-8."""
+    while pos > 0 and (data[pos] & 0xC0) == 0x80:
+        pos -= 1
+    return pos
+
+
+def split(text: str, max_bytes: int = MAX_CHUNK_BYTES) -> List[str]:
+    """Chunk di al massimo `max_bytes` byte in UTF-8, tagliati a fine frase se possibile.
+
+    Stesse regole di taglio della versione originale (fine frase se oltre il
+    30% della finestra, altrimenti ultimo spazio, altrimenti taglio netto),
+    ma il testo viene codificato una volta sola e le ricerche avvengono sui
+    byte della finestra corrente.
+    """
+    data = text.strip().encode('utf-8')
+    chunks: List[str] = []
+    pos, n = 0, len(data)
+    while pos < n:
+        end = pos + max_bytes
+        if end >= n:
+            end = n
+        else:
+            cut = max(data.rfind(mark, pos, end) for mark in _SENTENCE_ENDS)
+            if cut > pos and cut - pos > (end - pos) * 0.3:
+                end = cut + 1
+            else:
+                space = data.rfind(b' ', pos, end)
+                end = space if space > pos else _char_boundary(data, end)
+                if end <= pos:
+                    end = pos + max_bytes
+        chunk = data[pos:end].decode('utf-8').strip()
+        if chunk:
+            chunks.append(chunk)
+        pos = end
+        while pos < n and data[pos] in _WHITESPACE_BYTES:
+            pos += 1
+    return chunks
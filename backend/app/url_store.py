@@ -0,0 +1,193 @@
+"""Store dello stato degli URL della pipeline news (sostituisce to_scrape.json).
+
+Ogni URL visto dallo scraping ha una riga nella tabella `scrape_urls` del DB
+SQLite `news` con lo stato corrente:
+
+    ""             -> appena scoperto, in attesa di analisi duplicati
+    to_summarize   -> selezionato da /api/news/analyze
+    summarized     -> riassunto e salvato in `news`
+    reconstructed  -> ricostruito (flusso legacy /reconstruct_article)
+    failed         -> scraping o riassunto falliti
+
+Le lookup passano dall'indice univoco su `url`, le transizioni sono UPDATE
+condizionali (atomiche anche con piu' richieste concorrenti) e gli inserimenti
+sono bulk `INSERT ... ON CONFLICT`, quindi il costo non cresce piu' con il
+numero di URL mai visti come accadeva riscrivendo l'intero file JSON.
+"""
+from __future__ import annotations
+
+import json
+import os
+from typing import Iterable, List, Set
+
+from sqlalchemy import update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from . import models
+from .database import SessionLocal
+from .logger import logger
+
+STATUS_NEW = ""
+STATUS_TO_SUMMARIZE = "to_summarize"
+STATUS_SUMMARIZED = "summarized"
+STATUS_RECONSTRUCTED = "reconstructed"
+STATUS_FAILED = "failed"
+
+# SQLite limita il numero di parametri per statement: lavoriamo a blocchi.
+_CHUNK_SIZE = 500
+
+
+def _chunks(items: List[str]) -> Iterable[List[str]]:
+    for i in range(0, len(items), _CHUNK_SIZE):
+        yield items[i : i + _CHUNK_SIZE]
+
+
+def _dedup(urls: Iterable[str]) -> List[str]:
+    """Rimuove duplicati e valori vuoti preservando l'ordine."""
+    return list(dict.fromkeys(u for u in urls if u))
+
+
+def known_urls(db: Session, urls: Iterable[str]) -> Set[str]:
+    """Ritorna il sottoinsieme di `urls` gia' presente nello store."""
+    found: Set[str] = set()
+    for chunk in _chunks(_dedup(urls)):
+        rows = db.query(models.ScrapeUrl.url).filter(models.ScrapeUrl.url.in_(chunk)).all()
+        found.update(row.url for row in rows)
+    return found
+
+
+def get_status(db: Session, url: str) -> str | None:
+    """Stato corrente di un URL, None se mai visto."""
+    row = db.query(models.ScrapeUrl.status).filter(models.ScrapeUrl.url == url).first()
+    return row.status if row else None
+
+
+def urls_with_status(db: Session, status: str) -> List[str]:
+    """URL in un dato stato, in ordine di inserimento."""
+    rows = (
+        db.query(models.ScrapeUrl.url)
+        .filter(models.ScrapeUrl.status == status)
+        .order_by(models.ScrapeUrl.id)
+        .all()
+    )
+    return [row.url for row in rows]
+
+
+def _insert_missing(db: Session, rows: List[dict]) -> int:
+    """INSERT bulk delle righe {url, status} ignorando gli URL gia' presenti."""
+    inserted = 0
+    for i in range(0, len(rows), _CHUNK_SIZE):
+        stmt = sqlite_insert(models.ScrapeUrl).values(
+            rows[i : i + _CHUNK_SIZE]
+        ).on_conflict_do_nothing(index_elements=["url"])
+        inserted += db.execute(stmt).rowcount or 0
+    return inserted
+
+
+def add_urls(db: Session, urls: Iterable[str], status: str = STATUS_NEW, commit: bool = True) -> int:
+    """Inserisce in bulk gli URL non ancora presenti; quelli noti restano invariati.
+
+    Ritorna il numero di righe effettivamente inserite.
+    """
+    inserted = _insert_missing(db, [{"url": url, "status": status} for url in _dedup(urls)])
+    if commit:
+        db.commit()
+    return inserted
+
+
+def set_status(db: Session, urls: Iterable[str], status: str, commit: bool = True) -> int:
+    """Upsert bulk: porta tutti gli `urls` a `status`, inserendo quelli mancanti."""
+    count = 0
+    for chunk in _chunks(_dedup(urls)):
+        stmt = sqlite_insert(models.ScrapeUrl).values(
+            [{"url": url, "status": status} for url in chunk]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["url"],
+            set_={"status": stmt.excluded.status, "updated_at": func.now()},
+        )
+        count += db.execute(stmt).rowcount or 0
+    if commit:
+        db.commit()
+    return count
+
+
+def transition(
+    db: Session,
+    url: str,
+    to_status: str,
+    from_status: str | None = None,
+    commit: bool = True,
+) -> bool:
+    """Transizione atomica di un singolo URL.
+
+    Con `from_status` l'UPDATE avviene solo se lo stato corrente coincide:
+    due richieste concorrenti non possono far avanzare due volte lo stesso URL.
+    Ritorna True se la riga e' stata aggiornata.
+    """
+    stmt = update(models.ScrapeUrl).where(models.ScrapeUrl.url == url)
+    if from_status is not None:
+        stmt = stmt.where(models.ScrapeUrl.status == from_status)
+    result = db.execute(stmt.values(status=to_status, updated_at=func.now()))
+    if commit:
+        db.commit()
+    return (result.rowcount or 0) == 1
+
+
+def transition_all(db: Session, from_status: str, to_status: str, commit: bool = True) -> int:
+    """Porta tutti gli URL da `from_status` a `to_status` in un solo UPDATE."""
+    result = db.execute(
+        update(models.ScrapeUrl)
+        .where(models.ScrapeUrl.status == from_status)
+        .values(status=to_status, updated_at=func.now())
+    )
+    if commit:
+        db.commit()
+    return result.rowcount or 0
+
+
+def migrate_json_file(path: str = "to_scrape.json") -> int:
+    """Importa una volta sola il vecchio `to_scrape.json` nello store.
+
+    Gli URL gia' presenti nel DB mantengono il loro stato. A import completato
+    il file viene rinominato in `<path>.migrated`, cosi' gli avvii successivi
+    non lo rileggono. Ritorna il numero di URL importati.
+    """
+    if not os.path.exists(path):
+        return 0
+    try:
+        with open(path, "r") as f:
+            to_scrape = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.error("[url_store] Impossibile leggere {} per la migrazione: {}", path, e)
+        return 0
+    if not isinstance(to_scrape, dict):
+        logger.error("[url_store] Formato inatteso in {}, migrazione saltata", path)
+        return 0
+
+    rows = [
+        {"url": url, "status": status or STATUS_NEW}
+        for url, status in to_scrape.items()
+        if url
+    ]
+
+    db = SessionLocal()
+    try:
+        imported = _insert_missing(db, rows)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error("[url_store] Migrazione di {} fallita: {}", path, e)
+        return 0
+    finally:
+        db.close()
+
+    try:
+        os.replace(path, f"{path}.migrated")
+    except FileNotFoundError:
+        # Un altro worker uvicorn ha completato la stessa migrazione.
+        pass
+    logger.info("[url_store] Migrati {} URL da {} ({} nel file)", imported, path, len(to_scrape))
+    return imported
@@ -54,6 +54,12 @@ The facts should be concrete and specific to the news item. Facts need to be sho
 , with the less amount of well-done phrases and more like "Someone did this"
 , "Response was this". Everything in your response should be in Italian."""
 
+# Variante a chiamata singola: riassunto + categoria nello stesso response_model
+# (schemas.NewsWithCategory), evita il secondo round trip di classificazione.
+SUMMARIZING_AND_CLASSIFICATION_PROMPT = f"""{SUMMARIZING_PROMPT}
+
+Also fill the `category` field. {CLASSIFICATION_PROMPT.strip()}"""
+
 
 RECONSTRUCTING_PROMPT = """
 Given the provided information by the user, reconstruct the news article. 
@@ -0,0 +1,166 @@
+"""
+Micro-benchmark della preparazione del testo TTS: pipeline originale di
+convert_text_to_audio (re.sub in sequenza + chunking a prefissi) contro
+app/tts_text.py (pattern precompilati + chunking lineare).
+
+Gli articoli vengono letti da Supabase (tabella articles, titolo + content,
+lo stesso testo passato a generate_and_save_audio) oppure da file markdown.
+
+Uso (dalla cartella backend/):
+    python bench_tts_text.py                      # ultimi 50 articoli da Supabase
+    python bench_tts_text.py --limit 200 --repeat 20
+    python bench_tts_text.py --files articoli/*.md
+"""
+import argparse
+import re
+import statistics
+import time
+
+from app import tts_text
+
+
+def legacy_clean(text: str) -> str:
+    """Pipeline originale di convert_text_to_audio (riferimento)."""
+    # Simple de-markdowning, corrected regex patterns and replacements
+    processed_text = re.sub(r'^#+\s*', '', text, flags=re.MULTILINE)
+    processed_text = re.sub(r'\*\*(.*?)\*\*', r'\1', processed_text)
+    processed_text = re.sub(r'__(.*?)__', r'\1', processed_text)
+    processed_text = re.sub(r'\*(.*?)\*', r'\1', processed_text)
+    processed_text = re.sub(r'_(.*?)_', r'\1', processed_text)
+    processed_text = re.sub(r'~~(.*?)~~', r'\1', processed_text)
+    processed_text = re.sub(r'`(.*?)`', r'\1', processed_text)
+    processed_text = re.sub(r'```[a-zA-Z]*\n(.*?)\n```', r'\1', processed_text, flags=re.DOTALL)
+    processed_text = re.sub(r'\[(.*?)\]\((.*?)\)', r'\1', processed_text)
+    processed_text = re.sub(r'!\[(.*?)\]\((.*?)\)', r'\1', processed_text)
+    processed_text = re.sub(r'^\*\s+', '', processed_text, flags=re.MULTILINE)
+    processed_text = re.sub(r'^-\s+', '', processed_text, flags=re.MULTILINE)
+    processed_text = re.sub(r'^\d+\.\s+', '', processed_text, flags=re.MULTILINE)
+    processed_text = re.sub(r'^-{3,}\s*$', '', processed_text, flags=re.MULTILINE)
+    processed_text = re.sub(r'^\*{3,}\s*$', '', processed_text, flags=re.MULTILINE)
+    processed_text = re.sub(r'^_{3,}\s*$', '', processed_text, flags=re.MULTILINE)
+    processed_text = re.sub(r'^>\s*', '', processed_text, flags=re.MULTILINE)
+
+    # Intelligent newline handling to create better sentence breaks for TTS
+    # 1. Consolidate multiple newlines (more than 2) into a double newline (paragraph-like separation)
+    processed_text = re.sub(r'\n{3,}', '\n\n', processed_text)
+    # 2. For remaining double newlines (paragraph breaks), replace with a period and two spaces if no punctuation.
+    processed_text = re.sub(r'(?<![.!?;:])\n\n', '.  ', processed_text) 
+    # 3. For single newlines, replace with a period and a space if no punctuation.
+    processed_text = re.sub(r'(?<![.!?;:])\n', '. ', processed_text)
+    # 4. Clean up: remove leading/trailing whitespace from lines that might have become empty.
+    processed_text = '\n'.join([line.strip() for line in processed_text.split('\n') if line.strip()])
+    # 5. Consolidate multiple spaces into a single space.
+    processed_text = re.sub(r'\s{2,}', ' ', processed_text).strip()
+    # 6. Ensure space after common punctuation if missing, to help TTS phrasing.
+    processed_text = re.sub(r'([.!?;:])(?=[^\s])', r'\1 ', processed_text)
+    # 7. Remove any space before punctuation
+    processed_text = re.sub(r'\s+([.!?;:])', r'\1', processed_text).strip()
+
+    return processed_text
+
+
+def legacy_split(full_text: str) -> list[str]:
+    """Chunking originale: ricodifica prefissi crescenti ad ogni taglio."""
+    # Split text into chunks that stay under 5000 bytes (Google TTS limit)
+    MAX_BYTES = 4800  # margine di sicurezza
+    text_parts: list[str] = []
+    remaining = full_text
+    while remaining:
+        end = len(remaining)
+        while len(remaining[:end].encode('utf-8')) > MAX_BYTES:
+            prev_end = end
+            # Try to cut at a sentence boundary
+            cut = remaining.rfind('. ', 0, end)
+            if cut > 0 and cut > end * 0.3:
+                end = cut + 1
+            else:
+                space_cut = remaining.rfind(' ', 0, end)
+                end = space_cut if space_cut > 0 else int(end * 0.8)
+            # Safety: force progress to avoid infinite loop
+            if end >= prev_end:
+                end = int(prev_end * 0.8)
+            if end <= 0:
+                end = 1
+                break
+        text_parts.append(remaining[:end])
+        remaining = remaining[end:].lstrip()
+    return text_parts
+
+
+def load_articles(limit: int) -> list[str]:
+    from app.database import get_supabase_client
+
+    rows = (
+        get_supabase_client().table("articles").select("title, content")
+        .order("id", desc=True).limit(limit).execute().data or []
+    )
+    return [f"Titolo: {r.get('title') or ''}\n\n{r.get('content') or ''}" for r in rows if r.get("content")]
+
+
+def load_files(paths: list[str]) -> list[str]:
+    texts = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            texts.append(f.read())
+    return texts
+
+
+def timeit(fn, texts: list[str], repeat: int) -> list[float]:
+    """Tempo per articolo (ms), mediana sulle ripetizioni."""
+    per_article = []
+    for text in texts:
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn(text)
+            samples.append((time.perf_counter() - start) * 1000)
+        per_article.append(statistics.median(samples))
+    return per_article
+
+
+def report(label: str, legacy_ms: list[float], new_ms: list[float]) -> None:
+    total_legacy, total_new = sum(legacy_ms), sum(new_ms)
+    print(f"{label}")
+    print(f"  legacy : totale {total_legacy:9.2f} ms  mediana {statistics.median(legacy_ms):7.3f} ms  max {max(legacy_ms):8.3f} ms")
+    print(f"  nuovo  : totale {total_new:9.2f} ms  mediana {statistics.median(new_ms):7.3f} ms  max {max(new_ms):8.3f} ms")
+    print(f"  speedup: {total_legacy / total_new if total_new else float('inf'):.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de-markdown/chunking TTS: legacy vs tts_text.")
+    parser.add_argument("--limit", type=int, default=50, help="Articoli da leggere da Supabase")
+    parser.add_argument("--repeat", type=int, default=10, help="Ripetizioni per articolo")
+    parser.add_argument("--files", nargs="*", help="File markdown da usare al posto di Supabase")
+    args = parser.parse_args()
+
+    texts = load_files(args.files) if args.files else load_articles(args.limit)
+    if not texts:
+        raise SystemExit("Nessun articolo da misurare")
+    sizes = [len(t.encode("utf-8")) for t in texts]
+    print(f"{len(texts)} articoli, {sum(sizes) / 1024:.0f} KiB totali, "
+          f"mediana {statistics.median(sizes) / 1024:.1f} KiB, max {max(sizes) / 1024:.1f} KiB\n")
+
+    report("de-markdown",
+           timeit(legacy_clean, texts, args.repeat),
+           timeit(tts_text.clean, texts, args.repeat))
+
+    cleaned = [tts_text.clean(t) for t in texts]
+    report("chunking (<= 4800 byte)",
+           timeit(legacy_split, cleaned, args.repeat),
+           timeit(tts_text.split, cleaned, args.repeat))
+
+    # Testo lungo: evidenzia il costo quadratico del chunking a prefissi
+    long_text = " ".join(cleaned)
+    report(f"chunking testo concatenato ({len(long_text.encode('utf-8')) / 1024:.0f} KiB)",
+           timeit(legacy_split, [long_text], max(1, args.repeat // 5)),
+           timeit(tts_text.split, [long_text], max(1, args.repeat // 5)))
+
+    # Parita' dell'output: stesso testo a meno di spazi e dei ".." che la
+    # pipeline originale produceva dopo ogni paragrafo chiuso da un punto
+    normalize = lambda s: re.sub(r"([.!?;:])\.+", r"\1", re.sub(r"\s+", " ", s)).strip()
+    identical = sum(normalize(legacy_clean(t)) == c for t, c in zip(texts, cleaned))
+    oversize = sum(len(ch.encode("utf-8")) > tts_text.MAX_CHUNK_BYTES for c in cleaned for ch in tts_text.split(c))
+    same_chunks = sum(tts_text.split(c) == [ch.strip() for ch in legacy_split(c)] for c in cleaned)
+    print(f"\nparita' de-markdown: {identical}/{len(texts)} articoli identici (a meno di spazi)")
+    print(f"parita' chunking: {same_chunks}/{len(texts)} articoli con gli stessi chunk")
+    print(f"chunk oltre {tts_text.MAX_CHUNK_BYTES} byte: {oversize}")
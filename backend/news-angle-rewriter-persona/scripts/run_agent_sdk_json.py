@@ -33,6 +33,7 @@ import sys
 import tempfile
 import time
 from pathlib import Path
+from typing import Callable
 
 from claude_agent_sdk import query, ClaudeAgentOptions, AssistantMessage, TextBlock
 
@@ -197,6 +198,19 @@ def _validate_enum(value: str | None, allowed: list[str], default: str, label: s
     return v
 
 
+def _emit(on_event, event_type: str, **data) -> None:
+    """Inoltra un evento di avanzamento al chiamante (es. stream SSE del backend).
+
+    Un callback difettoso non deve mai interrompere la sessione della skill.
+    """
+    if on_event is None:
+        return
+    try:
+        on_event({"type": event_type, **data})
+    except Exception as e:  # pragma: no cover
+        _logger.warning("[SKILL] on_event fallito: {}", e)
+
+
 async def run_skill(
     url: str,
     *,
@@ -205,9 +219,13 @@ async def run_skill(
     target: str | None = None,
     tono: str | None = None,
     persona: str | None = None,
+    on_event: Callable[[dict], None] | None = None,
 ) -> dict:
     """Esegue la skill e ritorna il payload JSON in-memory.
 
+    `on_event`, se presente, riceve gli eventi di avanzamento (stage e
+    tool call) man mano che l'agente procede.
+
     Raises:
         ValueError: se tono o persona non sono nell'enum ammesso.
         RuntimeError: se la skill non produce un file JSON valido.
@@ -229,6 +247,7 @@ async def run_skill(
         "[SKILL] start url={} livello={} interlink_count={} target={} tono={} persona={}",
         url, livello, len(interlink), target, tono_norm, persona_norm,
     )
+    _emit(on_event, "stage", stage="skill_started")
 
     try:
         options = ClaudeAgentOptions(
@@ -274,6 +293,12 @@ async def run_skill(
                             bash_calls += 1
 
                         _log_tool_use(block)
+                        _emit(
+                            on_event, "tool",
+                            tool=name,
+                            firecrawl=firecrawl_calls, webfetch=webfetch_calls,
+                            websearch=websearch_calls, bash=bash_calls,
+                        )
 
         if not os.path.exists(tmp_path) or os.path.getsize(tmp_path) == 0:
             # Caso legittimo: combinazione tono+persona bloccata dallo STEP 1.5.
@@ -298,6 +323,11 @@ async def run_skill(
             payload.get("livello"), payload.get("keyword"),
             meta.get("tono"), meta.get("persona"),
         )
+        _emit(
+            on_event, "stage", stage="skill_completed", elapsed=round(elapsed, 1),
+            firecrawl=firecrawl_calls, webfetch=webfetch_calls,
+            websearch=websearch_calls, bash=bash_calls,
+        )
         if firecrawl_calls == 0:
             _logger.warning(
                 "[SKILL] Firecrawl NON invocato: la skill potrebbe essere ricaduta "
@@ -17,6 +17,7 @@ from __future__ import annotations
 import argparse
 import os
 import sys
+from pathlib import Path
 
 try:
     from firecrawl import Firecrawl  # firecrawl-py (gia' in backend/requirements.txt)
@@ -25,6 +26,14 @@ except ImportError as e:
     print("Esegui: pip install firecrawl-py", file=sys.stderr)
     sys.exit(2)
 
+# Cache pagine condivisa con il backend (app/page_cache.py): se la pipeline ha
+# gia' scaricato la pagina non rifacciamo la chiamata Firecrawl.
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+try:
+    from app import page_cache
+except Exception:  # dipendenze backend non disponibili: si procede senza cache
+    page_cache = None
+
 
 def main() -> int:
     parser = argparse.ArgumentParser(description="Scrape di una URL via Firecrawl (output su stdout).")
@@ -48,14 +57,21 @@ def main() -> int:
         print("FIRECRAWL_API_KEY non impostata nell'ambiente", file=sys.stderr)
         return 1
 
-    try:
+    def _fetch() -> str:
         fc = Firecrawl(api_key=api_key)
         result = fc.scrape(args.url, formats=[args.format])
+        return getattr(result, args.format, None) or ""
+
+    try:
+        if page_cache is not None:
+            variant = f"firecrawl:{args.format}"
+            content = page_cache.get_or_fetch(args.url, variant, _fetch) or ""
+        else:
+            content = _fetch()
     except Exception as e:
         print(f"Firecrawl scrape fallita: {e}", file=sys.stderr)
         return 1
 
-    content = getattr(result, args.format, None) or ""
     if args.max_chars and len(content) > args.max_chars:
         content = content[: args.max_chars] + "\n\n[...troncato...]"
 
@@ -25,6 +25,7 @@ import sys
 import tempfile
 import time
 from pathlib import Path
+from typing import Callable
 
 from claude_agent_sdk import query, ClaudeAgentOptions, AssistantMessage, TextBlock
 
@@ -137,17 +138,33 @@ def _build_prompt(url: str, livello: str | None, interlink: list[str], target: s
     return "\n\n".join(pieces)
 
 
+def _emit(on_event, event_type: str, **data) -> None:
+    """Inoltra un evento di avanzamento al chiamante (es. stream SSE del backend).
+
+    Un callback difettoso non deve mai interrompere la sessione della skill.
+    """
+    if on_event is None:
+        return
+    try:
+        on_event({"type": event_type, **data})
+    except Exception as e:  # pragma: no cover
+        _logger.warning("[SKILL] on_event fallito: {}", e)
+
+
 async def run_skill(
     url: str,
     *,
     livello: str | None = None,
     interlink: list[str] | None = None,
     target: str | None = None,
+    on_event: Callable[[dict], None] | None = None,
 ) -> dict:
     """Esegue la skill e ritorna il payload JSON in-memory.
 
     L'agente scrive il JSON su un file temporaneo che viene letto e rimosso
     dopo la fine del loop — il caller riceve un dict Python pronto all'uso.
+    `on_event`, se presente, riceve gli eventi di avanzamento (stage e
+    tool call) man mano che l'agente procede.
 
     Raises:
         RuntimeError: se la skill non produce un file JSON valido.
@@ -168,6 +185,7 @@ async def run_skill(
         "[SKILL] start url={} livello={} interlink_count={} target={}",
         url, livello, len(interlink), target,
     )
+    _emit(on_event, "stage", stage="skill_started")
 
     try:
         options = ClaudeAgentOptions(
@@ -212,6 +230,12 @@ async def run_skill(
                             bash_calls += 1
 
                         _log_tool_use(block)
+                        _emit(
+                            on_event, "tool",
+                            tool=name,
+                            firecrawl=firecrawl_calls, webfetch=webfetch_calls,
+                            websearch=websearch_calls, bash=bash_calls,
+                        )
 
         if not os.path.exists(tmp_path) or os.path.getsize(tmp_path) == 0:
             raise RuntimeError(
@@ -228,6 +252,11 @@ async def run_skill(
             firecrawl_calls, webfetch_calls, websearch_calls, bash_calls,
             payload.get("livello"), payload.get("keyword"),
         )
+        _emit(
+            on_event, "stage", stage="skill_completed", elapsed=round(elapsed, 1),
+            firecrawl=firecrawl_calls, webfetch=webfetch_calls,
+            websearch=websearch_calls, bash=bash_calls,
+        )
         if firecrawl_calls == 0:
             _logger.warning(
                 "[SKILL] Firecrawl NON invocato: la skill potrebbe essere ricaduta "
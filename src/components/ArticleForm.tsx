@@ -941,6 +941,8 @@ export default function ArticleForm({ article }: ArticleFormProps) {
   });
   const [aiLoading, setAiLoading] = useState(false);
   const [aiProgressStep, setAiProgressStep] = useState(0);
+  // Posizione in coda del job persona, dagli eventi `queue` dello stream
+  const [aiQueuePosition, setAiQueuePosition] = useState(0);
   const [aiTagsLoading, setAiTagsLoading] = useState(false);
   const [aiSummaryLoading, setAiSummaryLoading] = useState(false);
 
@@ -958,6 +960,7 @@ export default function ArticleForm({ article }: ArticleFormProps) {
   useEffect(() => {
     if (!aiLoading) {
       setAiProgressStep(0);
+      setAiQueuePosition(0);
       return;
     }
     const interval = setInterval(() => {
@@ -2228,6 +2231,61 @@ const cancelContactForm = () => {
     return { status: 'failed', error: `Timeout: la generazione sta impiegando piu di ${Math.round((maxAttempts * intervalMs) / 60000)} minuti.` };
   };
 
+  // Segue lo stream SSE del job (generation-events) fino all'evento `status`
+  // terminale, il cui data ha lo stesso formato di generation-status.
+  // Se lo stream non e' disponibile o cade prima della fine ricade sul polling.
+  const waitForJob = async (jobId: string, timeoutMs = 15 * 60 * 1000): Promise<any> => {
+    const controller = new AbortController();
+    const timer = setTimeout(() => controller.abort(), timeoutMs);
+    try {
+      const res = await fetch(`/api/articles/generation-events/${jobId}`, {
+        method: 'GET',
+        headers: { 'Authorization': `Bearer ${import.meta.env.PUBLIC_API_SECRET_KEY}` },
+        signal: controller.signal,
+      });
+      if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
+
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let sep: number;
+        while ((sep = buffer.indexOf('\n\n')) !== -1) {
+          const chunk = buffer.slice(0, sep);
+          buffer = buffer.slice(sep + 2);
+          let eventType = 'message';
+          const dataLines: string[] = [];
+          for (const line of chunk.split('\n')) {
+            if (line.startsWith('event:')) eventType = line.slice(6).trim();
+            else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+          }
+          if (!dataLines.length) continue;
+          let data: any = null;
+          try { data = JSON.parse(dataLines.join('\n')); } catch { continue; }
+          if (eventType === 'status' && ['done', 'failed', 'blocked'].includes(data?.status)) {
+            controller.abort();
+            return data;
+          }
+          if (eventType === 'queue') setAiQueuePosition(Number(data?.position) || 0);
+          if (eventType === 'tool' || eventType === 'stage' || eventType === 'queue') {
+            console.debug('[persona-skill]', eventType, data);
+          }
+        }
+      }
+    } catch (e) {
+      if (controller.signal.aborted) {
+        return { status: 'failed', error: `Timeout: la generazione sta impiegando piu di ${Math.round(timeoutMs / 60000)} minuti.` };
+      }
+      console.warn('[persona-skill] stream eventi non disponibile, passo al polling', e);
+    } finally {
+      clearTimeout(timer);
+    }
+    return pollJobStatus(jobId);
+  };
+
   const handleGenerateAi = async () => {
     setAiLoading(true);
     let shouldCloseModal = true;
@@ -2264,8 +2322,8 @@ const cancelContactForm = () => {
         return;
       }
 
-      // 2) Polling finche' lo stato non e' terminal
-      const result = await pollJobStatus(startData.jobId);
+      // 2) Stream eventi (fallback polling) finche' lo stato non e' terminal
+      const result = await waitForJob(startData.jobId);
 
       if (result.status === 'blocked') {
         alert(result.detail || 'Combinazione di tono e persona non consentita per questa notizia.');
@@ -3939,7 +3997,7 @@ const cancelContactForm = () => {
                   <path className="opacity-75" fill="currentColor" d="M4 12a8 8 0 018-8V0C5.373 0 0 5.373 0 12h4zm2 5.291A7.962 7.962 0 014 12H0c0 3.042 1.135 5.824 3 7.938l3-2.647z"></path>
                 </svg>
                 <span>
-                  {aiProgressMessages[aiProgressStep]}{' '}
+                  {aiQueuePosition > 0 ? `In coda: posizione ${aiQueuePosition}` : aiProgressMessages[aiProgressStep]}{' '}
                   <span className="text-xs text-indigo-600">(5-7 minuti)</span>
                 </span>
               </div>
@@ -50,15 +50,27 @@ export default function PendingArticleReview({ newsId }: Props) {
       // alla lista "Da generare" dove l'articolo sara' marcato come
       // "in generazione" con link di modifica disabilitato, evitando doppie
       // esecuzioni e il timeout da proxy.
+      // Il creator serve alla coda backend per alternare i job tra redattori
+      let creator = '';
+      try {
+        const profile = JSON.parse(sessionStorage.getItem('userProfile') || '{}');
+        creator = profile.full_name || profile.email || profile.id || '';
+      } catch {
+        creator = '';
+      }
       const res = await fetch(`${BACKEND_URL}/api/news/reconstruct/${article.id}`, {
         method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ creator }),
       });
+      const body = await res.json().catch(() => ({}));
       if (!res.ok && res.status !== 202) {
-        const body = await res.json().catch(() => ({}));
         throw new Error(body.detail || 'Errore nell\'avvio della generazione');
       }
-      // Redirect immediato alla lista
-      window.location.href = '/admin/articles/pending';
+      // Redirect immediato alla lista, che segue lo stream eventi del job
+      window.location.href = body.jobId
+        ? `/admin/articles/pending?job=${encodeURIComponent(body.jobId)}`
+        : '/admin/articles/pending';
     } catch (err: any) {
       setGenerating(false);
       setError(err.message);
@@ -0,0 +1,49 @@
+export const prerender = false;
+
+import type { APIRoute } from 'astro';
+
+const BACKEND_URL = import.meta.env.BACKEND_URL || 'http://localhost:8000';
+
+// Proxy dello stream SSE del backend: inoltra il body cosi' com'e', senza bufferizzare.
+export const GET: APIRoute = async ({ params, request }) => {
+  const authHeader = request.headers.get('Authorization');
+  const apiKey = authHeader?.split('Bearer ')[1];
+  if (apiKey !== import.meta.env.API_SECRET_KEY) {
+    return new Response(JSON.stringify({ error: 'Unauthorized' }), {
+      status: 401,
+      headers: { 'Content-Type': 'application/json' },
+    });
+  }
+
+  try {
+    const lastEventId = request.headers.get('Last-Event-ID');
+    const res = await fetch(
+      `${BACKEND_URL}/api/articles/generation-events/${params.jobId}`,
+      {
+        method: 'GET',
+        headers: lastEventId ? { 'Last-Event-ID': lastEventId } : {},
+        signal: request.signal,
+      }
+    );
+    if (!res.ok || !res.body) {
+      const text = await res.text();
+      return new Response(text || JSON.stringify({ error: 'Stream non disponibile' }), {
+        status: res.status,
+        headers: { 'Content-Type': 'application/json' },
+      });
+    }
+    return new Response(res.body, {
+      status: 200,
+      headers: {
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+      },
+    });
+  } catch (err) {
+    return new Response(JSON.stringify({ error: 'Backend non raggiungibile', detail: String(err) }), {
+      status: 502,
+      headers: { 'Content-Type': 'application/json' },
+    });
+  }
+};
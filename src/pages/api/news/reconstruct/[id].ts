@@ -15,10 +15,14 @@ const longRunAgent = new Agent({
   connectTimeout: 30 * 1000,
 });
 
-export const POST: APIRoute = async ({ params }) => {
+export const POST: APIRoute = async ({ params, request }) => {
   try {
+    // Body opzionale { creator }: equita' della coda di generazione tra redattori
+    const body = await request.text();
     const res = await fetch(`${BACKEND_URL}/api/news/reconstruct/${params.id}`, {
       method: 'POST',
+      headers: body ? { 'Content-Type': 'application/json' } : undefined,
+      body: body || undefined,
       // @ts-ignore undici dispatcher option non tipizzata nel fetch standard
       dispatcher: longRunAgent,
     });